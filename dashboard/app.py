@@ -7,12 +7,10 @@ import datetime as dt
 import matplotlib.pyplot as plt
 import numpy as np
 
-from plots import houly_plot, map_plot
-from dashboard_utils import load_df_from_db, filter_df
+from plots import hourly_plot, map_plot
+from dashboard_utils import load_rollup_from_db, aggregate_rollup, filter_df
 
 
-DEP_TABLE_NAME = "MVG1"
-TRANS_TABLE_NAME = "MVG_Trans1"
 RENDER_COLS = ["timestamp",
                "station", "line",
                "destination", "delay"]
@@ -29,13 +27,6 @@ st.markdown("""
 
 st.sidebar.header('User Input Features')
 
-df = load_df_from_db(DEP_TABLE_NAME)
-
-station_names = sorted(df["station"].unique())
-selected_stations = st.sidebar.multiselect("station",
-                                           station_names,
-                                           ["Pasing", "Laim"])
-
 selected_date = st.sidebar.date_input(
     "Filter by Date",
     value=[
@@ -43,6 +34,14 @@ selected_date = st.sidebar.date_input(
     max_value=dt.datetime.today()
 )
 
+# only the rollup rows of the selected days are loaded
+df = load_rollup_from_db(selected_date[0], selected_date[-1])
+
+station_names = sorted(df["station"].unique())
+selected_stations = st.sidebar.multiselect("station",
+                                           station_names,
+                                           ["Pasing", "Laim"])
+
 is_weekend_selected = st.sidebar.checkbox("include weekend", value=True)
 is_workday_selected = st.sidebar.checkbox("include workdays", value=True)
 
@@ -54,18 +53,16 @@ elif not is_workday_selected and is_weekend_selected:
 else:
     weekend_filter = {}
 
-selected_time = st.slider(
-     "Select the time of day to filter",
-     value=(dt.time(11, 30), dt.time(18, 45)))
+# the rollup holds whole hours
+selected_hours = st.slider(
+     "Select the hours of day to filter",
+     0, 23,
+     value=(11, 18))
 
 
 filter_dict = {"station": selected_stations,
-               "time": selected_time,
+               "hour": selected_hours,
                }
-if len(selected_date) > 0:
-    # print(selected_date)
-    date_filter = {"date": selected_date}
-    filter_dict.update(date_filter)
 
 
 if weekend_filter:
@@ -89,7 +86,7 @@ filtered_df = filtered_df[filtered_df["line"].isin(selected_line)]
 # filtered_df["time"] = filtered_df["time"].astype(str)
 filtered_df = filtered_df[filtered_df["line"].isin(selected_line)]
 # st.dataframe(filtered_df.loc[:, RENDER_COLS])
-houly_plot(filtered_df)
+hourly_plot(aggregate_rollup(filtered_df, ["line", "hour"]))
 
 # st.table(filtered_df.loc[:, ["hour", "delay", "line"]].groupby(["hour", "line"]).mean())
 # grouped = filtered_df.loc[:, ["delay", "station", "lon", "lat"]].groupby("station").count()
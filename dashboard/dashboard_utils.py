@@ -21,38 +21,9 @@ REVERSE_REPLACE_MAP = {
 }
 
 
-@st.cache
-def load_df_from_db(dep_table_name: str):
-    currPath = pl.Path(__file__).parent.parent
-    jsonRelPath = "mvg_tracker/config/default_config.json"
-    jsonPath = currPath.joinpath(jsonRelPath)
-    config = get_json_from_path(jsonPath)
-    conn = get_connector(**config["dbParams"])
-    df = pd.read_sql_query(
-                f'SELECT timestamp,station,line,destination,delay, curr_time_epoch, timestamp_epoch FROM public."{dep_table_name}"',
-                conn,
-                dtype={"timestamp": "datetime64",
-                       "station": "str",
-                       "line": "category",
-                       "destination": "str",
-                       "delay": "int16",
-                       "curr_time_epoch": "uint64",
-                       "timestamp_epoch": "uint64"
-                        },
-                )
-    df["record_delta"] = (df["timestamp_epoch"] - df["curr_time_epoch"]).astype("int16")
-    df.timestamp = pd.to_datetime(df.timestamp)
-    df = df[df["record_delta"] < 180]
-    df.sort_values("timestamp", ascending=False, inplace=True)
-    # df.drop(columns=["curr_time_epoch", "timestamp_epoch", "record_delta","timestamp"],
-    #         axis=1,
-    #         inplace=True)
-    # df["weekday"] = df["timestamp"].dt.weekday.astype("uint8")
-    df["is_weekend"] = df["timestamp"].dt.weekday.between(5, 6)
-    df["minute"] = df["timestamp"].dt.minute.astype("uint8")
-    df = df.loc[:, ["timestamp", "station", "line",
-                    "destination", "delay", "is_weekend"]]
-
+def add_station_attributes(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    """add coordinates and direction of the registered stations to the rows
+       of df by station name"""
     station_attr = get_station_attributes(config=config)
 
     # df["station"] = df["station"].replace("ö", "oe", regex=True)
@@ -71,10 +42,58 @@ def load_df_from_db(dep_table_name: str):
             regex=False)
     df = df.merge(station_attr.loc[:, ["station", "lon", "lat", "Direction"]],
                   "left", on="station")
-    
+
     df["station"] = df["station"].astype("category")
-    df = df.reset_index(drop=True)
-    return df
+    return df.reset_index(drop=True)
+
+
+@st.cache
+def load_rollup_from_db(start: dt.date = None, end: dt.date = None):
+    """load the hourly delay rollup maintained by the tracker with station
+       and line names, a few rows per station, line and hour instead of all
+       departures. timestamp is the start of the hour of a row"""
+    currPath = pl.Path(__file__).parent.parent
+    jsonRelPath = "mvg_tracker/config/default_config.json"
+    jsonPath = currPath.joinpath(jsonRelPath)
+    config = get_json_from_path(jsonPath)
+    conn = get_connector(**config["dbParams"])
+    tables = config["dbTables"]
+    df = pd.read_sql_query(
+        f"""SELECT s.name AS station, 'S' || r.line_id AS line, r.date, r.hour,
+                   r.count, r.delay_sum, r.delay_sum_sq, r.delay_min,
+                   r.delay_max
+            FROM {tables["delay_rollup"]} r
+            JOIN {tables["station"]} s ON s.station_id = r.station_id
+            WHERE (%(start)s IS NULL OR r.date >= %(start)s)
+            AND (%(end)s IS NULL OR r.date <= %(end)s)""",
+        conn,
+        params={"start": start, "end": end},
+        dtype={"station": "str",
+               "line": "category",
+               "hour": "uint8",
+               "count": "int64",
+               "delay_sum": "int64",
+               "delay_sum_sq": "int64"})
+    df["date"] = pd.to_datetime(df["date"])
+    df["timestamp"] = df["date"] + pd.to_timedelta(df["hour"], unit="h")
+    df["is_weekend"] = df["date"].dt.weekday.between(5, 6)
+    return add_station_attributes(df, config)
+
+
+def aggregate_rollup(df: pd.DataFrame, by: list) -> pd.DataFrame:
+    """combine rollup rows into count, mean, standard deviation, min and
+       max of the delay per group"""
+    grouped = (df.groupby(by, observed=True)
+                 .agg(count=("count", "sum"),
+                      delay_sum=("delay_sum", "sum"),
+                      delay_sum_sq=("delay_sum_sq", "sum"),
+                      delay_min=("delay_min", "min"),
+                      delay_max=("delay_max", "max"))
+                 .reset_index())
+    grouped["delay"] = grouped["delay_sum"] / grouped["count"]
+    variance = grouped["delay_sum_sq"] / grouped["count"] - grouped["delay"] ** 2
+    grouped["delay_std"] = variance.clip(lower=0) ** 0.5
+    return grouped
 
 
 def filter_df(df: pd.DataFrame, axis: dict) -> pd.DataFrame:
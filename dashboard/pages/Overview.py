@@ -13,10 +13,8 @@ import json
 sys.path.append(str(pl.Path(__file__).parent.parent))
 
 from plots import map_plot
-from dashboard_utils import load_df_from_db, filter_df
+from dashboard_utils import load_rollup_from_db, aggregate_rollup, filter_df
 
-DEP_TABLE_NAME = "MVG1"
-TRANS_TABLE_NAME = "MVG_Trans1"
 RENDER_COLS = ["timestamp",
                "station", "line",
                "destination", "delay"]
@@ -24,13 +22,6 @@ RENDER_COLS = ["timestamp",
 
 st.sidebar.header('User Input Features')
 
-df = load_df_from_db(DEP_TABLE_NAME)
-
-station_names = sorted(df["station"].unique())
-# selected_stations = st.sidebar.multiselect("station",
-#                                            station_names,
-#                                            ["Pasing"])
-
 selected_date = st.sidebar.date_input(
     "Filter by Date",
     value=[
@@ -38,6 +29,14 @@ selected_date = st.sidebar.date_input(
     max_value=dt.datetime.today()
 )
 
+# only the rollup rows of the selected days are loaded
+df = load_rollup_from_db(selected_date[0], selected_date[-1])
+
+station_names = sorted(df["station"].unique())
+# selected_stations = st.sidebar.multiselect("station",
+#                                            station_names,
+#                                            ["Pasing"])
+
 is_weekend_selected = st.sidebar.checkbox("include weekend", value=True)
 is_workday_selected = st.sidebar.checkbox("include workdays", value=True)
 
@@ -49,19 +48,14 @@ elif not is_workday_selected and is_weekend_selected:
 else:
     weekend_filter = {}
 
-selected_time = st.slider(
-     "Select the time of day to filter",
-     value=(dt.time(0, 00), dt.time(23, 59)))
-
-
-filter_dict = {"time": selected_time}
+# the rollup holds whole hours
+selected_hours = st.slider(
+     "Select the hours of day to filter",
+     0, 23,
+     value=(0, 23))
 
-if len(selected_date) > 0:
-    # print(selected_date)
-    date_filter = {"date": selected_date}
-    filter_dict.update(date_filter)
 
-print(filter_dict)
+filter_dict = {"hour": selected_hours}
 
 if weekend_filter:
     filter_dict.update(weekend_filter)
@@ -78,4 +72,4 @@ filtered_df = filter_df(df, filter_dict)
 # filtered_df = filtered_df[filtered_df["line"].isin(selected_line)]
 # st.dataframe(filtered_df.loc[:, RENDER_COLS])
 
-map_plot(filtered_df)
\ No newline at end of file
+map_plot(aggregate_rollup(filtered_df, ["station", "lon", "lat"]))
\ No newline at end of file
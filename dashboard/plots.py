@@ -5,30 +5,19 @@ import pandas as pd
 import pydeck as pdk
 from pydeck.types import String
 
-def houly_plot(df: pd.DataFrame):
-    lines = df.line.unique()
+def hourly_plot(df: pd.DataFrame):
+    """stacked average delay per hour of day and line
+       :param df: pd.DataFrame - result of aggregate_rollup by line and hour"""
     fig, ax = plt.subplots()
-    df["hour"] = df["timestamp"].dt.hour
-    hours = sorted(df["hour"].unique())
-    cum_delays = np.zeros((len(hours)), "float16")
-    default_dict = {h: 0.0 for h in hours}
-    temp_df = (df.loc[:, ["line", "hour", "delay"]]
-               .groupby(["line", "hour"])
-               .mean()
-               .reset_index())
-    temp_df = temp_df[temp_df["line"].isin(lines)]
-    temp_df["delay"] = temp_df["delay"].fillna(0)
-
-    for l in lines:
-        delay = temp_df.loc[temp_df["line"] == l, ["delay"]].values[:,0]
-        ax.bar(hours, delay, 0.5, bottom=cum_delays, label=l) 
-        cum_delays = cum_delays + np.array(list(default_dict.values()))
-
+    pivot = df.pivot_table(index="hour", columns="line", values="delay",
+                           observed=True).fillna(0)
+    bottom = np.zeros(len(pivot.index))
+    for line in pivot.columns:
+        ax.bar(pivot.index, pivot[line].values, 0.5, bottom=bottom,
+               label=line)
+        bottom = bottom + pivot[line].values
     ax.set_ylabel("Average Delay")
     ax.legend()
-    # plt.plot(df_grouped["delay"])
-    # plt.xlabel("time of day")
-    # plt.ylabel("average delay")
     return st.pyplot(fig)
 
 
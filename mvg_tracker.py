@@ -3,6 +3,7 @@ import logging
 import os
 import asyncio
 import pathlib as pl
+from datetime import datetime
 from mvg_tracker.request_parsing.data_gathering import DataManager
 from mvg_tracker.data_validation.utils import get_json_from_path
 from mvg_tracker.logging_util.init_loggers import init_console_logger, init_file_logger
@@ -41,6 +42,36 @@ def main():
         help="enter Dir for the backed up files",
         default=None
     )
+    parser.add_argument(
+        "--archive_dir",
+        "-a",
+        type=str,
+        dest="archiveDir",
+        help="enter Dir to record all raw api responses to",
+        default=None
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        dest="replayDir",
+        help="enter Dir of a response archive to reprocess into the " +
+             "database instead of tracking",
+        default=None
+    )
+    parser.add_argument(
+        "--replay_from",
+        type=datetime.fromisoformat,
+        dest="replayFrom",
+        help="only replay records from this ISO date/time on",
+        default=None
+    )
+    parser.add_argument(
+        "--replay_to",
+        type=datetime.fromisoformat,
+        dest="replayTo",
+        help="only replay records before this ISO date/time",
+        default=None
+    )
 
     args = parser.parse_args()
     logger = logging.getLogger(__name__)
@@ -77,7 +108,14 @@ def main():
     config = get_json_from_path(configPath)
     data_manager = DataManager(config=config,
                                loggingDir=logDir,
-                               backUpFolder=backUpFolder)
+                               backUpFolder=backUpFolder,
+                               archiveFolder=args.archiveDir)
+    if args.replayDir is not None:
+        logger.info(f"replaying response archive {args.replayDir}")
+        data_manager.replay(pl.Path(args.replayDir),
+                            args.replayFrom,
+                            args.replayTo)
+        return
 
     asyncio.run(data_manager.main(config=config))
 
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import logging
+import pathlib as pl
+import statistics
+import time
+from mvg_tracker.benchmarking.stand_in_server import add_server_args, server_from_args
+from mvg_tracker.benchmarking.synthetic import station_table
+from mvg_tracker.data_validation.utils import get_json_from_path
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.data_gathering import DataManager
+
+
+logger = logging.getLogger("LoadGenerator")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CONFIG = pl.Path(__file__).parent.parent.joinpath(
+    "config/default_config.json")
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def run_load(config: dict,
+                   n_stations: int,
+                   cycles: int,
+                   base_url: str) -> None:
+    """poll n_stations synthetic stations cycles times through the full
+       fetch, parse and write path of the DataManager, without a database"""
+    config = dict(config)
+    config["fetchParams"] = dict(config.get("fetchParams", {}),
+                                 baseUrl=base_url)
+    manager = DataManager(config, db_station=station_table(n_stations))
+    manager.logger.setLevel(logging.INFO)
+    await manager.start(config)
+    latencies = []
+    rows = 0
+    failures = 0
+    start = time.perf_counter()
+    try:
+        for cycle in range(cycles):
+            stats = await manager.poll_stations()
+            latencies.append(stats.latency)
+            rows += stats.written_rows
+            failures += len(stats.failures)
+            await manager.buffer.flush()
+            logger.info(f"cycle {cycle}: {stats}")
+    finally:
+        await manager.fetcher.close()
+        await manager.parse_executor.aclose()
+    duration = time.perf_counter() - start
+    logger.info(
+        f"{cycles} cycles over {n_stations} stations in {duration:.2f}s: " +
+        f"{cycles * n_stations / duration:.1f} stations/s, " +
+        f"{rows / duration:.1f} rows/s, {failures} failed fetches, " +
+        f"cycle latency mean={statistics.mean(latencies):.2f}s " +
+        f"p50={percentile(latencies, 0.5):.2f}s " +
+        f"p95={percentile(latencies, 0.95):.2f}s " +
+        f"max={max(latencies):.2f}s")
+
+
+async def run(args: argparse.Namespace) -> None:
+    config = get_json_from_path(pl.Path(args.configPath))
+    if args.url is not None:
+        await run_load(config, args.stations, args.cycles, args.url)
+        return
+    server = server_from_args(args)
+    runner = await server.start(args.host, args.port)
+    try:
+        await run_load(config,
+                       args.stations,
+                       args.cycles,
+                       server.base_url(args.host, args.port))
+    finally:
+        logger.info(
+            f"stand-in answered {server.requests} requests {server.responses}")
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="measure throughput and cycle latency of the collector " +
+                    "against the local stand-in server")
+    parser.add_argument("--stations", type=int, default=1500,
+                        help="number of synthetic stations to poll")
+    parser.add_argument("--cycles", type=int, default=5,
+                        help="number of polling cycles")
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="url template of an already running server with a {station} " +
+             "placeholder, starts a stand-in server in process if not given")
+    parser.add_argument(
+        "--config_path",
+        "-c",
+        type=str,
+        dest="configPath",
+        help="enter filePath for the config file to use",
+        default=str(DEFAULT_CONFIG))
+    add_server_args(parser)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
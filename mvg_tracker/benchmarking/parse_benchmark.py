@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from mvg_tracker.benchmarking.synthetic import departures_payload, station_names, station_table
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.batching import DepartureBatch
+from mvg_tracker.request_parsing.data_classes import Departure, StationResponse
+from mvg_tracker.request_parsing.parse_executor import DepartureParser, ParseExecutor, ParseTask
+
+
+logger = logging.getLogger("ParseBenchmark")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+
+def run_parse(n_departures: int,
+              rounds: int,
+              batch_size: int,
+              seed: int = 0) -> list[float]:
+    """parse synthetic responses of batch_size departures into
+       StationResponse objects, the validation of every field included
+       :returns: list - departures parsed per second of every round"""
+    rng = random.Random(seed)
+    destinations = station_names(100)
+    payloads = [departures_payload(rng, batch_size, destinations)
+                for _ in range(max(1, n_departures // batch_size))]
+    parsed = sum(len(payload) for payload in payloads)
+    rates = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        for payload in payloads:
+            StationResponse(payload)
+        duration = time.perf_counter() - start
+        rates.append(parsed / duration)
+        logger.info(f"round {i}: parsed {parsed} departures in " +
+                    f"{duration:.2f}s, {rates[-1]:.0f} departures/s")
+    return rates
+
+
+def run_batch_parse(n_departures: int,
+                    rounds: int,
+                    batch_size: int,
+                    seed: int = 0) -> list[float]:
+    """validate the same synthetic departures column-wise with
+       Departure.validate_batch, batch_size departures per call
+       :returns: list - departures validated per second of every round"""
+    rng = random.Random(seed)
+    payload = departures_payload(rng, n_departures, station_names(100))
+    rates = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        for offset in range(0, len(payload), batch_size):
+            Departure.validate_batch(payload[offset:offset + batch_size])
+        duration = time.perf_counter() - start
+        rates.append(len(payload) / duration)
+        logger.info(f"round {i}: validated {len(payload)} departures in " +
+                    f"batches in {duration:.2f}s, {rates[-1]:.0f} departures/s")
+    return rates
+
+
+def run_executor_parse(n_departures: int,
+                       rounds: int,
+                       batch_size: int,
+                       kind: str,
+                       workers: int = None,
+                       seed: int = 0) -> list[float]:
+    """parse synthetic raw responses of batch_size departures on a
+       ParseExecutor the way the collector does, from the bytes to the
+       columns of the departures table, all of them S-Bahns
+       :returns: list - departures parsed per second of every round"""
+    rng = random.Random(seed)
+    stations = station_table(100)
+    now = time.time()
+    contents = [json.dumps(departures_payload(rng, batch_size,
+                                              list(stations.name),
+                                              sbahn_share=1.0,
+                                              now=now)).encode()
+                for _ in range(max(1, n_departures // batch_size))]
+    parsed = len(contents) * batch_size
+    parser = DepartureParser(stations.name, stations.station_id,
+                             timedelta(days=1))
+    executor = ParseExecutor(parser, kind, workers)
+    executor.start()
+
+    async def parse_all():
+        tasks = [ParseTask("de:09162:1", content, now, {})
+                 for content in contents]
+        return await asyncio.gather(*map(executor.parse, tasks))
+
+    rates = []
+    try:
+        for i in range(rounds):
+            start = time.perf_counter()
+            asyncio.run(parse_all())
+            duration = time.perf_counter() - start
+            rates.append(parsed / duration)
+            logger.info(f"round {i}: parsed {parsed} departures on {executor} " +
+                        f"in {duration:.2f}s, {rates[-1]:.0f} departures/s")
+    finally:
+        executor.close()
+    return rates
+
+
+def measure_buffer(n_departures: int, seed: int = 0) -> None:
+    """time and traced memory per departure from the raw departures of a
+       response to the columns DepartureParser keeps of them in a
+       DepartureBatch until the next flush"""
+    rng = random.Random(seed)
+    stations = station_table(100)
+    now = time.time()
+    payload = departures_payload(rng, n_departures, list(stations.name),
+                                 sbahn_share=1.0, now=now)
+    parser = DepartureParser(stations.name, stations.station_id,
+                             timedelta(days=1))
+    batch = DepartureBatch()
+    tracemalloc.start()
+    start = time.perf_counter()
+    parser.parse_departures(payload, "de:09162:1",
+                            datetime.fromtimestamp(now), batch)
+    duration = time.perf_counter() - start
+    buffered = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    logger.info(f"parsed {len(payload)} departures into a DepartureBatch " +
+                f"of {len(batch)} rows, " +
+                f"{duration / len(payload) * 1e6:.1f}us and " +
+                f"{buffered / max(len(batch), 1):.0f} bytes per buffered " +
+                "departure (traced)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="measure how many departures per second are parsed and " +
+                    "validated into Departure objects")
+    parser.add_argument("--departures", type=int, default=50000,
+                        help="departures parsed per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--batch_size", type=int, dest="batchSize",
+                        default=50, help="departures per station response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", action="store_true",
+                        help="validate column-wise with Departure.validate_batch")
+    parser.add_argument("--executor", type=str, default=None,
+                        choices=["process", "thread", "inline"],
+                        help="parse raw responses on a ParseExecutor of this kind")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="workers of the executor, defaults to the cores")
+    parser.add_argument("--buffer", action="store_true",
+                        help="also measure time and memory from the raw " +
+                             "departures to the buffered columns")
+    args = parser.parse_args()
+    if args.executor is not None:
+        rates = run_executor_parse(args.departures, args.rounds,
+                                   args.batchSize, args.executor,
+                                   args.workers, args.seed)
+    else:
+        run = run_batch_parse if args.batch else run_parse
+        rates = run(args.departures, args.rounds, args.batchSize, args.seed)
+    logger.info(f"departures/s best={max(rates):.0f} " +
+                f"median={statistics.median(rates):.0f}")
+    if args.buffer:
+        measure_buffer(min(args.departures, 10000), args.seed)
+
+
+if __name__ == "__main__":
+    main()
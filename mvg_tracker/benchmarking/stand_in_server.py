@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import logging
+import pathlib as pl
+import random
+import time
+from aiohttp import web
+from mvg_tracker.benchmarking.synthetic import departures_payload, station_names
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("StandInServer")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+DEPARTURE_ROUTE = "/api/fib/v2/departure"
+TIME_FIELDS = ("plannedDepartureTime", "realtimeDepartureTime")
+
+
+class StandInServer:
+    """local stand-in for the MVG departure endpoint, answers every globalId
+       with a recorded or synthetic payload and can inject latency and errors
+       :param record_dir: pl.Path - directory of recorded *.json responses, a
+        file named like the requested globalId with ':' replaced by '_' is
+        preferred, otherwise the recordings are served round robin.
+        Synthetic payloads are generated if None
+       :param departures: int - departures per synthetic payload
+       :param n_destinations: int - number of synthetic destination names,
+        matching the names of benchmarking.synthetic.station_table
+       :param latency: float - mean response latency in seconds
+       :param jitter: float - maximum deviation from the mean latency
+       :param error_rate: float - share of responses with a 5xx/4xx status
+       :param timeout_rate: float - share of requests that hang for hang_time
+       :param redirect_rate: float - share of requests answered with a
+        redirect to themselves, ending in too many redirects
+       :param hang_time: float - seconds a hanging request is delayed"""
+
+    def __init__(self,
+                 record_dir: pl.Path = None,
+                 departures: int = 40,
+                 n_destinations: int = 100,
+                 latency: float = 0.05,
+                 jitter: float = 0.02,
+                 error_rate: float = 0.0,
+                 timeout_rate: float = 0.0,
+                 redirect_rate: float = 0.0,
+                 hang_time: float = 60,
+                 seed: int = 0) -> None:
+        self.departures = departures
+        self.destinations = station_names(n_destinations)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.redirect_rate = redirect_rate
+        self.hang_time = hang_time
+        self.rng = random.Random(seed)
+        self.recordings: dict[str, bytes] = {}
+        if record_dir is not None:
+            for path in sorted(pl.Path(record_dir).glob("*.json")):
+                self.recordings[path.stem] = path.read_bytes()
+            if not self.recordings:
+                raise FileNotFoundError(f"no *.json recordings in {record_dir}")
+        self._recording_names = list(self.recordings)
+        self.requests = 0
+        self.responses: dict[int, int] = {}
+
+    def _recorded_payload(self, globalId: str) -> bytes:
+        """recorded payload with the departure times shifted, so the first
+           departure leaves now"""
+        content = self.recordings.get(globalId.replace(":", "_"))
+        if content is None:
+            name = self._recording_names[
+                self.requests % len(self._recording_names)]
+            content = self.recordings[name]
+        departures = json.loads(content)
+        planned = [dep[field] for dep in departures for field in TIME_FIELDS
+                   if isinstance(dep.get(field), int)]
+        if planned:
+            offset = int(time.time() * 1000) - min(planned)
+            for dep in departures:
+                for field in TIME_FIELDS:
+                    if isinstance(dep.get(field), int):
+                        dep[field] += offset
+        return json.dumps(departures).encode()
+
+    def payload(self, globalId: str) -> bytes:
+        if self.recordings:
+            return self._recorded_payload(globalId)
+        return json.dumps(departures_payload(
+            self.rng, self.departures, self.destinations)).encode()
+
+    def _count(self, status: int) -> None:
+        self.responses[status] = self.responses.get(status, 0) + 1
+
+    async def handle_departure(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        globalId = request.query.get("globalId")
+        if globalId is None:
+            self._count(400)
+            return web.Response(status=400, text="missing globalId")
+        delay = max(0.0, self.latency +
+                    self.rng.uniform(-self.jitter, self.jitter))
+        draw = self.rng.random()
+        if draw < self.timeout_rate:
+            delay = self.hang_time
+        await asyncio.sleep(delay)
+        draw -= self.timeout_rate
+        if 0 <= draw < self.error_rate:
+            status = self.rng.choice([500, 502, 503, 429, 404])
+            self._count(status)
+            return web.Response(status=status)
+        draw -= self.error_rate
+        if 0 <= draw < self.redirect_rate:
+            self._count(302)
+            raise web.HTTPFound(str(request.rel_url))
+        self._count(200)
+        return web.Response(body=self.payload(globalId),
+                            content_type="application/json")
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(DEPARTURE_ROUTE, self.handle_departure)
+        return app
+
+    async def start(self, host: str, port: int) -> web.AppRunner:
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def base_url(self, host: str, port: int) -> str:
+        """url template for the fetchParams baseUrl of the collector"""
+        return f"http://{host}:{port}{DEPARTURE_ROUTE}?globalId={{station}}"
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--record_dir",
+        type=str,
+        dest="recordDir",
+        help="enter Dir of recorded json responses to replay",
+        default=None)
+    parser.add_argument("--departures", type=int, default=40,
+                        help="departures per synthetic payload")
+    parser.add_argument("--destinations", type=int, default=100,
+                        help="number of synthetic destination names")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02,
+                        help="maximum deviation from the mean latency")
+    parser.add_argument("--error_rate", type=float, default=0.0,
+                        dest="errorRate")
+    parser.add_argument("--timeout_rate", type=float, default=0.0,
+                        dest="timeoutRate")
+    parser.add_argument("--redirect_rate", type=float, default=0.0,
+                        dest="redirectRate")
+    parser.add_argument("--hang_time", type=float, default=60,
+                        dest="hangTime",
+                        help="seconds a hanging request is delayed")
+
+
+def server_from_args(args: argparse.Namespace) -> StandInServer:
+    return StandInServer(record_dir=args.recordDir,
+                         departures=args.departures,
+                         n_destinations=args.destinations,
+                         latency=args.latency,
+                         jitter=args.jitter,
+                         error_rate=args.errorRate,
+                         timeout_rate=args.timeoutRate,
+                         redirect_rate=args.redirectRate,
+                         hang_time=args.hangTime)
+
+
+async def serve(server: StandInServer, host: str, port: int) -> None:
+    runner = await server.start(host, port)
+    logger.info(f"serving departures at {server.base_url(host, port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        logger.info(f"answered {server.requests} requests {server.responses}")
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="local stand-in for the MVG departure api")
+    add_server_args(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(server_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
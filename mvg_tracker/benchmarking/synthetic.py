@@ -0,0 +1,75 @@
+import random
+import time
+import pandas as pd
+from mvg_tracker.request_parsing.enum_classes import Network, Product
+
+
+SBAHN_LINES = ["S1", "S2", "S3", "S4", "S6", "S7", "S8", "S20"]
+OTHER_LABELS = {Product.Bus: "1{:02d}",
+                Product.Tram: "{:d}",
+                Product.UBahn: "U{:d}",
+                Product.RegionalBus: "7{:02d}"}
+
+
+def station_names(n_stations: int) -> list[str]:
+    # fixed width, so no station name is part of another one
+    return [f"Station {i:05d}" for i in range(n_stations)]
+
+
+def station_table(n_stations: int) -> pd.DataFrame:
+    """station table in the layout of the station db table"""
+    return pd.DataFrame({
+        "name": station_names(n_stations),
+        "station_id": [91620000 + i for i in range(n_stations)]})
+
+
+def global_id(station_id: int) -> str:
+    """global id as built by DataManager.init_stationID"""
+    s = str(station_id)
+    return "de:0" + s[:4] + ":" + s[4:]
+
+
+def departure(rng: random.Random,
+              planned_ms: int,
+              destinations: list[str],
+              sbahn_share: float) -> dict:
+    if rng.random() < sbahn_share:
+        product = Product.SBahn
+        label = rng.choice(SBAHN_LINES)
+    else:
+        product = rng.choice(list(OTHER_LABELS))
+        label = OTHER_LABELS[product].format(rng.randint(1, 99))
+    delay = rng.choice([None, 0, 0, 0, 1, 2, 5, 12])
+    return {
+        "plannedDepartureTime": planned_ms,
+        "realtime": delay is not None,
+        "delayInMinutes": delay,
+        "realtimeDepartureTime": planned_ms + (delay or 0) * 60_000,
+        "transportType": product.value,
+        "label": label,
+        "network": Network.MVV.value,
+        "trainType": "",
+        "destination": rng.choice(destinations),
+        "cancelled": False,
+        "sev": False,
+        "platform": rng.randint(1, 4),
+        "stopPositionNumber": rng.randint(1, 4),
+        "messages": [],
+        "bannerHash": "",
+        "occupancy": rng.choice(["LOW", "MEDIUM", "HIGH", "UNKNOWN"]),
+        "stopPointGlobalId": "de:09162:1:1:1",
+    }
+
+
+def departures_payload(rng: random.Random,
+                       n_departures: int,
+                       destinations: list[str],
+                       sbahn_share: float = 0.2,
+                       now: float = None) -> list[dict]:
+    """synthetic response of the departure endpoint, the departures are
+       spread over the next two hours"""
+    now_ms = int((time.time() if now is None else now) * 1000)
+    planned = sorted(now_ms + rng.randint(0, 120) * 60_000
+                     for _ in range(n_departures))
+    return [departure(rng, planned_ms, destinations, sbahn_share)
+            for planned_ms in planned]
@@ -0,0 +1,494 @@
+import dataclasses
+import logging
+from collections.abc import Callable, Mapping
+from datetime import datetime
+from enum import Enum
+from operator import itemgetter
+from types import SimpleNamespace
+from typing import Any
+import numpy as np
+import pandas as pd
+from mvg_tracker.data_validation.validation_func import extract_digits_from_string
+from mvg_tracker.data_validation.validator import Validator
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("BatchValidation")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+REJECT_COLUMNS = ["row", "field", "error"]
+# row positions and values of some rows of a field
+Part = tuple[np.ndarray, np.ndarray]
+
+
+class _Missing:
+    """marks a field that is not part of a raw record"""
+
+
+MISSING = _Missing()
+# the field keeps its default, like a Validator that returns without setting
+DEFAULT = object()
+
+
+def _epochs_to_datetime(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """vectorized _cast_to_datetime_from_int: millisecond epochs are
+       detected by their size and every distinct second is converted once
+       in local time, like datetime.fromtimestamp"""
+    epochs = values.astype(np.int64)
+    failed = epochs <= 0
+    epochs = np.where(epochs > 2 ** 34, epochs // 1000, epochs)
+    seconds, inverse = np.unique(epochs, return_inverse=True)
+    converted = np.empty(len(seconds), dtype="datetime64[us]")
+    for i, second in enumerate(seconds):
+        try:
+            converted[i] = datetime.fromtimestamp(int(second))
+        except (OverflowError, OSError, ValueError):
+            converted[i] = np.datetime64("NaT")
+    result = converted[inverse]
+    failed |= np.isnat(result)
+    return result, failed
+
+
+def _floats_to_int(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """vectorized _cast_to_int_from_float, floats with a fraction fail"""
+    floats = values.astype(np.float64)
+    failed = ~np.isfinite(floats) | (np.floor(floats) != floats)
+    ints = np.where(failed, 0, floats).astype(np.int64)
+    return ints, failed
+
+
+def _ints_to_bool(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """vectorized _cast_to_bool_from_int, only 0 and 1 are accepted"""
+    ints = values.astype(np.int64)
+    return ints == 1, (ints != 0) & (ints != 1)
+
+
+def _extract_digits(values: np.ndarray) -> np.ndarray:
+    """vectorized extract_digits_from_string"""
+    digits = pd.Series(values, dtype=object).str.extract(r"(\d+)", expand=False)
+    return digits.astype(object).where(digits.notna(), None).to_numpy()
+
+
+# column-wise equivalents of the casts in TypeHandler.TYPE_MAPPING, all
+# other casts are applied once per distinct value
+VECTORIZED_CASTS: dict[tuple[type, type],
+                       Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]] = {
+    (int, datetime): _epochs_to_datetime,
+    (float, int): _floats_to_int,
+    (int, bool): _ints_to_bool,
+}
+# column-wise equivalents of cleaning functions, applied to the str values
+VECTORIZED_CLEANERS: dict[Callable, Callable[[np.ndarray], np.ndarray]] = {
+    extract_digits_from_string: _extract_digits,
+}
+
+
+def _column_dtype(target: type) -> str | None:
+    if target is datetime:
+        return "datetime64[us]"
+    if target is bool:
+        return "boolean"
+    if target is int:
+        return "Int64"
+    if target is float:
+        return "Float64"
+    return None
+
+
+class FieldRule:
+    """validation of one field of a batch, compiled from its Validator or
+       its plain dataclass field
+       :param field: dataclasses.Field - field of the validated class
+       :param validator: Validator - descriptor of the field, None for plain
+        fields"""
+
+    def __init__(self,
+                 field: dataclasses.Field,
+                 validator: Validator = None) -> None:
+        self.name = field.name
+        self.validator = validator
+        if validator is not None:
+            self.plan = validator.plan
+            self.target = validator.plan.target_type
+        else:
+            self.plan = None
+            self.target = field.type if isinstance(field.type, type) else object
+            # a callable returning the default for each row
+            self.plain_default = None
+            if field.default is not dataclasses.MISSING:
+                self.plain_default = lambda: field.default
+            elif field.default_factory is not dataclasses.MISSING:
+                self.plain_default = field.default_factory
+            self.shared_default = field.default is not dataclasses.MISSING
+
+    def scalar(self, value, row: SimpleNamespace) -> Any:
+        """validate a single present value exactly like Validator.__set__
+           :returns: the value to store or DEFAULT"""
+        validator = self.validator
+        value_type = type(value)
+        if isinstance(value, Validator):
+            value = value.__repr__()
+        if self.plan.is_generic:
+            if not value:
+                return DEFAULT
+            if isinstance(value, Mapping) or not hasattr(value, "__getitem__"):
+                raise TypeError(
+                    f"field '{self.name}' expects a {self.target.__name__} " +
+                    f"of items, got {value_type.__name__}")
+        if isinstance(value, self.target):
+            return value
+        if validator.cleaning_func is not None:
+            value = validator.cleaning_func.invoke(value)
+        if not isinstance(value, self.target)\
+                and value is not None\
+                and not isinstance(value, dict):
+            try:
+                value = validator.type_handler.TYPE_MAPPING[
+                    (value_type, self.target)](value)
+            except KeyError:
+                raise NotImplementedError(
+                    f"value of type {value_type} could not be automatically casted to {self.target}")
+        mapper = validator.validator_func
+        if mapper is not None and value is not None:
+            kwargs = self.plan.resolve_kwargs(row)
+            kwargs[mapper.value_kw] = value
+            try:
+                msg = mapper.func(*mapper.args, **kwargs)
+            except ValueError as e:
+                raise ValueError(
+                    f"ValidationTest failed for field '{self.name}': {e}")
+            if msg is not None:
+                logger.error(msg)
+        return value
+
+
+class BatchResult:
+    """outcome of BatchValidator.validate
+       :param valid: pd.DataFrame - typed columns of the rows that passed,
+        indexed by their position in the batch
+       :param rejects: pd.DataFrame - one row per failed field of a rejected
+        row with the columns row, field and error"""
+
+    def __init__(self, valid: pd.DataFrame, rejects: pd.DataFrame) -> None:
+        self.valid = valid
+        self.rejects = rejects
+
+    def report(self) -> pd.Series:
+        """number of rejected rows per field"""
+        return self.rejects.groupby("field").row.nunique()
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}({len(self.valid)} valid, " +
+                f"{self.rejects.row.nunique()} rejected)")
+
+
+class BatchValidator:
+    """validates a whole list of raw records for a DataWrapper class at once
+       instead of constructing one instance per record. Values are grouped
+       by their type per field: the common groups are cleaned and cast
+       column-wise, e.g. epochs to datetime64 and enums to categoricals,
+       all others go through the same steps as Validator.__set__, so a row
+       is valid exactly when constructing the class from it would succeed
+       :param cls: type - dataclass with Validator fields, nested
+        DataWrappers are not supported"""
+
+    def __init__(self, cls: type) -> None:
+        if getattr(cls, "_NESTED_FIELDS", None):
+            raise NotImplementedError(
+                f"{cls.__name__} has nested fields, which can't be validated in batches")
+        self.cls = cls
+        self.rules: list[FieldRule] = []
+        for field in dataclasses.fields(cls):
+            if not field.init:
+                continue
+            validator = cls.__dict__.get(field.name)
+            self.rules.append(FieldRule(
+                field, validator if isinstance(validator, Validator) else None))
+        self.names = frozenset(rule.name for rule in self.rules)
+        self.rules_by_name = {rule.name: rule for rule in self.rules}
+
+    def raw_columns(self,
+                    records: list[dict],
+                    by_keys: dict[frozenset, list[int]]
+                    ) -> dict[str, np.ndarray]:
+        """one object column per field, MISSING where a record lacks it. The
+           records are grouped by their keys, so each group is read with a
+           single itemgetter"""
+        n = len(records)
+        columns = {rule.name: np.full(n, MISSING, dtype=object)
+                   for rule in self.rules}
+        for keys, rows in by_keys.items():
+            fields = [rule.name for rule in self.rules if rule.name in keys]
+            if not fields:
+                continue
+            getter = itemgetter(*fields)
+            group = records if len(rows) == n else [records[i] for i in rows]
+            values = list(map(getter, group))
+            if len(fields) == 1:
+                values = [(value,) for value in values]
+            for name, column in zip(fields, zip(*values)):
+                columns[name][rows] = np.fromiter(column, dtype=object,
+                                                  count=len(rows))
+        return columns
+
+    def validate(self, records: list[dict]) -> BatchResult:
+        n = len(records)
+        rejected = np.zeros(n, dtype=bool)
+        rejects: list[tuple[int, str, str]] = []
+        by_keys: dict[frozenset, list[int]] = {}
+        for i, record in enumerate(records):
+            by_keys.setdefault(frozenset(record), []).append(i)
+        # rows with unexpected keys can't be constructed at all
+        for keys, rows in by_keys.items():
+            for key in sorted(keys - self.names):
+                rejected[rows] = True
+                rejects.extend(
+                    (i, key, f"TypeError: unexpected keyword argument '{key}'")
+                    for i in rows)
+        # validated values per field, referenced by defaults and validation
+        # steps of later fields
+        objects: dict[str, np.ndarray] = {}
+        columns: dict[str, Any] = {}
+        for name, values in self.raw_columns(records, by_keys).items():
+            rule = self.rules_by_name[name]
+            parts, errors = self._validate_field(rule, values, objects)
+            objects[name], columns[name] = self._assemble(rule, parts, n)
+            for i, error in errors.items():
+                rejected[i] = True
+                rejects.append((i, name, error))
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(n), copy=False)
+        if rejected.any():
+            frame = frame.loc[~rejected]
+        rejects = pd.DataFrame(rejects, columns=REJECT_COLUMNS)
+        if len(rejects):
+            rejects = rejects.sort_values(["row", "field"], ignore_index=True)
+        return BatchResult(frame, rejects)
+
+    def _validate_field(self,
+                        rule: FieldRule,
+                        values: np.ndarray,
+                        objects: dict[str, np.ndarray]
+                        ) -> tuple[list[Part], dict[int, str]]:
+        """:returns: tuple - the validated values as parts of row positions
+            and values and the errors of the failed rows"""
+        n = len(values)
+        kinds = np.fromiter(map(type, values), dtype=object, count=n)
+        missing = kinds == _Missing
+        errors: dict[int, str] = {}
+        parts: list[Part] = []
+        if rule.validator is None:
+            present = np.flatnonzero(~missing)
+            parts.append((present, values[present]))
+            absent = np.flatnonzero(missing)
+            if len(absent) and rule.plain_default is None:
+                errors.update((i, f"TypeError: missing argument '{rule.name}'")
+                              for i in absent)
+            elif len(absent):
+                defaults = np.empty(len(absent), dtype=object)
+                if rule.shared_default:
+                    defaults[:] = [rule.plain_default()] * len(absent)
+                else:
+                    defaults[:] = [rule.plain_default() for _ in absent]
+                parts.append((absent, defaults))
+            return parts, errors
+
+        validator = rule.validator
+        if missing.any():
+            absent = np.flatnonzero(missing)
+            if not validator.omit_logging:
+                logger.warning(
+                    f"field '{rule.name}' was not passed in {len(absent)} " +
+                    f"rows, defaulting to {validator.default}")
+            if validator.default is None and not validator.allow_none:
+                errors.update(
+                    (i, f"TypeError: missing 1 required positional argument: '{rule.name}'")
+                    for i in absent)
+            elif isinstance(validator.default, str) \
+                    and validator.default in objects:
+                parts.append((absent, objects[validator.default][absent]))
+            else:
+                defaults = np.empty(len(absent), dtype=object)
+                defaults[:] = [validator.default] * len(absent)
+                parts.append((absent, defaults))
+
+        if rule.plan.enum_type is not None:
+            present = np.flatnonzero(~missing)
+            parts.append((present, self._enum_members(rule, values[present])))
+            return parts, errors
+
+        rows = None
+        for kind in set(kinds[~missing]):
+            group = np.flatnonzero(kinds == kind)
+            group_values = values[group]
+            if issubclass(kind, rule.target):
+                if rule.plan.is_generic:
+                    # empty lists keep the default
+                    group_values = np.fromiter(
+                        (value if value else validator.default
+                         for value in group_values), dtype=object,
+                        count=len(group))
+                parts.append((group, group_values))
+                continue
+            cast = VECTORIZED_CASTS.get((kind, rule.target))
+            cleaner = VECTORIZED_CLEANERS.get(
+                getattr(validator.cleaning_func, "func", None))
+            if validator.validator_func is None \
+                    and validator.cleaning_func is None and cast is not None:
+                try:
+                    cast_values, failed = cast(group_values)
+                except (OverflowError, ValueError):
+                    # e.g. ints beyond int64, cast them one by one
+                    parts.append(self._map_distinct(
+                        rule, group, group_values, kind, errors))
+                    continue
+                parts.append((group[~failed], cast_values[~failed]))
+                for i, value in zip(group[failed], group_values[failed]):
+                    errors[i] = self._cast_error(rule, kind, value)
+                continue
+            if validator.validator_func is None \
+                    and cleaner is not None and kind is str:
+                parts.append(self._map_distinct(
+                    rule, group, cleaner(group_values), kind, errors))
+                continue
+            if validator.validator_func is None:
+                parts.append(self._map_distinct(
+                    rule, group, group_values, kind, errors, clean=True))
+                continue
+            # validation steps may refer to other fields of the row
+            if rows is None:
+                rows = [SimpleNamespace(**dict(zip(objects, row)))
+                        for row in zip(*objects.values())] \
+                    if objects else [SimpleNamespace() for _ in range(n)]
+            results = {}
+            for i, value in zip(group, group_values):
+                try:
+                    results[i] = rule.scalar(value, rows[i])
+                except Exception as e:
+                    errors[i] = f"{type(e).__name__}: {e}"
+            parts.append(self._defaults(rule, results))
+        return parts, errors
+
+    def _enum_members(self, rule: FieldRule, values: np.ndarray) -> np.ndarray:
+        """members of the enum of the field, None where a value matches none"""
+        enum_type: type[Enum] = rule.plan.enum_type
+        members: dict[Any, Enum | None] = {}
+        unmatched = 0
+        converted = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            if isinstance(value, Validator):
+                value = value.__repr__()
+            try:
+                member = members[value]
+            except (KeyError, TypeError):
+                try:
+                    member = enum_type(value)
+                except ValueError:
+                    member = None
+                    unmatched += 1
+                try:
+                    members[value] = member
+                except TypeError:
+                    pass
+            converted[i] = member
+        if unmatched:
+            logger.info(f"found {unmatched} non matching values for enum " +
+                        f"{enum_type} in field '{rule.name}'")
+        return converted
+
+    def _map_distinct(self,
+                      rule: FieldRule,
+                      group: np.ndarray,
+                      values: np.ndarray,
+                      kind: type,
+                      errors: dict[int, str],
+                      clean: bool = False) -> Part:
+        """run the remaining steps once per distinct value of a group, the
+           values were already cleaned unless clean is set"""
+        validator = rule.validator
+        done: dict[Any, tuple[bool, Any]] = {}
+        results = {}
+        for i, value in zip(group, values):
+            key = _distinct_key(value)
+            if key not in done:
+                try:
+                    if clean:
+                        result = rule.scalar(value, None)
+                    else:
+                        result = value
+                        if not isinstance(result, rule.target)\
+                                and result is not None\
+                                and not isinstance(result, dict):
+                            try:
+                                result = validator.type_handler.TYPE_MAPPING[
+                                    (kind, rule.target)](result)
+                            except KeyError:
+                                raise NotImplementedError(
+                                    f"value of type {kind} could not be automatically casted to {rule.target}")
+                    done[key] = (True, result)
+                except Exception as e:
+                    done[key] = (False, f"{type(e).__name__}: {e}")
+            ok, result = done[key]
+            if ok:
+                results[i] = result
+            else:
+                errors[i] = result
+        return self._defaults(rule, results)
+
+    @staticmethod
+    def _defaults(rule: FieldRule, results: dict[int, Any]) -> Part:
+        index = np.fromiter(results, dtype=np.intp, count=len(results))
+        values = np.empty(len(results), dtype=object)
+        values[:] = [rule.validator.default if value is DEFAULT else value
+                     for value in results.values()]
+        return index, values
+
+    @staticmethod
+    def _cast_error(rule: FieldRule, kind: type, value) -> str:
+        try:
+            rule.validator.type_handler.TYPE_MAPPING[(kind, rule.target)](value)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        return f"ValueError: could not cast {value!r} to {rule.target}"
+
+    @staticmethod
+    def _assemble(rule: FieldRule, parts: list[Part], n: int
+                  ) -> tuple[np.ndarray, Any]:
+        """merge the parts of a field into one value per row, rows without a
+           value are None
+           :returns: tuple - the values as objects and the typed column"""
+        parts = [part for part in parts if len(part[0])]
+        if len(parts) == 1 and len(parts[0][0]) == n \
+                and (parts[0][0] == np.arange(n)).all():
+            merged = parts[0][1]
+        else:
+            merged = np.full(n, None, dtype=object)
+            for index, values in parts:
+                merged[index] = values
+        objects = merged if merged.dtype == object else merged.astype(object)
+        if rule.plan is not None and rule.plan.enum_type is not None:
+            categories = list(rule.plan.enum_type)
+            codes = {member: code for code, member in enumerate(categories)}
+            return objects, pd.Categorical.from_codes(
+                [codes.get(member, -1) for member in objects],
+                categories=categories)
+        dtype = _column_dtype(rule.target)
+        if dtype is None:
+            return objects, objects
+        if merged.dtype != object:
+            # a single vectorized cast covers all rows
+            return objects, pd.array(merged, dtype=dtype)
+        try:
+            return objects, pd.array(merged, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            return objects, objects
+
+
+def _distinct_key(value) -> Any:
+    """hashable key of a raw value, equal values of different types stay
+       apart"""
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), id(value))
+    return (type(value), value)
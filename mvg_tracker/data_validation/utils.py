@@ -51,7 +51,9 @@ def get_station_attributes(config):
                           ["ID", "station", "lon", "lat", "Direction"]]
 
 
-def get_connector(**config) -> sa.engine.Connection:
+def get_engine(**config) -> sa.engine.Engine:
+    """engine with a connection pool that checks connections before handing
+       them out, so connections dropped by the server are replaced"""
     srv = "postgresql"
     user = config["user"]
     pw = config["password"]
@@ -61,14 +63,20 @@ def get_connector(**config) -> sa.engine.Connection:
     try:
         alchemyEngine = sa.create_engine(
             f'{srv}://{user}:{pw}@{host}:{port}/{db}',
-            pool_recycle=3600,)
-        alchemyEngine.connect()
+            pool_recycle=3600,
+            pool_pre_ping=True)
+        alchemyEngine.connect().close()
     except sa.exc.OperationalError:
         alchemyEngine = sa.create_engine(
             f'{srv}://{user}:{pw}@localhost:{port}',
-            pool_recycle=3600,)
-        alchemyEngine.connect()
-    return alchemyEngine.connect()
+            pool_recycle=3600,
+            pool_pre_ping=True)
+        alchemyEngine.connect().close()
+    return alchemyEngine
+
+
+def get_connector(**config) -> sa.engine.Connection:
+    return get_engine(**config).connect()
 
 
 def get_json_from_path(Path: pl.Path):
@@ -4,7 +4,7 @@ from mvg_tracker.logging_util.init_loggers import init_console_logger, init_file
 from datetime import datetime
 from copy import deepcopy
 from functools import partial
-from collections.abc import Callable
+from collections.abc import Callable, Mapping
 from typing import Any
 from enum import Enum
 from math import log2
@@ -66,9 +66,57 @@ class Function_Mapper():
         self.args = args
         self.kwargs = kwargs
     
-    def invoke(self, value):
-        self.kwargs[self.value_kw] = value
-        self.func(*self.args, **self.kwargs)
+    def invoke(self, value, **kwargs):
+        """call func with value and the stored arguments, kwargs replace
+           stored ones for this call only, so a mapper shared by all
+           instances of a class can be invoked concurrently"""
+        kwargs = {**self.kwargs, **kwargs, self.value_kw: value}
+        return self.func(*self.args, **kwargs)
+
+
+class FieldPlan:
+    """validation steps of one field compiled from its annotation and the
+       settings of its Validator, so setting the field doesn't need to
+       inspect the owner class again
+       :param annotated_type: type - annotation of the field in its class
+       :param validator_func: Function_Mapper - validation step, string
+        arguments naming a field of the instance are resolved per instance"""
+
+    __slots__ = ("enum_type", "is_generic", "target_type", "validator_kwargs",
+                 "references")
+
+    def __init__(self,
+                 annotated_type: type,
+                 validator_func: Function_Mapper = None) -> None:
+        self.enum_type = annotated_type \
+            if issubclass(annotated_type, Enum) else None
+        self.is_generic = hasattr(annotated_type, "__origin__")
+        self.target_type = getattr(annotated_type, "__origin__") \
+            if self.is_generic else annotated_type
+        self.validator_kwargs = deepcopy(validator_func.kwargs) \
+            if validator_func is not None else {}
+        # (key, index within a list argument or None, referenced name)
+        self.references: list[tuple[str, int | None, str]] = []
+        for key, val in self.validator_kwargs.items():
+            if isinstance(val, list):
+                self.references.extend((key, i, v) for i, v in enumerate(val)
+                                       if isinstance(v, str))
+            elif isinstance(val, str):
+                self.references.append((key, None, val))
+
+    def resolve_kwargs(self, instance) -> dict:
+        """arguments of the validation step with the references to fields of
+           the instance replaced by their values"""
+        kwargs = {key: list(val) if isinstance(val, list) else val
+                  for key, val in self.validator_kwargs.items()}
+        for key, index, name in self.references:
+            if not hasattr(instance, name):
+                continue
+            if index is None:
+                kwargs[key] = getattr(instance, name)
+            else:
+                kwargs[key][index] = getattr(instance, name)
+        return kwargs
 
 
 class Validator:
@@ -95,6 +143,7 @@ class Validator:
         either the default value or the value passed by the owner class \
         defaults itself to none   
     """
+    logger: logging.Logger = None
 
     def __init__(self,
                  type_handler: TypeHandler,
@@ -110,20 +159,28 @@ class Validator:
         self.allow_none = allow_none
         self.default = default
         self.omit_logging = omit_logging
+        self.plan: FieldPlan = None
         self.init_logger()
 
     def init_logger(self):
-
-        self.logger = logging.getLogger()
-        self.logger = init_console_logger(self.logger)
+        """all validators share the root logger, it is only set up once"""
+        if Validator.logger is None:
+            Validator.logger = init_console_logger(logging.getLogger())
         if LOG_DIRECTORY is not None:
-            self.logger = init_file_logger(self.logger, LOG_DIRECTORY)
+            init_file_logger(Validator.logger, LOG_DIRECTORY)
 
     def __repr__(self) -> str:
         return str(self.default)
 
     def __set_name__(self, owner, name):
         self.name = name
+        annotations = getattr(owner, "__annotations__", {})
+        if name in annotations:
+            self.compile(annotations[name])
+
+    def compile(self, annotated_type: type) -> FieldPlan:
+        self.plan = FieldPlan(annotated_type, self.validator_func)
+        return self.plan
 
     def __get__(self, instance, owner):
         if not instance:
@@ -135,8 +192,9 @@ class Validator:
         del instance.__dict__[self.name]
 
     def __set__(self, instance, value):
-
-        annotated_type = instance.__annotations__[self.name]
+        plan = self.plan
+        if plan is None:
+            plan = self.compile(instance.__annotations__[self.name])
 
         if value is self:
             if not self.omit_logging:
@@ -155,74 +213,60 @@ class Validator:
             else:
                 value = self.default
                 return
-        # apply function to clean the possible values
-        
-        # cast to annotated values if applicable
+
         value_type = type(value)
         if isinstance(value, Validator):
             value = value.__repr__()
 
-        if issubclass(annotated_type, Enum):
+        if plan.enum_type is not None:
             try:
-                value = annotated_type(value)
+                value = plan.enum_type(value)
             except ValueError:
-                self.logger.info(f"found non matching value for enum {annotated_type} of value {value}")
+                self.logger.info(f"found non matching value for enum {plan.enum_type} of value {value}")
                 value = None
             finally:
                 instance.__dict__[self.name] = value
             return
 
-        if hasattr(annotated_type, "__origin__"):
-            sub_annotated_type = annotated_type.__args__[0]
-            annotated_type = getattr(annotated_type, "__origin__")
+        annotated_type = plan.target_type
+        if plan.is_generic:
             # return if list is empty
             if not value:
                 return
-            sub_value_type = type(value[0])
-        else:
-            sub_annotated_type = type(None)
+            # the items of a generic field are indexed, a mapping or a scalar
+            # can't be one of its values
+            if isinstance(value, Mapping) or not hasattr(value, "__getitem__"):
+                raise TypeError(
+                    f"field '{self.name}' expects a {annotated_type.__name__} " +
+                    f"of items, got {value_type.__name__}")
 
         if isinstance(value, annotated_type):
             instance.__dict__[self.name] = value
             return
+        # apply function to clean the possible values
         if self.cleaning_func is not None:
             value = self.cleaning_func.invoke(value)
 
+        # cast to annotated values if applicable
         if not isinstance(value, annotated_type)\
                 and value is not None\
                 and not isinstance(value, dict):
-            # pass test if int is compared to float
             try:
-                if isinstance(sub_annotated_type, type(None)):
-                    fct_to_call = self.type_handler.TYPE_MAPPING[
-                        (sub_value_type, sub_annotated_type)]
-                    value = map(fct_to_call, value)
-                else:
-                    fct_to_call = self.type_handler.TYPE_MAPPING[
-                        (value_type, annotated_type)]
-                    value = fct_to_call(value)
-
+                value = self.type_handler.TYPE_MAPPING[
+                    (value_type, annotated_type)](value)
             except KeyError:
                 raise NotImplementedError(
                     f"value of type {value_type} could not be automatically casted to {annotated_type}")
 
         try:
             if self.validator_func is not None and value is not None:
-                temp_bounds = deepcopy(self.validator_func.kwargs)
                 # for getting proxy reference e.g. outputpath = "inputpath" with "inputpath" being a reference to the
-                # field inputpath of the class itself same with the reference nested inside a list 
-                for key, val in temp_bounds.items():
-                    if isinstance(val, list):
-                        for i, v in enumerate(val):
-                            if not isinstance(v, str):
-                                continue
-                            elif hasattr(instance, v):
-                                val[i] = getattr(instance, v)
-                    else:
-                        if hasattr(instance, str(val)):
-                            temp_bounds[key] = getattr(instance, val)
-                self.validator_func.kwargs = temp_bounds
-                msg = self.validator_func.invoke(value)
+                # field inputpath of the class itself same with the reference nested inside a list
+                if plan.references:
+                    msg = self.validator_func.invoke(
+                        value, **plan.resolve_kwargs(instance))
+                else:
+                    msg = self.validator_func.invoke(value)
                 if msg is not None:
                     self.logger.error(msg)
         except ValueError as e:
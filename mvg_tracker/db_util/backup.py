@@ -0,0 +1,205 @@
+import gzip
+import logging
+import os
+import pathlib as pl
+import time
+from datetime import date, datetime, timedelta
+import sqlalchemy as sa
+from mvg_tracker.db_util.partitions import PartitionManager
+from mvg_tracker.db_util.writer import CopyUpsertWriter
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DbBackup")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+SUFFIX = ".csv.gz"
+
+
+# set by a trigger to the id of the transaction that wrote a row last
+CHANGE_COLUMN = "change_xid"
+
+
+class IncrementalBackup:
+    """backs up the rows of a table that were added or changed since the
+       last backup. Rows are streamed with COPY ... TO STDOUT into one gzip
+       compressed csv per day of day_column, e.g.
+       <folder>/departures/2022-05-27.csv.gz, later backups of the same day
+       are appended.
+       Changes are found by CHANGE_COLUMN, which a trigger sets on every
+       insert and update whoever writes the row. The watermark kept in
+       <folder>/<table>.watermark is the oldest transaction still running
+       when the last backup took its snapshot, so rows committed after it,
+       e.g. by an import with old record times, are never skipped. Rows of
+       transactions running at that time may be backed up twice, restoring
+       upserts them
+       :param connection: sa.engine.Connection - connection to postgres
+       :param table: str - table to back up
+       :param folder: pl.Path - client side backup directory
+       :param day_column: str - timestamp column the day files are split by
+       :param compresslevel: int - gzip compression level"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 table: str,
+                 folder: pl.Path,
+                 day_column: str = "time_of_record",
+                 compresslevel: int = 6) -> None:
+        self.connection = connection
+        self.table = table
+        self.folder = pl.Path(folder)
+        self.day_column = day_column
+        self.compresslevel = compresslevel
+        self.watermark_path = self.folder.joinpath(f"{table}.watermark")
+        self._schema_ready = False
+
+    def day_path(self, day: date) -> pl.Path:
+        return self.folder.joinpath(self.table, f"{day:%Y-%m-%d}{SUFFIX}")
+
+    def read_watermark(self) -> int | datetime | None:
+        """:returns: transaction id, a datetime of day_column for watermarks
+            written before CHANGE_COLUMN existed, or None"""
+        if not self.watermark_path.exists():
+            return None
+        watermark = self.watermark_path.read_text().strip()
+        if watermark.isdigit():
+            return int(watermark)
+        return datetime.fromisoformat(watermark)
+
+    def write_watermark(self, watermark: int) -> None:
+        temp_path = self.watermark_path.with_suffix(".tmp")
+        temp_path.write_text(str(watermark))
+        os.replace(temp_path, self.watermark_path)
+
+    def ensure_schema(self, cursor) -> None:
+        """add CHANGE_COLUMN, its trigger and the index the incremental
+           queries filter on, rows written before keep it empty"""
+        if self._schema_ready:
+            return
+        cursor.execute(
+            f"ALTER TABLE {self.table} " +
+            f"ADD COLUMN IF NOT EXISTS {CHANGE_COLUMN} xid8")
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION {self.table}_set_{CHANGE_COLUMN}()
+            RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                NEW.{CHANGE_COLUMN} := pg_current_xact_id();
+                RETURN NEW;
+            END $$""")
+        cursor.execute(f"""
+            CREATE OR REPLACE TRIGGER {self.table}_{CHANGE_COLUMN}
+            BEFORE INSERT OR UPDATE ON {self.table}
+            FOR EACH ROW EXECUTE FUNCTION {self.table}_set_{CHANGE_COLUMN}()""")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS " +
+            f"{self.table}_{CHANGE_COLUMN}_idx " +
+            f"ON {self.table} ({CHANGE_COLUMN})")
+        self._schema_ready = True
+
+    def changed_condition(self, watermark: int | datetime | None) -> str:
+        if watermark is None:
+            return "true"
+        if isinstance(watermark, datetime):
+            # first backup after CHANGE_COLUMN was added
+            return (f"({CHANGE_COLUMN} is not null or " +
+                    f"{self.day_column} > %(watermark)s)")
+        return f"{CHANGE_COLUMN} >= %(watermark)s::text::xid8"
+
+    def run(self) -> int:
+        """back up everything changed since the watermark
+           :returns: int - number of rows written"""
+        start = time.perf_counter()
+        watermark = self.read_watermark()
+        after = self.changed_condition(watermark)
+        day = f"{self.day_column}::date"
+        rows = 0
+        try:
+            with self.connection.begin(), \
+                    self.connection.connection.cursor() as cursor:
+                self.ensure_schema(cursor)
+            with self.connection.begin(), \
+                    self.connection.connection.cursor() as cursor:
+                # one snapshot for the watermark and all day files
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute(
+                    "select pg_snapshot_xmin(pg_current_snapshot())::text")
+                next_watermark = int(cursor.fetchone()[0])
+                cursor.execute(
+                    f"select distinct {day} from {self.table} " +
+                    f"where {after} order by 1", {"watermark": watermark})
+                days = [row[0] for row in cursor.fetchall()]
+                cursor.execute(f"select * from {self.table} limit 0")
+                columns = [description[0] for description in cursor.description
+                           if description[0] != CHANGE_COLUMN]
+                for changed_day in days:
+                    query = cursor.mogrify(
+                        f"COPY (SELECT {','.join(columns)} FROM {self.table} " +
+                        f"WHERE {after} AND {day} = %(day)s) " +
+                        "TO STDOUT WITH (FORMAT csv)",
+                        {"watermark": watermark, "day": changed_day}).decode()
+                    rows += self._copy_day(cursor, query, changed_day, columns)
+        except Exception:
+            self._schema_ready = False
+            raise
+        self.write_watermark(next_watermark)
+        logger.info(f"backed up {rows} rows of {self.table} changed since " +
+                    f"{watermark} in {time.perf_counter() - start:.2f}s")
+        return rows
+
+    def _copy_day(self, cursor, query: str, day: date, columns: list[str]) -> int:
+        path = self.day_path(day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not path.exists()
+        # appending adds a new gzip member, which readers decompress
+        # transparently, the header is only written once per file
+        with gzip.open(path, "ab", self.compresslevel) as file:
+            if is_new:
+                file.write((",".join(columns) + "\n").encode())
+            cursor.copy_expert(query, file)
+        return max(cursor.rowcount, 0)
+
+
+def backup_files(folder: pl.Path,
+                 table: str,
+                 start: date = None,
+                 end: date = None) -> list[tuple[date, pl.Path]]:
+    """day files of an IncrementalBackup in chronological order
+       :param start: date - skip days before, defaults to all
+       :param end: date - skip days from this day on"""
+    files = []
+    for path in sorted(pl.Path(folder).joinpath(table).glob("*" + SUFFIX)):
+        day = date.fromisoformat(path.name[:-len(SUFFIX)])
+        if start is not None and day < start:
+            continue
+        if end is not None and day >= end:
+            continue
+        files.append((day, path))
+    return files
+
+
+def restore_backup(writer: CopyUpsertWriter,
+                   folder: pl.Path,
+                   start: date = None,
+                   end: date = None,
+                   partitions: PartitionManager = None) -> int:
+    """upsert the day files of an IncrementalBackup of writer.table, one day
+       per transaction, later files win over earlier ones
+       :param partitions: PartitionManager - creates the partitions of each
+        restored day if the table is partitioned, detached ones are attached
+        again
+       :returns: int - number of restored rows"""
+    rows = 0
+    for day, path in backup_files(folder, writer.table, start, end):
+        if partitions is not None:
+            # rows recorded on a day depart at most a day before or after
+            partitions.ensure_range(day - timedelta(days=1),
+                                    day + timedelta(days=1),
+                                    reattach=True)
+        with gzip.open(path, "rt") as file:
+            columns = file.readline().strip().split(",")
+            day_rows = writer.write_csv(file, columns)
+        logger.info(f"restored {day_rows} rows of {day} from {path.name}")
+        rows += day_rows
+    return rows
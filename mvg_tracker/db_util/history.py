@@ -0,0 +1,91 @@
+import io
+import logging
+import time
+import pandas as pd
+import sqlalchemy as sa
+from mvg_tracker.db_util.transaction import transaction
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DbHistory")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+
+class DelayHistoryWriter:
+    """appends delay changes to a compact history table, one row per observed
+       change of the delay of a departure. observed_at is stored as epoch
+       seconds and delay as smallint to keep the rows small. A departure has
+       one row per observation time, writing the same changes again, e.g.
+       when a flush is retried, adds nothing
+       :param connection: sa.engine.Connection - connection to postgres
+       :param table: str - history table, created if missing"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 table: str) -> None:
+        self.connection = connection
+        self.table = table
+        self.last_rows = 0
+        self._table_ready = False
+
+    def ensure_table(self, cursor) -> None:
+        if self._table_ready:
+            return
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                departure_id bigint NOT NULL,
+                observed_at integer NOT NULL,
+                delay smallint NOT NULL
+            )""")
+        cursor.execute("select to_regclass(%s)", (f"{self.table}_key",))
+        if cursor.fetchone()[0] is None:
+            # retried flushes could write a change twice before the key
+            # existed
+            cursor.execute(
+                f"delete from {self.table} a using {self.table} b " +
+                "where a.ctid > b.ctid and a.departure_id = b.departure_id " +
+                "and a.observed_at = b.observed_at")
+            cursor.execute(
+                f"DROP INDEX IF EXISTS {self.table}_departure_id_idx")
+            cursor.execute(
+                f"CREATE UNIQUE INDEX {self.table}_key " +
+                f"ON {self.table} (departure_id, observed_at)")
+        self._table_ready = True
+
+    def write(self, historyDf: pd.DataFrame) -> int:
+        """append all rows of the DataFrame in one transaction, or in the
+           one the caller began, rows that are already stored are skipped
+           :returns: int - number of rows written"""
+        if historyDf.empty:
+            return 0
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        historyDf.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        columns = ",".join(historyDf.columns)
+        staging = f"{self.table}_staging"
+        try:
+            with transaction(self.connection), \
+                    self.connection.connection.cursor() as cursor:
+                self.ensure_table(cursor)
+                # COPY can't skip conflicts, stage the rows first, the temp
+                # table lives as long as the session
+                cursor.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {staging} " +
+                    f"(LIKE {self.table}) ON COMMIT DELETE ROWS")
+                cursor.copy_expert(
+                    f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                    buffer)
+                cursor.execute(
+                    f"insert into {self.table} ({columns}) " +
+                    f"select {columns} from {staging} on conflict do nothing")
+                inserted = cursor.rowcount
+        except Exception:
+            self._table_ready = False
+            raise
+        self.last_rows = inserted
+        logger.info(f"appended {self.last_rows} of {len(historyDf)} delay " +
+                    f"changes to {self.table} in " +
+                    f"{time.perf_counter() - start:.2f}s")
+        return self.last_rows
@@ -0,0 +1,50 @@
+import logging
+import time
+import sqlalchemy as sa
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.departure_key import departure_key_sql
+
+
+logger = logging.getLogger("DbKeyMigration")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+
+def text_key_tables(cursor, pattern: str) -> list[str]:
+    """tables matching the LIKE pattern that still store departure_id as text,
+       partitions are left out since they follow their parent"""
+    cursor.execute("""
+        select c.table_name
+        from information_schema.columns c
+        join pg_class p on p.relname = c.table_name
+        where c.table_schema = current_schema()
+        and c.table_name like %s
+        and c.column_name = 'departure_id'
+        and c.data_type = 'text'
+        and not p.relispartition
+        order by c.table_name""", (pattern,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate_departure_keys(connection: sa.engine.Connection,
+                           tables: list[str]) -> list[str]:
+    """convert the text departure ids '<station_id>_<epoch>_<label>_<product>'
+       of the given tables in place into the packed keys of
+       pack_departure_key, tables that are already converted are skipped.
+       Files written before keep their text ids, CopyUpsertWriter packs them
+       while importing
+       :param tables: list - tables with a departure_id column
+       :returns: list - the converted tables"""
+    converted = []
+    with connection.begin(), connection.connection.cursor() as cursor:
+        for table in tables:
+            if not text_key_tables(cursor, table.replace("_", "\\_")):
+                continue
+            start = time.perf_counter()
+            cursor.execute(
+                f"ALTER TABLE {table} ALTER COLUMN departure_id " +
+                f"TYPE bigint USING {departure_key_sql('departure_id')}")
+            logger.info(f"converted the departure ids of {table} in " +
+                        f"{time.perf_counter() - start:.1f}s")
+            converted.append(table)
+    return converted
@@ -0,0 +1,151 @@
+import logging
+import os
+import pathlib as pl
+import time
+from collections.abc import Iterator
+from datetime import date, timedelta
+import pandas as pd
+import sqlalchemy as sa
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("ParquetArchive")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+PARTITION_KEY = "day"
+FILE_NAME = "part-0.parquet"
+
+
+def _pyarrow():
+    """pyarrow is only needed for the archive, import it on first use"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "the parquet archive needs pyarrow, install it with " +
+            "'pip install pyarrow'") from e
+    return pyarrow
+
+
+def departure_schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("time_of_dep", pa.timestamp("us")),
+        ("line_id", pa.int32()),
+        ("delay", pa.int16()),
+        ("time_of_record", pa.timestamp("us")),
+        ("station_id", pa.int32()),
+        ("destination_id", pa.int32()),
+        ("departure_id", pa.int64()),
+    ])
+
+
+class ParquetArchive:
+    """columnar archive of a departures table with one parquet file per day
+       of time_of_dep in a hive partitioned layout, e.g.
+       <folder>/<table>/day=2022-05-27/part-0.parquet. Days are exported and
+       reloaded in streamed chunks, so memory stays bounded by chunk_rows
+       :param folder: pl.Path - root directory of the archive
+       :param table: str - archived table
+       :param chunk_rows: int - rows per fetch and per parquet row group"""
+
+    def __init__(self,
+                 folder: pl.Path,
+                 table: str,
+                 chunk_rows: int = 100000) -> None:
+        self.folder = pl.Path(folder)
+        self.table = table
+        self.chunk_rows = chunk_rows
+        self.schema = departure_schema()
+
+    @property
+    def root(self) -> pl.Path:
+        return self.folder.joinpath(self.table)
+
+    def day_path(self, day: date) -> pl.Path:
+        return self.root.joinpath(f"{PARTITION_KEY}={day.isoformat()}",
+                                  FILE_NAME)
+
+    def archived_days(self) -> list[date]:
+        return sorted(date.fromisoformat(path.parent.name.split("=", 1)[1])
+                      for path in self.root.glob(f"{PARTITION_KEY}=*/{FILE_NAME}"))
+
+    def export_day(self,
+                   connection: sa.engine.Connection,
+                   day: date) -> int:
+        """write all rows departing on day into its parquet file, the file
+           is replaced atomically once it is complete
+           :returns: int - number of exported rows"""
+        pa = _pyarrow()
+        path = self.day_path(day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # the dataset discovery ignores files starting with an underscore
+        temp_path = path.with_name(f"_{FILE_NAME}.tmp")
+        names = self.schema.names
+        rows = 0
+        # a named cursor streams the rows from the server in chunks, it only
+        # lives as long as the transaction
+        with connection.begin(), \
+                connection.connection.cursor(
+                    name=f"export_{self.table}") as cursor:
+            cursor.itersize = self.chunk_rows
+            cursor.execute(
+                f"select {','.join(names)} from {self.table} " +
+                "where time_of_dep >= %(day)s and time_of_dep < %(next_day)s",
+                {"day": day, "next_day": day + timedelta(days=1)})
+            with pa.parquet.ParquetWriter(temp_path,
+                                          self.schema,
+                                          compression="zstd") as writer:
+                while records := cursor.fetchmany(self.chunk_rows):
+                    columns = list(zip(*records))
+                    writer.write_batch(pa.record_batch(
+                        [pa.array(column, type=field.type)
+                         for column, field in zip(columns, self.schema)],
+                        schema=self.schema))
+                    rows += len(records)
+        os.replace(temp_path, path)
+        return rows
+
+    def export(self,
+               connection: sa.engine.Connection,
+               start: date,
+               end: date,
+               overwrite: bool = False) -> int:
+        """export every day from start until before end, days that are
+           already archived are skipped unless overwrite is set
+           :returns: int - number of exported rows"""
+        archived = set(self.archived_days())
+        rows = 0
+        day = start
+        while day < end:
+            if overwrite or day not in archived:
+                started = time.perf_counter()
+                day_rows = self.export_day(connection, day)
+                logger.info(f"exported {day_rows} rows of {day} in " +
+                            f"{time.perf_counter() - started:.2f}s")
+                rows += day_rows
+            day += timedelta(days=1)
+        return rows
+
+    def iter_frames(self,
+                    start: date = None,
+                    end: date = None) -> Iterator[pd.DataFrame]:
+        """read the archived rows departing from start until before end, only
+           the files of the selected days are opened. Every file is read with
+           its own schema, files written before the departure ids were packed
+           yield them as text, which CopyUpsertWriter packs while importing
+           :yields: pd.DataFrame - chunks of at most chunk_rows rows"""
+        pa = _pyarrow()
+        for day in self.archived_days():
+            if start is not None and day < start:
+                continue
+            if end is not None and day >= end:
+                continue
+            parquet_file = pa.parquet.ParquetFile(self.day_path(day))
+            for batch in parquet_file.iter_batches(
+                    batch_size=self.chunk_rows, columns=self.schema.names):
+                if batch.num_rows:
+                    yield batch.to_pandas()
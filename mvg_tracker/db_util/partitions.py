@@ -0,0 +1,324 @@
+import logging
+from datetime import date, datetime, timedelta
+import sqlalchemy as sa
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DbPartitions")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+INTERVALS = ("day", "month")
+# column layout of a newly created departures table, matches what to_sql
+# created for the former unpartitioned table
+DEPARTURES_DDL = """
+    time_of_dep timestamp without time zone NOT NULL,
+    line_id bigint,
+    delay bigint,
+    time_of_record timestamp without time zone,
+    station_id bigint,
+    destination_id bigint,
+    departure_id bigint NOT NULL
+"""
+
+
+class DetachedPartitionError(Exception):
+    def __init__(self, message: str = None) -> None:
+        super().__init__(message)
+
+
+class PartitionManager:
+    """keeps a table range partitioned on partition_column with one partition
+       per day or month, named like departures_p20220527 or
+       departures_p202205. Partitions are created ahead of time, so writes
+       only touch existing partitions, and old ones are detached without
+       blocking writes. Detached partitions keep their name, writes into
+       their range fail unless they are attached again
+       :param connection: sa.engine.Connection - connection to postgres
+       :param table: str - partitioned table
+       :param interval: str - 'day' or 'month'
+       :param ahead: int - partitions created after the current one
+       :param retain: int - partitions before the current one that stay
+        attached, None keeps all
+       :param partition_column: str - range partition key, part of the
+        primary key (departure_id, partition_column)"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 table: str,
+                 interval: str = "month",
+                 ahead: int = 1,
+                 retain: int = None,
+                 partition_column: str = "time_of_dep") -> None:
+        if interval not in INTERVALS:
+            raise ValueError(
+                f"interval must be one of {INTERVALS}, got {interval}")
+        self.connection = connection
+        self.table = table
+        self.interval = interval
+        self.ahead = ahead
+        self.retain = retain
+        self.partition_column = partition_column
+        self._existing: set[date] = None
+        self._detached: set[date] = None
+
+    @classmethod
+    def from_config(cls,
+                    connection: sa.engine.Connection,
+                    table: str,
+                    partitionParams: dict) -> "PartitionManager":
+        return cls(connection,
+                   table,
+                   interval=partitionParams.get("interval", "month"),
+                   ahead=partitionParams.get("ahead", 1),
+                   retain=partitionParams.get("retain"))
+
+    def partition_start(self, value: datetime | date) -> date:
+        """start of the partition holding value"""
+        if self.interval == "day":
+            return date(value.year, value.month, value.day)
+        return date(value.year, value.month, 1)
+
+    def next_start(self, start: date) -> date:
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        if start.month == 12:
+            return date(start.year + 1, 1, 1)
+        return date(start.year, start.month + 1, 1)
+
+    def partition_name(self, start: date) -> str:
+        suffix = start.strftime("%Y%m%d" if self.interval == "day" else "%Y%m")
+        return f"{self.table}_p{suffix}"
+
+    def _parse_name(self, name: str) -> date | None:
+        suffix = name[len(self.table) + 2:]
+        fmt = "%Y%m%d" if self.interval == "day" else "%Y%m"
+        try:
+            return datetime.strptime(suffix, fmt).date()
+        except ValueError:
+            return None
+
+    def _execute(self, statements: list[str], autocommit: bool = False):
+        """run the statements in one transaction
+           :returns: list - rows of the last statement, None if it returns
+            none"""
+        if autocommit:
+            return self._execute_autocommit(statements)
+        with self.connection.begin(), \
+                self.connection.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            return cursor.fetchall() if cursor.description else None
+
+    def _execute_autocommit(self, statements: list[str]) -> None:
+        # DETACH ... CONCURRENTLY can't run inside a transaction
+        self.connection.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            with self.connection.begin(), \
+                    self.connection.connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+        finally:
+            self.connection.execution_options(
+                isolation_level=self.connection.default_isolation_level)
+
+    def relkind(self) -> str | None:
+        """'p' for a partitioned table, 'r' for a plain one, None if it
+           doesn't exist"""
+        rows = self._execute([
+            "select c.relkind from pg_class c " +
+            "join pg_namespace n on n.oid = c.relnamespace " +
+            f"where c.relname = '{self.table}' and n.nspname = current_schema()"
+        ])
+        return rows[0][0] if rows else None
+
+    def attached_partitions(self) -> list[date]:
+        rows = self._execute([
+            "select child.relname from pg_inherits " +
+            "join pg_class parent on parent.oid = pg_inherits.inhparent " +
+            "join pg_class child on child.oid = pg_inherits.inhrelid " +
+            f"where parent.relname = '{self.table}'"
+        ])
+        starts = (self._parse_name(name) for name, in rows or [])
+        return sorted(start for start in starts if start is not None)
+
+    def detached_partitions(self) -> list[date]:
+        """plain tables named like a partition of the table"""
+        rows = self._execute([
+            "select c.relname from pg_class c " +
+            "join pg_namespace n on n.oid = c.relnamespace " +
+            "where c.relkind = 'r' and not c.relispartition " +
+            f"and c.relname like '{self.table}_p%' " +
+            "and n.nspname = current_schema()"
+        ])
+        starts = (self._parse_name(name) for name, in rows or [])
+        return sorted(start for start in starts if start is not None)
+
+    def _load_partitions(self) -> None:
+        self._existing = set(self.attached_partitions())
+        self._detached = set(self.detached_partitions())
+
+    def oldest_attached(self) -> date | None:
+        """start of the oldest attached partition, None if there is none"""
+        if self._existing is None:
+            self._load_partitions()
+        return min(self._existing, default=None)
+
+    def _create_statements(self, starts: list[date]) -> list[str]:
+        return [
+            f"CREATE TABLE IF NOT EXISTS {self.partition_name(start)} " +
+            f"PARTITION OF {self.table} FOR VALUES FROM ('{start}') " +
+            f"TO ('{self.next_start(start)}')"
+            for start in starts]
+
+    def ensure_schema(self, now: datetime = None) -> None:
+        """create the partitioned table, or migrate a plain table into it,
+           and create the partitions around now"""
+        kind = self.relkind()
+        if kind is None:
+            logger.info(f"creating partitioned table {self.table}")
+            self._execute([
+                f"CREATE TABLE {self.table} ({DEPARTURES_DDL}, " +
+                f"PRIMARY KEY (departure_id, {self.partition_column})) " +
+                f"PARTITION BY RANGE ({self.partition_column})"])
+        elif kind != "p":
+            self.migrate()
+        self._load_partitions()
+        self.ensure_partitions(now)
+
+    def migrate(self) -> None:
+        """move the rows of a plain table into a partitioned table of the
+           same name, the plain table is kept as <table>_unpartitioned"""
+        legacy = f"{self.table}_unpartitioned"
+        logger.info(f"migrating {self.table} to a partitioned table, " +
+                    f"keeping the old table as {legacy}")
+        bounds = self._execute([
+            f"select min({self.partition_column}), " +
+            f"max({self.partition_column}) from {self.table}"])[0]
+        starts = self._starts_between(*bounds) if bounds[0] else []
+        self._execute([
+            f"ALTER TABLE {self.table} RENAME TO {legacy}",
+            f"ALTER INDEX IF EXISTS {self.table}_pkey RENAME TO {legacy}_pkey",
+            f"CREATE TABLE {self.table} (LIKE {legacy} INCLUDING DEFAULTS) " +
+            f"PARTITION BY RANGE ({self.partition_column})",
+            f"ALTER TABLE {self.table} ALTER COLUMN " +
+            f"{self.partition_column} SET NOT NULL",
+            f"ALTER TABLE {self.table} ADD PRIMARY KEY " +
+            f"(departure_id, {self.partition_column})",
+            *self._create_statements(starts),
+            f"INSERT INTO {self.table} SELECT * FROM {legacy} " +
+            f"WHERE {self.partition_column} IS NOT NULL " +
+            f"ON CONFLICT DO NOTHING"])
+        logger.info(f"migrated {self.table} into {len(starts)} partitions, " +
+                    f"{legacy} can be dropped")
+
+    def _starts_between(self,
+                        first: datetime | date,
+                        last: datetime | date) -> list[date]:
+        starts = []
+        start = self.partition_start(first)
+        last_start = self.partition_start(last)
+        while start <= last_start:
+            starts.append(start)
+            start = self.next_start(start)
+        return starts
+
+    def ensure_range(self,
+                     first: datetime | date,
+                     last: datetime | date,
+                     reattach: bool = False) -> None:
+        """make sure partitions for all rows between first and last exist
+           :param reattach: bool - attach detached partitions in the range
+            again, e.g. to restore old rows
+           :raises DetachedPartitionError, if the range holds a detached
+            partition and reattach is False"""
+        if self._existing is None:
+            self._load_partitions()
+        missing = [start for start in self._starts_between(first, last)
+                   if start not in self._existing]
+        if not missing:
+            return
+        detached = [start for start in missing if start in self._detached]
+        if detached and not reattach:
+            # creating them would silently do nothing, the insert would
+            # then fail on a missing partition
+            raise DetachedPartitionError(
+                f"rows between {first} and {last} belong to the detached " +
+                "partitions " + ", ".join(map(self.partition_name, detached)))
+        if detached:
+            self.reattach(detached)
+            missing = [start for start in missing if start not in detached]
+            if not missing:
+                return
+        self._execute(self._create_statements(missing))
+        self._existing.update(missing)
+        logger.info("created partitions " +
+                    ", ".join(map(self.partition_name, missing)))
+
+    def _missing_column_statements(self, name: str) -> list[str]:
+        """columns added to the table after the partition was detached"""
+        rows = self._execute([
+            "select a.attname, format_type(a.atttypid, a.atttypmod) " +
+            "from pg_attribute a " +
+            f"where a.attrelid = '{self.table}'::regclass " +
+            "and a.attnum > 0 and not a.attisdropped " +
+            "and a.attname not in (select attname from pg_attribute " +
+            f"where attrelid = '{name}'::regclass " +
+            "and attnum > 0 and not attisdropped)"
+        ])
+        return [f"ALTER TABLE {name} ADD COLUMN {column} {column_type}"
+                for column, column_type in rows or []]
+
+    def reattach(self, starts: list[date]) -> None:
+        """attach detached partitions again"""
+        statements = []
+        for start in starts:
+            name = self.partition_name(start)
+            statements += self._missing_column_statements(name)
+            statements.append(
+                f"ALTER TABLE {self.table} ATTACH PARTITION {name} " +
+                f"FOR VALUES FROM ('{start}') TO ('{self.next_start(start)}')")
+        self._execute(statements)
+        self._existing.update(starts)
+        self._detached.difference_update(starts)
+        logger.info("attached partitions " +
+                    ", ".join(map(self.partition_name, starts)) + " again")
+
+    def ensure_partitions(self, now: datetime = None) -> None:
+        """create the current and the next ahead partitions"""
+        now = datetime.now() if now is None else now
+        last = self.partition_start(now)
+        for _ in range(self.ahead):
+            last = self.next_start(last)
+        self.ensure_range(now, last)
+
+    def detach_old(self, now: datetime = None) -> list[str]:
+        """detach the partitions older than retain partitions before the
+           current one, detached partitions stay as plain tables for
+           archiving or dropping
+           :returns: list - names of the detached partitions"""
+        if self.retain is None:
+            return []
+        now = datetime.now() if now is None else now
+        cutoff = self.partition_start(now)
+        for _ in range(self.retain):
+            cutoff = self.partition_start(cutoff - timedelta(days=1))
+        detached = []
+        for start in self.attached_partitions():
+            if start >= cutoff:
+                continue
+            name = self.partition_name(start)
+            self._execute([f"ALTER TABLE {self.table} DETACH PARTITION " +
+                           f"{name} CONCURRENTLY"], autocommit=True)
+            if self._existing is not None:
+                self._existing.discard(start)
+                self._detached.add(start)
+            detached.append(name)
+        if detached:
+            logger.info(f"detached partitions {', '.join(detached)}")
+        return detached
+
+    def maintain(self, now: datetime = None) -> None:
+        """create upcoming partitions and detach expired ones"""
+        self.ensure_partitions(now)
+        self.detach_old(now)
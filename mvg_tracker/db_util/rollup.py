@@ -0,0 +1,154 @@
+import io
+import logging
+import time
+import pandas as pd
+import sqlalchemy as sa
+from mvg_tracker.db_util.transaction import transaction
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DbRollup")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+GROUP_COLUMNS = ("station_id", "line_id", "date", "hour")
+
+
+class HourlyRollup:
+    """maintains a rollup of the departures per station, line, date and hour
+       of the planned departure with count, sum, sum of squares, min and max
+       of the delay. Every flush recomputes the groups it touched from the
+       departures table, so later changes of a delay replace its old value
+       instead of being counted twice
+       :param connection: sa.engine.Connection - connection to postgres
+       :param table: str - rollup table, created if missing
+       :param departure_table: str - table the rollup is computed from
+       :param touched_table: str - unlogged table collecting the touched
+        groups of a flush"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 table: str,
+                 departure_table: str,
+                 touched_table: str = None) -> None:
+        self.connection = connection
+        self.table = table
+        self.departure_table = departure_table
+        self.touched_table = touched_table or f"{table}_touched"
+        self.last_groups = 0
+        self._tables_ready = False
+
+    def ensure_tables(self, cursor) -> bool:
+        """create the rollup and its helper tables
+           :returns: bool - whether the rollup table was newly created"""
+        if self._tables_ready:
+            return False
+        cursor.execute("select to_regclass(%s)", (self.table,))
+        created = cursor.fetchone()[0] is None
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                station_id bigint NOT NULL,
+                line_id bigint NOT NULL,
+                date date NOT NULL,
+                hour smallint NOT NULL,
+                count integer NOT NULL,
+                delay_sum bigint NOT NULL,
+                delay_sum_sq bigint NOT NULL,
+                delay_min smallint,
+                delay_max smallint,
+                PRIMARY KEY ({','.join(GROUP_COLUMNS)})
+            )""")
+        cursor.execute(f"""
+            CREATE UNLOGGED TABLE IF NOT EXISTS {self.touched_table} (
+                station_id bigint NOT NULL,
+                line_id bigint NOT NULL,
+                hour_start timestamp without time zone NOT NULL
+            )""")
+        # lets the recomputation read only the rows of a touched group
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS " +
+            f"{self.departure_table}_station_line_dep_idx " +
+            f"ON {self.departure_table} (station_id, line_id, time_of_dep)")
+        self._tables_ready = True
+        return created
+
+    def aggregate_query(self, condition: str, join: str = "") -> str:
+        return f"""
+            insert into {self.table} ({','.join(GROUP_COLUMNS)}, count,
+                delay_sum, delay_sum_sq, delay_min, delay_max)
+            select d.station_id, d.line_id, d.time_of_dep::date,
+                extract(hour from d.time_of_dep)::smallint, count(*),
+                sum(d.delay), sum(d.delay::bigint * d.delay), min(d.delay),
+                max(d.delay)
+            from {self.departure_table} d {join}
+            where {condition}
+            group by 1, 2, 3, 4
+        """
+
+    def refresh(self, depDf: pd.DataFrame) -> int:
+        """recompute the groups of all departures in the frame, has to run
+           after the frame was written to the departures table, in the same
+           transaction if the caller began one
+           :returns: int - number of recomputed groups"""
+        if depDf.empty:
+            return 0
+        start = time.perf_counter()
+        touched = pd.DataFrame({
+            "station_id": depDf.station_id,
+            "line_id": depDf.line_id,
+            "hour_start": pd.to_datetime(depDf.time_of_dep).dt.floor("h"),
+        }).drop_duplicates()
+        buffer = io.StringIO()
+        touched.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        in_group = (
+            "d.station_id = t.station_id and d.line_id = t.line_id " +
+            "and d.time_of_dep >= t.hour_start " +
+            "and d.time_of_dep < t.hour_start + interval '1 hour'")
+        try:
+            with transaction(self.connection), \
+                    self.connection.connection.cursor() as cursor:
+                if self.ensure_tables(cursor):
+                    self._rebuild(cursor)
+                cursor.execute(f"TRUNCATE {self.touched_table}")
+                cursor.copy_expert(
+                    f"COPY {self.touched_table} " +
+                    "(station_id, line_id, hour_start) " +
+                    "FROM STDIN WITH (FORMAT csv)",
+                    buffer)
+                cursor.execute(f"""
+                    delete from {self.table} r using {self.touched_table} t
+                    where r.station_id = t.station_id
+                    and r.line_id = t.line_id
+                    and r.date = t.hour_start::date
+                    and r.hour = extract(hour from t.hour_start)""")
+                cursor.execute(self.aggregate_query(
+                    "true",
+                    join=f"join {self.touched_table} t on {in_group}"))
+        except Exception:
+            self._tables_ready = False
+            raise
+        self.last_groups = len(touched)
+        logger.debug(f"recomputed {self.last_groups} groups of {self.table} " +
+                     f"in {time.perf_counter() - start:.2f}s")
+        return self.last_groups
+
+    def _rebuild(self, cursor) -> None:
+        logger.info(f"building {self.table} from {self.departure_table}")
+        cursor.execute(f"TRUNCATE {self.table}")
+        cursor.execute(self.aggregate_query("true"))
+
+    def rebuild(self) -> None:
+        """recompute the whole rollup from the departures table, e.g. after
+           bulk imports and restores, which write around refresh"""
+        start = time.perf_counter()
+        try:
+            with self.connection.begin(), \
+                    self.connection.connection.cursor() as cursor:
+                self.ensure_tables(cursor)
+                self._rebuild(cursor)
+        except Exception:
+            self._tables_ready = False
+            raise
+        logger.info(f"rebuilt {self.table} in " +
+                    f"{time.perf_counter() - start:.1f}s")
@@ -0,0 +1,17 @@
+from contextlib import contextmanager
+from collections.abc import Iterator
+import sqlalchemy as sa
+
+
+@contextmanager
+def transaction(connection: sa.engine.Connection) -> Iterator[None]:
+    """begin a transaction on the connection, or run as part of the one the
+       caller began, e.g. to commit the departures, the rollup and the
+       history of a flush together. A transaction begun by the caller is
+       committed or rolled back by the caller
+       :param connection: sa.engine.Connection - connection to postgres"""
+    if connection.in_transaction():
+        yield
+        return
+    with connection.begin():
+        yield
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import sqlalchemy as sa
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DbWorker")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+DISCONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def is_disconnect(error: Exception) -> bool:
+    """whether an error of a database call means the connection is gone"""
+    if isinstance(error, DISCONNECT_ERRORS):
+        return True
+    return isinstance(error, sa.exc.DBAPIError) and (
+        error.connection_invalidated or
+        isinstance(error.orig, DISCONNECT_ERRORS))
+
+
+class DatabaseWorker:
+    """runs the blocking database calls of the collector on one dedicated
+       thread, so the event loop keeps polling while a flush or backup is
+       written and calls sharing the connection never overlap. If a call
+       fails because the connection dropped, the connection is invalidated,
+       which makes the pool hand out a fresh, pinged one, and the call is
+       retried
+       :param connection: sa.engine.Connection - connection shared by the
+        writers, from an engine with pool_pre_ping
+       :param retries: int - retries of a call after a dropped connection
+       :param retry_delay: float - seconds to wait before a retry"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 retries: int = 2,
+                 retry_delay: float = 5) -> None:
+        self.connection = connection
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.reconnects = 0
+        self.busy_time = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="DbWorker")
+
+    async def run(self, func, *args):
+        """run func(*args) on the database thread and wait for its result"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.call, func, *args)
+
+    def call(self, func, *args):
+        """run func(*args) on the calling thread with reconnect and retry"""
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return func(*args)
+                except Exception as e:
+                    if attempt == self.retries or not is_disconnect(e):
+                        raise
+                    logger.warning(f"lost database connection ({e!r}), " +
+                                   f"reconnecting in {self.retry_delay}s")
+                    time.sleep(self.retry_delay)
+                    self.reconnect()
+        finally:
+            self.busy_time += time.perf_counter() - start
+
+    def reconnect(self) -> None:
+        if self.connection is None:
+            return
+        # the next use of the connection checks out a new dbapi connection
+        self.connection.invalidate()
+        if self.connection.in_transaction():
+            self.connection.rollback()
+        self.reconnects += 1
+
+    def ping(self) -> None:
+        """health check, raises if the database can't be reached"""
+        with self.connection.begin():
+            self.connection.exec_driver_sql("select 1")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,172 @@
+import io
+import logging
+import time
+import pandas as pd
+import sqlalchemy as sa
+from mvg_tracker.db_util.transaction import transaction
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.departure_key import departure_key_sql
+
+
+logger = logging.getLogger("DbWriter")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+
+class CopyUpsertWriter:
+    """upserts DataFrames into a table in a single pass: every chunk is
+       streamed with COPY into an unlogged staging table, which is created
+       once and reused across flushes, and applied with one
+       INSERT ... ON CONFLICT DO UPDATE. Conflicting rows are only updated if
+       one of the update columns besides order_column changed, so with the
+       defaults time_of_record keeps the time the current delay was first
+       recorded instead of the time of the last response
+       :param connection: sa.engine.Connection - connection to postgres, every
+        write runs in its own transaction unless the caller began one, so it
+        must not be left inside one, e.g. by a read that wasn't committed
+       :param table: str - target table
+       :param staging_table: str - name of the unlogged staging table
+       :param conflict_columns: tuple - unique key of the target table
+       :param update_columns: tuple - columns overwritten on a conflict
+       :param order_column: str - column deciding which row wins if a key
+        occurs more than once within a chunk
+       :param chunk_rows: int - maximum number of rows per COPY
+       :param key_column: str - bigint departure key column, it is staged as
+        text and former text ids '<station_id>_<epoch>_<label>_<product>',
+        e.g. of old backups, are packed on the server while upserting"""
+
+    def __init__(self,
+                 connection: sa.engine.Connection,
+                 table: str,
+                 staging_table: str,
+                 conflict_columns: tuple[str, ...] = ("departure_id",),
+                 update_columns: tuple[str, ...] = ("delay", "time_of_record"),
+                 order_column: str = "time_of_record",
+                 chunk_rows: int = 50000,
+                 key_column: str = "departure_id") -> None:
+        self.connection = connection
+        self.table = table
+        self.staging_table = staging_table
+        self.conflict_columns = conflict_columns
+        self.update_columns = update_columns
+        self.order_column = order_column
+        self.chunk_rows = chunk_rows
+        self.key_column = key_column
+        self.last_duration = 0.0
+        self.last_rows = 0
+        self._staging_ready = False
+
+    def ensure_staging(self) -> None:
+        if self._staging_ready:
+            return
+        self.connection.exec_driver_sql(
+            f"CREATE UNLOGGED TABLE IF NOT EXISTS {self.staging_table} " +
+            f"(LIKE {self.table} INCLUDING DEFAULTS)")
+        if self.key_column is not None:
+            self.connection.exec_driver_sql(
+                f"ALTER TABLE {self.staging_table} " +
+                f"ALTER COLUMN {self.key_column} TYPE text")
+        self._staging_ready = True
+
+    def staged_rows(self, columns: list[str]) -> str:
+        """source of the upsert, with the keys of the staging table packed"""
+        if self.key_column is None or self.key_column not in columns:
+            return self.staging_table
+        key = self.key_column
+        selected = ",".join(
+            f"case when {key} ~ '^[0-9]+$' then {key}::bigint " +
+            f"else {departure_key_sql(key)} end as {key}"
+            if col == key else col
+            for col in columns)
+        return f"(select {selected} from {self.staging_table}) staged"
+
+    def upsert_query(self, columns: list[str]) -> str:
+        comma_seperated_columns = ",".join(columns)
+        conflict = ",".join(self.conflict_columns)
+        updates = ",".join(f"{col} = EXCLUDED.{col}"
+                           for col in self.update_columns)
+        compared = [col for col in self.update_columns
+                    if col != self.order_column]
+        # skip rewriting rows that only got a newer record time, a row
+        # written again costs a new row version and its WAL
+        condition = (
+            f"where ({','.join(f'{self.table}.{col}' for col in compared)}) " +
+            f"is distinct from ({','.join(f'EXCLUDED.{col}' for col in compared)})"
+            if compared else "")
+        return f"""
+                insert into {self.table} ({comma_seperated_columns})
+                select distinct on ({conflict}) {comma_seperated_columns}
+                from {self.staged_rows(columns)}
+                order by {conflict}, {self.order_column} desc
+                on conflict ({conflict})
+                do update set {updates}
+                {condition}
+        """
+
+    def copy_chunk(self, cursor, chunk: pd.DataFrame) -> None:
+        buffer = io.StringIO()
+        chunk.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {self.staging_table} ({','.join(chunk.columns)}) " +
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer)
+
+    def write(self, depDf: pd.DataFrame) -> int:
+        """upsert all rows of the DataFrame in one transaction, or in the
+           one the caller began
+           :returns: int - number of rows written"""
+        if depDf.empty:
+            return 0
+        start = time.perf_counter()
+        columns = list(depDf.columns)
+        upsert_query = self.upsert_query(columns)
+        try:
+            with transaction(self.connection):
+                self.ensure_staging()
+                # COPY needs a psycopg2 cursor, it runs in the same
+                # transaction
+                with self.connection.connection.cursor() as cursor:
+                    for i in range(0, len(depDf), self.chunk_rows):
+                        self.connection.exec_driver_sql(
+                            f"TRUNCATE {self.staging_table}")
+                        self.copy_chunk(cursor,
+                                        depDf.iloc[i:i + self.chunk_rows])
+                        self.connection.exec_driver_sql(upsert_query)
+        except Exception:
+            self._staging_ready = False
+            raise
+        self.last_duration = time.perf_counter() - start
+        self.last_rows = len(depDf)
+        logger.info(f"upserted {self.last_rows} rows into {self.table} " +
+                    f"in {self.last_duration:.2f}s")
+        return self.last_rows
+
+    def write_csv(self, file, columns: list[str], delimiter: str = ",") -> int:
+        """upsert a csv stream without header in one transaction, the rows
+           are copied into the staging table without being loaded here
+           :param file: file-like object of csv rows
+           :param columns: list - column names of the csv
+           :param delimiter: str - field separator of the csv
+           :returns: int - number of rows copied"""
+        start = time.perf_counter()
+        try:
+            with transaction(self.connection):
+                self.ensure_staging()
+                self.connection.exec_driver_sql(
+                    f"TRUNCATE {self.staging_table}")
+                with self.connection.connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY {self.staging_table} ({','.join(columns)}) " +
+                        f"FROM STDIN WITH (FORMAT csv, DELIMITER '{delimiter}')",
+                        file)
+                    rows = cursor.rowcount
+                self.connection.exec_driver_sql(self.upsert_query(columns))
+        except Exception:
+            self._staging_ready = False
+            raise
+        self.last_duration = time.perf_counter() - start
+        self.last_rows = rows
+        logger.info(f"upserted {rows} csv rows into {self.table} " +
+                    f"in {self.last_duration:.2f}s")
+        return rows
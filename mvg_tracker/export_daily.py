@@ -1,75 +1,78 @@
-import os
-import pandas as pd
+import argparse
+import logging
 import pathlib as pl
-from datetime import date, datetime
+from datetime import date, timedelta
+from mvg_tracker.data_validation.utils import get_connector, get_json_from_path
+from mvg_tracker.db_util.parquet_archive import ParquetArchive
+from mvg_tracker.logging_util.init_loggers import init_console_logger
 
-from psycopg2 import Timestamp
-from data_gathering import get_json_from_path
-from sqlalchemy import create_engine
 
-from utils import get_connector
-
-DEP_TABLE_NAME = "MVG1"
-TRANS_TABLE_NAME = "MVG_Trans1"
-BACKUP_FOLDER_CLIENT = pl.Path("/mnt/external/Data_IO/daily")
-BACKUP_FOLDER_HOST = pl.Path(os.path.expanduser("~")).joinpath("AppData\Roaming\MVG_Tracker\daily")
-DEP_FOLDER = "dep"
-TRANS_FOLDER = "trans"
-
-COL_ORDER = ["timestamp",
-             "station",
-             "line",
-             "destination",
-             "delay",
-             "Id",
-             "curr_time_epoch",
-             "timestamp_epoch"]
-
-def save_df_datewise(df, folder):
-    if "timestamp" in df.columns:
-        timestampCol = "timestamp"
-    elif "timestamp_from" in df.columns:
-        timestampCol = "timestamp_from"
-    else:
-        raise KeyError(f"no timestamp col found in {df.columns}")
-    
-    df[timestampCol] = pd.to_datetime(df[timestampCol])
-    df["date"] = df[timestampCol].apply(lambda x: x.date(), 0)
-    for unique_date in df.date.unique():
-        dateStr = unique_date.strftime('%Y-%m-%d')
-        FilePath = BACKUP_FOLDER_HOST.joinpath(folder, dateStr).with_suffix(f".csv")
-        df_date = df.loc[df["date"] == unique_date]
-        df_date.drop("date", axis=1, inplace=True)
-        if FilePath.exists():
-            incoming_df = pd.read_csv(FilePath, sep=",")
-            df_date = pd.concat([df_date, incoming_df], ignore_index=True)
-            del incoming_df
-            df_date.drop_duplicates(subset=["Id"], inplace=True)
-        df_date.to_csv(str(FilePath), sep=",", index=False)
+DEFAULT_CONFIG = pl.Path(__file__).parent.joinpath("config/default_config.json")
 
 
 def main():
-    currPath = pl.Path(__file__).parent
-    jsonRelPath = "config/default_config.json"
-    jsonPath = currPath.joinpath(jsonRelPath)
-    config = get_json_from_path(jsonPath)
-    conn = get_connector(**config["dbParams"])
-    # for loc, tbl_name in zip([DEP_FOLDER, TRANS_FOLDER],[DEP_TABLE_NAME, TRANS_TABLE_NAME]):
-    #     df = pd.read_sql(
-    #             f'SELECT * FROM public."{tbl_name}"',
-    #             conn)
-    #     # df.reindex(COL_ORDER)
-    #     # df = pd.read_csv(BACKUP_FOLDER_HOST.parent.joinpath(DEP_TABLE_NAME).with_suffix(".csv"), sep=";")
-    #     save_df_datewise(df, loc)
-    df = pd.read_sql(
-                f'SELECT * FROM public."{DEP_TABLE_NAME}"',
-                conn)
-    
-    df.replace({"destination": config["replaceMap"]}, regex=True, inplace=True)
-    df.to_sql("MVG1",
-              conn,
-              if_exists="replace",
-              index=False)
+    parser = argparse.ArgumentParser(
+        description="export the departures table into a per day parquet " +
+                    "archive, days that are already archived are skipped")
+    parser.add_argument(
+        "--archive_dir",
+        "-a",
+        type=str,
+        dest="archiveDir",
+        help="enter Dir of the parquet archive",
+        required=True
+    )
+    parser.add_argument(
+        "--config_path",
+        "-c",
+        type=str,
+        dest="configPath",
+        help="enter filePath for the config file to use",
+        default=str(DEFAULT_CONFIG)
+    )
+    parser.add_argument(
+        "--from",
+        type=date.fromisoformat,
+        dest="exportFrom",
+        help="first ISO date to export, defaults to the first departure",
+        default=None
+    )
+    parser.add_argument(
+        "--to",
+        type=date.fromisoformat,
+        dest="exportTo",
+        help="export days before this ISO date, defaults to today as the " +
+             "current day is still incomplete",
+        default=None
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="export already archived days again")
+    parser.add_argument(
+        "--chunk_rows",
+        type=int,
+        dest="chunkRows",
+        default=100000)
+    args = parser.parse_args()
+    logger = logging.getLogger("ExportDaily")
+    logger = init_console_logger(logger)
+    logger.setLevel(logging.INFO)
+
+    config = get_json_from_path(pl.Path(args.configPath))
+    connection = get_connector(**config["dbParams"])
+    table = config["dbTables"]["departures"]
+    archive = ParquetArchive(pl.Path(args.archiveDir), table, args.chunkRows)
+    start = args.exportFrom
+    if start is None:
+        with connection.begin():
+            start = connection.exec_driver_sql(
+                f"select min(time_of_dep)::date from {table}").scalar()
+        start = start or date.today()
+    end = args.exportTo or date.today()
+    rows = archive.export(connection, start, end, args.overwrite)
+    logger.info(f"exported {rows} rows of {table} from {start} until " +
+                f"{end - timedelta(days=1)} to {archive.root}")
 
 
 if __name__ == "__main__":
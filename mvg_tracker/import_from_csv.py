@@ -1,25 +1,204 @@
-import pandas as pd
+import argparse
+import gzip
+import io
+import itertools
+import logging
 import pathlib as pl
-import sys
-from data_gathering import get_json_from_path
-from sqlalchemy import create_engine
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import sqlalchemy as sa
+from mvg_tracker.data_validation.utils import get_engine, get_json_from_path
+from mvg_tracker.db_util.key_migration import migrate_departure_keys
+from mvg_tracker.db_util.partitions import PartitionManager
+from mvg_tracker.db_util.rollup import HourlyRollup
+from mvg_tracker.db_util.writer import CopyUpsertWriter
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+DEFAULT_CONFIG = pl.Path(__file__).parent.joinpath("config/default_config.json")
+
+logger = logging.getLogger("ImportFromCsv")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+
+def open_text(path: pl.Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def find_files(paths: list[pl.Path]) -> list[pl.Path]:
+    """csv files given directly or found in the given directories, e.g. the
+       day files of a backup"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(itertools.chain(path.rglob("*.csv"),
+                                                path.rglob("*.csv.gz"))))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_chunks(file, chunk_rows: int) -> Iterator[list[str]]:
+    while chunk := list(itertools.islice(file, chunk_rows)):
+        yield chunk
+
+
+class CsvImporter:
+    """imports csv files with a header of departures table columns by
+       streaming them in chunks through COPY into per worker staging tables,
+       duplicates of a departure are resolved by the upsert on the server.
+       Files are imported in parallel, each worker has its own connection
+       :param engine: sa.engine.Engine - pooled engine to the database
+       :param table: str - target table
+       :param staging_table: str - prefix of the per worker staging tables
+       :param partitionParams: dict - partitioning of the target table
+       :param chunk_rows: int - rows per COPY and transaction
+       :param delimiter: str - field separator of the files"""
+
+    def __init__(self,
+                 engine: sa.engine.Engine,
+                 table: str,
+                 staging_table: str,
+                 partitionParams: dict = None,
+                 chunk_rows: int = 100000,
+                 delimiter: str = ",") -> None:
+        self.engine = engine
+        self.table = table
+        self.staging_table = staging_table
+        self.partitionParams = partitionParams or {}
+        self.chunk_rows = chunk_rows
+        self.delimiter = delimiter
+        self._local = threading.local()
+        self._worker_ids = itertools.count()
+        self._connections: list[sa.engine.Connection] = []
+        # concurrent CREATE TABLE ... PARTITION OF can collide
+        self._partition_lock = threading.Lock()
+
+    def _worker(self) -> tuple[CopyUpsertWriter, PartitionManager]:
+        if not hasattr(self._local, "writer"):
+            connection = self.engine.connect()
+            self._connections.append(connection)
+            worker_id = next(self._worker_ids)
+            self._local.writer = CopyUpsertWriter(
+                connection,
+                self.table,
+                f"{self.staging_table}_{worker_id}",
+                conflict_columns=("departure_id", "time_of_dep"))
+            self._local.partitions = PartitionManager.from_config(
+                connection, self.table, self.partitionParams)
+        return self._local.writer, self._local.partitions
+
+    def import_file(self, path: pl.Path) -> int:
+        """:returns: int - number of copied rows"""
+        writer, partitions = self._worker()
+        start = time.perf_counter()
+        rows = 0
+        with open_text(path) as file:
+            columns = file.readline().strip().split(self.delimiter)
+            dep_pos = columns.index("time_of_dep")
+            for chunk in iter_chunks(file, self.chunk_rows):
+                # iso timestamps sort like the times they represent
+                times = [line.split(self.delimiter, dep_pos + 1)[dep_pos]
+                         for line in chunk]
+                with self._partition_lock:
+                    partitions.ensure_range(
+                        datetime.fromisoformat(min(times).strip('"')),
+                        datetime.fromisoformat(max(times).strip('"')),
+                        reattach=True)
+                rows += writer.write_csv(io.StringIO("".join(chunk)),
+                                         columns,
+                                         self.delimiter)
+        duration = time.perf_counter() - start
+        logger.info(f"imported {rows} rows from {path.name} in " +
+                    f"{duration:.1f}s, {rows / max(duration, 1e-9):.0f} rows/s")
+        return rows
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.close()
+        self.engine.dispose()
+
+    def run(self, files: list[pl.Path], workers: int = 4) -> int:
+        """import all files with up to workers files at a time
+           :returns: int - number of copied rows"""
+        start = time.perf_counter()
+        rows = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="CsvImporter") as pool:
+            futures = {pool.submit(self.import_file, path): path
+                       for path in files}
+            for future in as_completed(futures):
+                try:
+                    rows += future.result()
+                except Exception as e:
+                    failed.append(futures[future])
+                    logger.error(f"could not import {futures[future]}: {e!r}")
+        duration = time.perf_counter() - start
+        logger.info(f"imported {rows} rows from {len(files) - len(failed)} " +
+                    f"files in {duration:.1f}s, " +
+                    f"{rows / max(duration, 1e-9):.0f} rows/s")
+        if failed:
+            logger.error(f"{len(failed)} files failed: " +
+                         ", ".join(str(path) for path in failed))
+        return rows
 
 
 def main():
-    currPath = pl.Path(__file__).parent
-    CSV_PATH = pl.Path(sys.argv[1])
-    jsonRelPath = "config/default_config.json"
-    jsonPath = currPath.joinpath(jsonRelPath)
-    config = get_json_from_path(jsonPath)
-    conn = create_engine(
-        f'postgresql://{config["dbParams"]["user"]}:' +
-        f'{config["dbParams"]["password"]}' +
-        f'@localhost:{config["dbParams"]["port"]}',
-        pool_recycle=3600)
-    conn.connect()
-    df = pd.read_csv(str(CSV_PATH), sep=";", index_col=False)
-    print(CSV_PATH.stem)
-    df.to_sql(CSV_PATH.stem, conn, if_exists="append", index=False)
+    parser = argparse.ArgumentParser(
+        description="bulk import csv files of departures, e.g. the day " +
+                    "files of a backup, into the departures table")
+    parser.add_argument(
+        "paths",
+        type=pl.Path,
+        nargs="+",
+        help="csv or csv.gz files or directories containing them")
+    parser.add_argument(
+        "--config_path",
+        "-c",
+        type=str,
+        dest="configPath",
+        help="enter filePath for the config file to use",
+        default=str(DEFAULT_CONFIG)
+    )
+    parser.add_argument("--workers", type=int, default=4,
+                        help="files imported in parallel")
+    parser.add_argument("--chunk_rows", type=int, dest="chunkRows",
+                        default=100000)
+    parser.add_argument("--sep", type=str, default=",",
+                        help="field separator of the files")
+    args = parser.parse_args()
+
+    config = get_json_from_path(pl.Path(args.configPath))
+    engine = get_engine(**config["dbParams"])
+    table = config["dbTables"]["departures"]
+    partitionParams = config.get("partitionParams", {})
+    with engine.connect() as connection:
+        PartitionManager.from_config(
+            connection, table, partitionParams).ensure_schema()
+        migrate_departure_keys(connection,
+                               [table, config["dbTables"]["delay_history"]])
+    importer = CsvImporter(engine,
+                           table,
+                           config["dbTables"]["temp_departure"],
+                           partitionParams,
+                           args.chunkRows,
+                           args.sep)
+    try:
+        rows = importer.run(find_files(args.paths), args.workers)
+        if rows:
+            with engine.connect() as connection:
+                HourlyRollup(connection,
+                             config["dbTables"]["delay_rollup"],
+                             table).rebuild()
+    finally:
+        importer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import argparse
+import pathlib as pl
+from mvg_tracker.data_validation.utils import get_connector, get_json_from_path
+from mvg_tracker.db_util.rollup import HourlyRollup
+
+
+DEFAULT_CONFIG = pl.Path(__file__).parent.joinpath("config/default_config.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="recompute the hourly delay rollup from the " +
+                    "departures table, e.g. after writing to it by hand")
+    parser.add_argument(
+        "--config_path",
+        "-c",
+        type=str,
+        dest="configPath",
+        help="enter filePath for the config file to use",
+        default=str(DEFAULT_CONFIG)
+    )
+    args = parser.parse_args()
+
+    config = get_json_from_path(pl.Path(args.configPath))
+    connection = get_connector(**config["dbParams"])
+    HourlyRollup(connection,
+                 config["dbTables"]["delay_rollup"],
+                 config["dbTables"]["departures"]).rebuild()
+
+
+if __name__ == "__main__":
+    main()
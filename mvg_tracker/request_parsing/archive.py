@@ -0,0 +1,174 @@
+import gzip
+import logging
+import pathlib as pl
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from collections.abc import Iterator
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("ResponseArchive")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+# one file per hour, e.g. 2022/05/27/22.tsv.gz
+PARTITION_FORMAT = "%Y/%m/%d/%H"
+SUFFIX = ".tsv.gz"
+_STOP = None
+
+
+def partition_path(folder: pl.Path, recorded_at: float) -> pl.Path:
+    partition = datetime.fromtimestamp(recorded_at).strftime(PARTITION_FORMAT)
+    return folder.joinpath(partition + SUFFIX)
+
+
+class ResponseArchive:
+    """append-only, gzip compressed archive of raw station responses,
+       partitioned by the hour of recording. Every record is one line of
+       recording epoch, station name, global id and the raw payload separated
+       by tabs. Records are written by a background thread, so recording only
+       costs a queue put on the event loop. Every batch of records is written
+       as a complete gzip member, a crash only loses the batch being written
+       :param folder: pl.Path - root directory of the archive
+       :param compresslevel: int - gzip compression level
+       :param max_pending: int - records kept in memory before new records
+        are dropped
+       :param flush_interval: float - seconds records are collected before
+        they are written
+       :param batch_records: int - records that are written at the latest"""
+
+    def __init__(self,
+                 folder: pl.Path,
+                 compresslevel: int = 6,
+                 max_pending: int = 10000,
+                 flush_interval: float = 1.0,
+                 batch_records: int = 1000) -> None:
+        self.folder = pl.Path(folder)
+        self.compresslevel = compresslevel
+        self.flush_interval = flush_interval
+        self.batch_records = batch_records
+        self._queue: queue.Queue = queue.Queue(max_pending)
+        self._thread: threading.Thread = None
+        self.records = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._write_loop,
+                                        name="ResponseArchive",
+                                        daemon=True)
+        self._thread.start()
+
+    def record(self,
+               station: str,
+               globalId: str,
+               content: bytes,
+               recorded_at: float = None) -> None:
+        """queue a raw response for writing, drops it if the writer can't
+           keep up instead of stalling the caller"""
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        try:
+            self._queue.put_nowait((recorded_at, station, globalId, content))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """write all pending records and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self.dropped:
+            logger.warning(f"dropped {self.dropped} records, writer was " +
+                           "too slow")
+
+    def _next_batch(self) -> tuple[list[tuple], bool]:
+        """wait for records and collect them for up to flush_interval
+           :returns: tuple of the records and whether the archive is closed"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.batch_records:
+            try:
+                batch.append(self._queue.get(
+                    timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        if batch[-1] is _STOP:
+            return batch[:-1], True
+        return batch, False
+
+    def _write_batch(self, batch: list[tuple]) -> None:
+        lines: dict[pl.Path, list[bytes]] = {}
+        for recorded_at, station, globalId, content in batch:
+            path = partition_path(self.folder, recorded_at)
+            # newlines in json are whitespace outside of strings
+            lines.setdefault(path, []).append(
+                f"{recorded_at:.3f}\t{station}\t{globalId}\t".encode() +
+                content.replace(b"\n", b" ") + b"\n")
+        for path, partition_lines in lines.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # appending adds a new gzip member, which readers decompress
+            # transparently, closing it writes the trailer
+            with gzip.open(path, "ab", self.compresslevel) as file:
+                file.write(b"".join(partition_lines))
+            self.records += len(partition_lines)
+
+    def _write_loop(self) -> None:
+        closed = False
+        try:
+            while not closed:
+                batch, closed = self._next_batch()
+                self._write_batch(batch)
+        except OSError:
+            logger.exception("archive writer failed, stopped recording")
+
+
+def iter_archive(folder: pl.Path,
+                 start: datetime = None,
+                 end: datetime = None
+                 ) -> Iterator[tuple[float, str, str, bytes]]:
+    """read the records of an archive in chronological order
+       :param start: datetime - skip records before, defaults to all
+       :param end: datetime - skip records from this time on
+       :yields: tuple of recording epoch, station name, global id and the raw
+        payload"""
+    folder = pl.Path(folder)
+    start_epoch = start.timestamp() if start is not None else None
+    end_epoch = end.timestamp() if end is not None else None
+    for path in sorted(folder.glob("*/*/*/*" + SUFFIX)):
+        partition = "/".join(path.relative_to(folder).parts)[:-len(SUFFIX)]
+        partition_start = datetime.strptime(partition, PARTITION_FORMAT)
+        if end is not None and partition_start >= end:
+            continue
+        if start is not None and partition_start + timedelta(hours=1) <= start:
+            continue
+        yield from _iter_partition(path, start_epoch, end_epoch)
+
+
+def _iter_partition(path: pl.Path,
+                    start_epoch: float = None,
+                    end_epoch: float = None
+                    ) -> Iterator[tuple[float, str, str, bytes]]:
+    """read the records of one partition file, a file that was cut off by a
+       crash ends after its last complete record"""
+    records = 0
+    try:
+        with gzip.open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    raise EOFError("record without line end")
+                recorded_at, station, globalId, content = \
+                    line.rstrip(b"\n").split(b"\t", 3)
+                records += 1
+                recorded_at = float(recorded_at)
+                if start_epoch is not None and recorded_at < start_epoch:
+                    continue
+                if end_epoch is not None and recorded_at >= end_epoch:
+                    continue
+                yield recorded_at, station.decode(), globalId.decode(), content
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        logger.error(f"archive file {path} is truncated after {records} " +
+                     f"records, skipping the rest of it: {e!r}")
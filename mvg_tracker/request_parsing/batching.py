@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from typing import Any
+
+
+# column layout written to the departures table, kept in the order the
+# former per-departure concat produced it
+DEP_COLUMNS: dict[str, str] = {
+    "time_of_dep": "datetime64[ns]",
+    "line_id": "int64",
+    "delay": "int64",
+    "time_of_record": "datetime64[ns]",
+    "station_id": "int64",
+    "destination_id": "int64",
+    "departure_id": "int64",
+}
+
+# column layout of the delay history table
+HISTORY_COLUMNS: dict[str, str] = {
+    "departure_id": "int64",
+    "observed_at": "int32",
+    "delay": "int16",
+}
+
+
+def empty_departure_frame() -> pd.DataFrame:
+    """get an empty DataFrame with the columns and dtypes of the departures
+       table"""
+    return pd.DataFrame({col: pd.Series(dtype=dtype)
+                         for col, dtype in DEP_COLUMNS.items()})
+
+
+class DepartureBatch:
+    """collects accepted departures into per-column buffers and builds a
+       single DataFrame from them, instead of concatenating one-row frames
+       per departure
+       :param columns: dict - mapping of column name to the target dtype"""
+
+    def __init__(self, columns: dict[str, str] = DEP_COLUMNS) -> None:
+        self.columns = columns
+        self._buffers: dict[str, list[Any]] = {col: [] for col in columns}
+
+    def __len__(self) -> int:
+        return len(next(iter(self._buffers.values())))
+
+    def append(self, dep) -> None:
+        """append the persisted attributes of a departure to the buffers
+           :param dep: object exposing all columns as attributes"""
+        for col, buffer in self._buffers.items():
+            buffer.append(getattr(dep, col))
+
+    def to_columns(self) -> dict[str, np.ndarray]:
+        """the buffered columns as typed arrays, e.g. to send them to another
+           process"""
+        return {col: np.asarray(self._buffers[col], dtype=dtype)
+                for col, dtype in self.columns.items()}
+
+    def to_df(self) -> pd.DataFrame:
+        """build one DataFrame out of the buffered columns"""
+        if not len(self):
+            return empty_departure_frame()
+        return pd.DataFrame(self.to_columns())
+
+    def clear(self) -> None:
+        for buffer in self._buffers.values():
+            buffer.clear()
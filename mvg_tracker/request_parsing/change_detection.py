@@ -0,0 +1,98 @@
+import hashlib
+import time
+from dataclasses import dataclass
+
+
+# fields identifying a departure within one station response
+KEY_FIELDS = ("plannedDepartureTime", "label", "transportType")
+# fields whose change makes a departure worth parsing and writing again
+FINGERPRINT_FIELDS = ("realtimeDepartureTime",
+                      "delayInMinutes",
+                      "cancelled",
+                      "destination",
+                      "platform",
+                      "bannerHash")
+
+
+@dataclass
+class _StationState:
+    payload_hash: bytes
+    # epoch until which an identical payload yields the same departures, the
+    # prefilter drops departures depending on the current time
+    valid_until: float | None
+    fingerprints: dict[tuple, tuple]
+
+
+def diff_departures(previous: dict[tuple, tuple],
+                    departures: list[dict]
+                    ) -> tuple[list[dict], dict[tuple, tuple]]:
+    """split off the departures whose fingerprint equals the previous one
+       :param previous: dict - fingerprints of the last commit of the station
+       :returns: tuple of the new or changed departures and the fingerprints
+        of all given departures"""
+    fingerprints = {}
+    changed = []
+    for dep in departures:
+        key = tuple(dep.get(name) for name in KEY_FIELDS)
+        fingerprint = tuple(dep.get(name) for name in FINGERPRINT_FIELDS)
+        fingerprints[key] = fingerprint
+        if previous.get(key) != fingerprint:
+            changed.append(dep)
+    return changed, fingerprints
+
+
+class ChangeDetector:
+    """remembers what was parsed from every station, so payloads that are byte
+       identical to the last one and departures that did not change since the
+       last poll can be skipped. Checks return the new state, which has to be
+       passed to commit once the station was parsed successfully"""
+
+    def __init__(self) -> None:
+        self._stations: dict[str, _StationState] = {}
+        self.payloads_seen = 0
+        self.payloads_skipped = 0
+        self.departures_seen = 0
+        self.departures_skipped = 0
+
+    @staticmethod
+    def hash_payload(content: bytes) -> bytes:
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    def payload_changed(self,
+                        station: str,
+                        payload_hash: bytes,
+                        now: float = None) -> bool:
+        """check whether the payload of a station differs from the last
+           committed one or has to be evaluated again"""
+        now = time.time() if now is None else now
+        self.payloads_seen += 1
+        state = self._stations.get(station)
+        if state is None or state.payload_hash != payload_hash\
+                or (state.valid_until is not None and now >= state.valid_until):
+            return True
+        self.payloads_skipped += 1
+        return False
+
+    def fingerprints(self, station: str) -> dict[tuple, tuple]:
+        """fingerprints of the departures of the last commit of a station"""
+        state = self._stations.get(station)
+        return state.fingerprints if state is not None else {}
+
+    def count_departures(self, seen: int, changed: int) -> None:
+        """account for departures diffed by diff_departures"""
+        self.departures_seen += seen
+        self.departures_skipped += seen - changed
+
+    def commit(self,
+               station: str,
+               payload_hash: bytes,
+               valid_until: float | None,
+               fingerprints: dict[tuple, tuple]) -> None:
+        self._stations[station] = _StationState(payload_hash,
+                                                valid_until,
+                                                fingerprints)
+
+    def __repr__(self) -> str:
+        return (f"skipped {self.payloads_skipped}/{self.payloads_seen} " +
+                f"payloads and {self.departures_skipped}/" +
+                f"{self.departures_seen} departures")
@@ -1,16 +1,17 @@
 import pathlib as pl
 from datetime import datetime, timedelta
 import logging
-import numpy as np
 import pandas as pd
 import re
-from functools import partial
-from typing import Any
+from functools import cache, partial
 from .data_parsing import DataWrapper, Iterable_Baseclass
 from dataclasses import dataclass, field
 from mvg_tracker.data_validation.validator import Validator, TypeHandler, Function_Mapper
+from mvg_tracker.data_validation.batch_validation import BatchValidator, BatchResult, REJECT_COLUMNS
 from mvg_tracker.data_validation.validation_func import is_in, extract_digits_from_string
 from mvg_tracker.request_parsing.enum_classes import Network, Product
+from mvg_tracker.request_parsing.departure_key import pack_departure_key
+from mvg_tracker.request_parsing.destination_resolver import DestinationResolver
 
 
 typeHandler = TypeHandler(dateformat="%Y/%m/%d, %H:%M:%S")
@@ -24,7 +25,7 @@ def defaultValidatorFactory() -> Validator:
 class Departure(DataWrapper):
     plannedDepartureTime: datetime = defaultValidatorFactory()
     realtimeDepartureTime: datetime = defaultValidatorFactory()
-    time_of_record: datetime = datetime.now()
+    time_of_record: datetime = field(default_factory=datetime.now)
     sev: bool = defaultValidatorFactory()
     destination: str = defaultValidatorFactory()
     transportType: Product = defaultValidatorFactory()
@@ -52,7 +53,7 @@ class Departure(DataWrapper):
     time_of_dep: datetime = field(init=False)
     line_id: int = field(init=False)
     invaild: bool = field(init=False, default=False)
-    departure_id: str = field(init=False)
+    departure_id: int = field(init=False)
 
     def __post_init__(self):
         super().__post_init__()
@@ -66,8 +67,43 @@ class Departure(DataWrapper):
             self.invaild = True
             # self.logger.warn(f"could parse label {self.label} to line id")
 
-    def get_time_to_dep(self) -> timedelta:
-        cur_time = datetime.now()
+    @classmethod
+    def validate_batch(cls, records: list[dict]) -> BatchResult:
+        """validate raw departures column-wise instead of one Departure per
+           record, the columns set in __post_init__ included. Rows are
+           rejected exactly where the constructor would raise
+           :param records: list - raw departures of one or many responses"""
+        result = _batch_validator(cls).validate(records)
+        valid = result.valid
+        labels = valid.label.astype(object).where(valid.label.notna(), None)
+        parsed: dict = {}
+        for label in labels.unique():
+            try:
+                parsed[label] = (int(label[1:] if not label[0].isnumeric()
+                                     else label), False)
+            except ValueError:
+                parsed[label] = (None, True)
+            except Exception as e:
+                parsed[label] = f"{type(e).__name__}: {e}"
+        lines = labels.map(parsed)
+        failed = lines.map(lambda line: isinstance(line, str)).astype(bool)
+        rejects = result.rejects
+        if failed.any():
+            rejects = pd.concat([rejects, pd.DataFrame({
+                "row": valid.index[failed],
+                "field": "label",
+                "error": lines[failed].to_numpy()}, columns=REJECT_COLUMNS)])\
+                .sort_values(["row", "field"], ignore_index=True)
+            valid, lines = valid.loc[~failed], lines[~failed]
+        valid = valid.assign(
+            time_of_dep=valid.plannedDepartureTime,
+            delay=valid.delayInMinutes,
+            line_id=pd.array([line[0] for line in lines], dtype="Int64"),
+            invaild=pd.array([line[1] for line in lines], dtype="boolean"))
+        return BatchResult(valid, rejects)
+
+    def get_time_to_dep(self, cur_time: datetime = None) -> timedelta:
+        cur_time = cur_time or datetime.now()
         return self.plannedDepartureTime - cur_time
 
     def set_station_id(self, station_id: str) -> None:
@@ -75,19 +111,15 @@ class Departure(DataWrapper):
                                         .replace("de", ""))
     
     def set_departure_id(self):
-        self.departure_id = f"{self.station_id}_{int(self.plannedDepartureTime.timestamp())}_{self.label}_{self.transportType.value}"
+        self.departure_id = pack_departure_key(self.station_id,
+                                               self.plannedDepartureTime,
+                                               self.line_id,
+                                               self.transportType)
 
-    def set_destinationId_by_name(self, all_stations_names: np.ndarray[Any, np.dtype[np.str_]],
-                                  all_stations_ids: np.ndarray[Any, np.dtype[np.int32]]):
-        destination_ind: int = list(map(
-            lambda x: x in self.destination, all_stations_names))\
-            .index(True)
-        try:
-            self.destination_id = all_stations_ids[destination_ind]
-        except ValueError:
-            self.destination_id = 0
-            self.logger.warn(
-                f"Encountered non matching destination {self.destination}")
+    def set_destinationId_by_name(self, resolver: DestinationResolver):
+        """set the id of the first station whose name is part of the
+           destination, 0 if there is none"""
+        self.destination_id = resolver.resolve(self.destination)
 
     def get_df_repr(self, *args: str) -> pd.DataFrame:
         dict_repr: dict = {}
@@ -96,6 +128,11 @@ class Departure(DataWrapper):
         return pd.DataFrame(dict_repr)
 
 
+@cache
+def _batch_validator(cls: type) -> BatchValidator:
+    return BatchValidator(cls)
+
+
 @dataclass
 class ServingLine(DataWrapper):
     destination: str = defaultValidatorFactory()
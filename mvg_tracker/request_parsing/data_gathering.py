@@ -1,4 +1,3 @@
-import itertools
 import signal
 import time as inbuild_time
 from datetime import timedelta, time
@@ -6,18 +5,29 @@ from numpy import int64
 import pandas as pd
 import pathlib as pl
 import asyncio
-import aiohttp
-import sys
 import logging
 import os
-from dataclasses import dataclass, fields
 import sqlalchemy as sa
 import numpy as np
 from typing import Any
-from mvg_tracker.request_parsing.networking import cache_dep
-from mvg_tracker.request_parsing.data_classes import StationResponse
-from mvg_tracker.request_parsing.enum_classes import Product
+from mvg_tracker.request_parsing.networking import DepartureFetcher
+from mvg_tracker.request_parsing.batching import empty_departure_frame
+from mvg_tracker.request_parsing.archive import ResponseArchive, iter_archive
+from mvg_tracker.request_parsing.change_detection import ChangeDetector
+from mvg_tracker.request_parsing.parse_executor import DepartureParser, ParseExecutor, ParseTask, ParsedPayload
+from mvg_tracker.request_parsing.pipeline import Pipeline
+from mvg_tracker.request_parsing.scheduler import Scheduler
+from mvg_tracker.request_parsing.station_schedule import StationSchedule
+from mvg_tracker.request_parsing.state_store import DepartureStateStore
+from mvg_tracker.request_parsing.write_buffer import WriteBehindBuffer
 from mvg_tracker.data_validation.utils import get_connector, datetime
+from mvg_tracker.db_util.backup import IncrementalBackup
+from mvg_tracker.db_util.history import DelayHistoryWriter
+from mvg_tracker.db_util.key_migration import migrate_departure_keys
+from mvg_tracker.db_util.partitions import PartitionManager
+from mvg_tracker.db_util.rollup import HourlyRollup
+from mvg_tracker.db_util.worker import DatabaseWorker
+from mvg_tracker.db_util.writer import CopyUpsertWriter
 from mvg_tracker.logging_util.init_loggers import init_console_logger, init_file_logger
 
 # from apscheduler.schedulers.background import BackgroundScheduler
@@ -34,16 +44,6 @@ COL_ORDER = ["timestamp",
 TIME_DELTA_THRESH = timedelta(hours=1)
 
 
-@dataclass
-class Departure:
-    time_of_dep: datetime
-    line_id: int
-    delay: int
-    time_of_record: datetime
-    station_id: str
-    destination_id: str
-
-
 class DataManager:
     config: dict
     db_connector: sa.engine.Connection
@@ -55,27 +55,76 @@ class DataManager:
     def __init__(self,
                  config,
                  loggingDir=None,
-                 backUpFolder=None):
+                 backUpFolder=None,
+                 db_station: pd.DataFrame = None,
+                 archiveFolder=None):
+        """:param archiveFolder: pl.Path - if given, every raw response is
+            recorded to a ResponseArchive in this directory
+           :param db_station: pd.DataFrame - station table with name and
+            station_id to use instead of the database tables, e.g. for
+            benchmarking without a database, disables all db access"""
         self.config = config
-        self.db_connector = get_connector(**config["dbParams"])
         self.depTableName = config["dbTables"]["departures"]
-        self.db_station = pd.read_sql_table(
-            config["dbTables"]["station"], self.db_connector)
-        self.db_line = pd.read_sql_table(
-            config["dbTables"]["line"], self.db_connector)
-        self.db_staion_order = pd.read_sql_table(
-            config["dbTables"]["station_order"], self.db_connector)
+        if db_station is None:
+            self.db_connector = get_connector(**config["dbParams"])
+            self.load_db_tables(config)
+            # don't keep the lookup reads open as transaction
+            self.db_connector.commit()
+            self.partitions = PartitionManager.from_config(
+                self.db_connector,
+                self.depTableName,
+                config.get("partitionParams", {}))
+            self.partitions.ensure_schema()
+            migrate_departure_keys(self.db_connector,
+                                   [self.depTableName,
+                                    config["dbTables"]["delay_history"]])
+            self.writer = CopyUpsertWriter(
+                self.db_connector,
+                self.depTableName,
+                config["dbTables"]["temp_departure"],
+                conflict_columns=("departure_id", "time_of_dep"),
+                chunk_rows=config.get("writerParams", {}).get("chunkRows", 50000))
+            self.history_writer = DelayHistoryWriter(
+                self.db_connector, config["dbTables"]["delay_history"])
+            self.rollup = HourlyRollup(self.db_connector,
+                                       config["dbTables"]["delay_rollup"],
+                                       self.depTableName)
+        else:
+            self.db_connector = None
+            self.db_station = db_station
+        writerParams = config.get("writerParams", {})
+        self.db = DatabaseWorker(self.db_connector,
+                                 retries=writerParams.get("retries", 2),
+                                 retry_delay=writerParams.get("retryDelay", 5))
+        self.dbHealthInterval = writerParams.get("healthCheckInterval", 60)
         self.all_stations_names: np.ndarray = self.db_station.name.to_numpy(
             dtype="str")
         self.all_stations_ids: np.ndarray[Any, np.dtype[np.int32]] = self.db_station.station_id.to_numpy(
             dtype=np.int32)
-        self.db_transition = pd.read_sql_table(
-            config["dbTables"]["transition"], self.db_connector)
+        self.parser = DepartureParser(self.all_stations_names,
+                                      self.all_stations_ids,
+                                      TIME_DELTA_THRESH)
+        self.parse_executor = ParseExecutor.from_config(
+            self.parser, config.get("parseParams", {}))
         self.backUpFolder = pl.Path(backUpFolder) \
             if backUpFolder is not None else None
+        self.backup = IncrementalBackup(self.db_connector,
+                                        self.depTableName,
+                                        self.backUpFolder) \
+            if self.backUpFolder is not None and self.db_connector is not None \
+            else None
+        self.archive = ResponseArchive(archiveFolder) \
+            if archiveFolder is not None else None
+        self.replayBatchRows = 50000
         self.refreshInterval = timedelta(seconds=30).seconds
-        self.saveInterval = timedelta(minutes=15).seconds
+        bufferParams = config.get("bufferParams", {})
+        self.buffer = WriteBehindBuffer.from_config(self.write_departures,
+                                                    bufferParams)
+        self.flushCheckInterval = bufferParams.get("checkInterval", 5)
+        self.maxIdleInterval = timedelta(minutes=15)
         self.backUpInterval = timedelta(hours=3)
+        self.backUpTime = time(hour=3, minute=0)
+        self.partitionTime = time(hour=2, minute=0)
         self.cwd = str(pl.Path(__file__).parent)
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
@@ -85,8 +134,25 @@ class DataManager:
                                            loggingDir,
                                            logging.INFO)
         self.init_stationID()
+        self.change_detector = ChangeDetector()
+        self.nextDepartures: dict[str, datetime] = {}
+        self.station_schedule = StationSchedule(
+            list(self.stationID),
+            active_interval=timedelta(seconds=self.refreshInterval),
+            max_idle_interval=self.maxIdleInterval,
+            horizon=TIME_DELTA_THRESH)
         self.last_saved = datetime.today().date()
 
+    def load_db_tables(self, config):
+        self.db_station = pd.read_sql_table(
+            config["dbTables"]["station"], self.db_connector)
+        self.db_line = pd.read_sql_table(
+            config["dbTables"]["line"], self.db_connector)
+        self.db_staion_order = pd.read_sql_table(
+            config["dbTables"]["station_order"], self.db_connector)
+        self.db_transition = pd.read_sql_table(
+            config["dbTables"]["transition"], self.db_connector)
+
     def init_stationID(self):
         # self.staion_attr = get_station_attributes(self.config).loc[:, ["station", "ID"]]
         stations = self.db_station.name.to_list()
@@ -95,56 +161,17 @@ class DataManager:
         keys = ["de:0" + s[:4] + ":" + s[4:] for s in keys]
         self.stationID = dict(zip(stations, keys))
 
-    def get_Df(self, cachedDep: list[dict], stationID: dict[str, str]):
-        depDf = pd.DataFrame(
-            columns=[field.name for field in fields(Departure)])
-        for i, station in enumerate(stationID):
-            querey: dict = cachedDep[i]
-            if querey is None:
-                continue
-            stationResponse = StationResponse(querey)
-            for dep in stationResponse.departures:
-                try:
-                    if dep.transportType != Product.SBahn\
-                            or dep.get_time_to_dep() > TIME_DELTA_THRESH\
-                            or dep.delay is None:
-                        continue
-                    dep.set_station_id(stationID[station])
-                    dep.set_departure_id()
-                    dep.set_destinationId_by_name(
-                        self.all_stations_names, self.all_stations_ids)
-                    cur_depDf = dep.get_df_repr("time_of_dep",
-                                                "time_of_record",
-                                                "line_id",
-                                                "station_id",
-                                                "destination_id",
-                                                "delay",
-                                                "departure_id")
-
-                    depDf = pd.concat(
-                        [depDf, cur_depDf], ignore_index=True)
-
-                except KeyError:
-                    self.logger.warning(
-                        f'KeyError: {station} not found in with' +
-                        f'line {dep.label}')
-                    # self.logger.error(
-                    #     ErrorType="KeyError",
-                    #     station=station, line=dep["label"])
-                    continue
-        return depDf
-
     def loadDf(self):
         if self.db_connector is None:
             self.get_connector()
         return pd.read_sql_table(self.depTableName, self.db_connector)
 
     def backup_table(self):
-        back_up_file_path = self.backUpFolder.joinpath(f"{self.depTableName}.csv")
-        backup_query = f"""
-                Copy {self.depTableName} to '{back_up_file_path}' CSV header
-                """
-        self.db_connector.execute(sa.text(backup_query))
+        """append the rows changed since the last backup to the compressed
+           day files in backUpFolder"""
+        if self.backup is None:
+            return
+        self.backup.run()
 
     def create_db_table(self, Df, tableName):
         if self.db_connector is None:
@@ -154,140 +181,327 @@ class DataManager:
                   if_exists="append",
                   index=False)
 
-    def update_db_table(self):
+    def drop_expired(self,
+                     depDf: pd.DataFrame,
+                     historyDf: pd.DataFrame = None
+                     ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """drop the departures older than the oldest attached partition and
+           their delay changes, their partitions were detached, so writing
+           them would fail the whole flush"""
+        oldest = self.partitions.oldest_attached()
+        if oldest is None or not len(depDf):
+            return depDf, historyDf
+        expired = depDf.time_of_dep < pd.Timestamp(oldest)
+        if not expired.any():
+            return depDf, historyDf
+        self.logger.warning(
+            f"dropped {expired.sum()} departures before {oldest}, " +
+            "the oldest attached partition of " +
+            f"{self.depTableName}, the earliest departs at " +
+            f"{depDf.time_of_dep[expired].min()}")
+        if historyDf is not None:
+            historyDf = historyDf[~historyDf.departure_id.isin(
+                depDf.departure_id[expired])]
+        return depDf[~expired], historyDf
+
+    def update_db_table(self,
+                        depDf: pd.DataFrame,
+                        historyDf: pd.DataFrame = None):
         if self.db_connector is None:
             self.get_connector()
-        temp_table_name = "temp_departure"
-        self.cumDf.to_sql(
-            temp_table_name,
-            self.db_connector,
-            if_exists="replace",
-            index=False)
-        comma_seperated_columns = ",".join(self.cumDf.columns)
-        insert_query = f"""
-                insert into {self.depTableName} ({comma_seperated_columns})
-                select {comma_seperated_columns}
-                from {temp_table_name}
-                on conflict (departure_id)
-                do nothing
-        """
-
-        update_query = f"""
-                UPDATE {self.depTableName} AS d
-                SET delay = t.delay,
-                    time_of_record = t.time_of_record
-                FROM {temp_table_name} AS t
-                WHERE d.departure_id = t.departure_id
-        """
-        self.db_connector.execute(sa.text(insert_query))
-        self.db_connector.execute(sa.text(update_query))
+        depDf, historyDf = self.drop_expired(depDf, historyDf)
+        if len(depDf):
+            self.partitions.ensure_range(depDf.time_of_dep.min(),
+                                         depDf.time_of_dep.max())
+        # a failed flush must not leave the rollup or the history behind
+        # the departures, it is retried as a whole
+        with self.db_connector.begin():
+            self.writer.write(depDf)
+            self.rollup.refresh(depDf)
+            if historyDf is not None:
+                self.history_writer.write(historyDf)
+
+    async def run_db(self, func, *args):
+        """run a blocking database call on the database thread, calls are
+           serialized as they share one connection"""
+        return await self.db.run(func, *args)
+
+    async def write_departures(self,
+                               depDf: pd.DataFrame,
+                               historyDf: pd.DataFrame):
+        """flush function of the write buffer, without a database the rows
+           are discarded, e.g. for benchmarking"""
+        if self.db_connector is None:
+            return
+        start = inbuild_time.perf_counter()
+        await self.run_db(self.update_db_table, depDf, historyDf)
+        self.logger.info(
+            f"saved snapshot of {len(depDf)} Departures and " +
+            f"{len(historyDf)} delay changes to database in " +
+            f"{inbuild_time.perf_counter() - start:.2f}s, {self.buffer}")
+
+    def replay(self,
+               archiveFolder: pl.Path,
+               start: datetime = None,
+               end: datetime = None):
+        """feed the records of a response archive through the parsing and
+           write path as fast as possible. The departures are collected in a
+           fresh DepartureStateStore, which records their delay changes the
+           way the write buffer does, and upserted to the database together
+           with them once replayBatchRows departures are dirty"""
+        store = DepartureStateStore(evict_after=self.buffer.store.evict_after)
+        records = 0
+        rows = 0
+        recorded_at = None
+        started = inbuild_time.perf_counter()
+        for recorded_at, station, globalId, content in iter_archive(
+                archiveFolder, start, end):
+            records += 1
+            try:
+                depDf, _ = self.parse_payload(station,
+                                              globalId,
+                                              content,
+                                              recorded_at)
+            except Exception as e:
+                self.logger.error(
+                    f"could not parse record of {station} at " +
+                    f"{datetime.fromtimestamp(recorded_at)}: {e!r}")
+                continue
+            store.upsert(depDf)
+            if store.dirty_count >= self.replayBatchRows:
+                rows += self._write_replayed(store,
+                                             datetime.fromtimestamp(recorded_at))
+        if recorded_at is not None:
+            rows += self._write_replayed(store,
+                                         datetime.fromtimestamp(recorded_at))
+        duration = inbuild_time.perf_counter() - started
+        self.logger.info(
+            f"replayed {records} records to {rows} rows in {duration:.1f}s, " +
+            f"{records / max(duration, 1e-9):.0f} records/s, " +
+            f"{self.change_detector}, {store}")
+
+    def _write_replayed(self,
+                        store: DepartureStateStore,
+                        now: datetime) -> int:
+        """write the dirty departures and delay changes of the store, then
+           drop the departures that left before now from it"""
+        depDf, _ = store.take_dirty()
+        historyDf = store.take_history()
+        if len(depDf) or len(historyDf):
+            self.db.call(self.update_db_table, depDf, historyDf)
+        store.evict(now)
+        return len(depDf)
+
+    async def flush(self):
+        await self.buffer.flush()
+
+    async def flush_task(self):
+        """flush the write buffer once one of its limits is reached"""
+        if self.buffer.is_due:
+            await self.buffer.flush_if_due()
+            self.scheduler.log_stats(self.logger)
+
+    async def backup_task(self):
+        # include the rows that are still buffered
+        await self.flush()
+        await self.run_db(self.backup_table)
+        self.logger.info("executing planned db backup")
+        self.last_saved = datetime.today().date()
 
-    def signal_handler(self, signal, frame):
-        self.update_db_table()
-        self.backup_table()
+    async def db_health_task(self):
+        if self.db_connector is None:
+            return
+        try:
+            await self.run_db(self.db.ping)
+        except Exception as e:
+            self.logger.error(f"database health check failed: {e!r}")
+
+    async def partition_task(self):
+        if self.db_connector is not None:
+            await self.run_db(self.partitions.maintain)
+
+    def request_shutdown(self):
         self.logger.info("Saving data to backup-dir and shutting down")
-        sys.exit(0)
-
-    def clean_up_proc(self):
-        self.update_db_table()
-
-    async def get_df_by_chunks(self):
-        for i in range(0, len(self.stationID), self.chunk_size):
-            chunk = dict(itertools.islice(
-                self.stationID.items(), i, i + self.chunk_size))
-            cachedDep = await cache_dep(chunk, self.client)
-            currDf = self.get_Df(cachedDep, chunk)
-            if i == 0:
-                cumDf = currDf
-            else:
-                cumDf = pd.concat([cumDf, currDf])
-        return cumDf
+        self.scheduler.stop()
 
-    async def main(self, config):
-        if config is None:
-            raise ValueError("No Config given")
+    def signal_handler(self, signal, frame):
+        self.loop.call_soon_threadsafe(self.request_shutdown)
 
-        loop = loop = asyncio.get_event_loop()
-        self.client = aiohttp.ClientSession(loop=loop)
-        self.chunk_size = 30
-        self.cumDf = await self.get_df_by_chunks()
-        # self.create_db_table(self.cumDf, self.depTableName)
-        # transDf = self.calculate_transfer(self.cumDf)
-        # self.create_db_table(transDf, self.transTableName)
-        signal.signal(signal.SIGTERM, self.signal_handler)
-        signal.signal(signal.SIGINT, self.signal_handler)
-
-        while True:
+    def register_signal_handlers(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
             try:
-                epoch_now = datetime.now()
-                currDf = await self.get_df_by_chunks()
-                self.cumDf = pd.concat([self.cumDf, currDf])
-                self.cumDf = self.cumDf.drop_duplicates(
-                    ["departure_id"], keep="last")
-                if epoch_now.hour == 3 and epoch_now.minute == 0:
-                    self.backup_table()
-                    self.logger.info("executing planned db backup")
-                    self.last_saved = datetime.today().date()
-
-                epochTime_Df = currDf.time_of_dep.min()
-                closest_dep: timedelta = epochTime_Df - epoch_now
-                if closest_dep.days <= 0:
-                    components = abs(closest_dep).components
-                    self.logger.info(
-                        "active connection with most recent departure before " +
-                        f"{components.hours}:{components.minutes}:{components.seconds}, next " +
-                        f"refresh in {self.refreshInterval} seconds")
-
-                if closest_dep > timedelta(days=0, hours=0, minutes=5):
-                    inbuild_time.sleep(closest_dep.total_seconds())
-                    self.logger.info(
-                        f"sleepmode, waiting for {closest_dep}")
-
-                inbuild_time.sleep(self.refreshInterval)
-
-                if (epoch_now % timedelta(minutes=15)).total_seconds() < 10:
-                    self.logger.info(
-                        "saving snapshot of Departures to database, saving " +
-                        f"again in {self.saveInterval // 60} minutes")
-                    self.update_db_table()
-                    self.cumDf = self.cumDf[0:0]
-                    inbuild_time.sleep(30)
-
-            except aiohttp.ServerConnectionError:
-                self.logger.error("ResponseError")
-                self.update_db_table()
-                self.cumDf = self.cumDf[0:0]
-                inbuild_time.sleep(1)
-                continue
-
-            except aiohttp.TooManyRedirects:
-                self.logger.error("TooManyRedirectsError")
-                self.update_db_table()
-                self.cumDf = self.cumDf[0:0]
-                inbuild_time.sleep(120)
-                continue
+                self.loop.add_signal_handler(sig, self.request_shutdown)
+            except NotImplementedError:
+                # the event loop on windows doesn't support signal handlers
+                signal.signal(sig, self.signal_handler)
+
+    async def clean_up_proc(self):
+        if self.archive is not None:
+            self.archive.close()
+        await self.flush()
+        await self.run_db(self.backup_table)
+        await self.fetcher.close()
+        await self.parse_executor.aclose()
+        self.db.close()
+
+    def payload_task(self,
+                     station: str,
+                     globalId: str,
+                     content: bytes,
+                     recorded_at: float) -> tuple[bytes, ParseTask | None]:
+        """:returns: tuple of the payload hash and the task to parse the
+            payload, which is None if the payload is unchanged"""
+        payloadHash = self.change_detector.hash_payload(content)
+        if not self.change_detector.payload_changed(station,
+                                                    payloadHash,
+                                                    recorded_at):
+            return payloadHash, None
+        return payloadHash, ParseTask(globalId,
+                                      content,
+                                      recorded_at,
+                                      self.change_detector.fingerprints(station))
+
+    def commit_parsed(self,
+                      station: str,
+                      payloadHash: bytes,
+                      parsed: ParsedPayload) -> pd.DataFrame:
+        if parsed.rejected:
+            self.logger.warning(
+                f"rejected {parsed.rejected} of {parsed.changed} changed " +
+                f"departures of {station}")
+        self.change_detector.count_departures(parsed.seen, parsed.changed)
+        self.change_detector.commit(station,
+                                    payloadHash,
+                                    parsed.next_entry,
+                                    parsed.fingerprints)
+        return parsed.to_df()
+
+    def parse_payload(self,
+                      station: str,
+                      globalId: str,
+                      content: bytes,
+                      recorded_at: float
+                      ) -> tuple[pd.DataFrame, ParsedPayload | None]:
+        """parse a raw station response as it was at recorded_at on the
+           calling thread, departures that would be dropped anyway or did not
+           change since the last response of the station are filtered before
+           the validation
+           :returns: tuple of the departures and the parse result, which is
+            None if the payload is unchanged"""
+        payloadHash, task = self.payload_task(station,
+                                              globalId,
+                                              content,
+                                              recorded_at)
+        if task is None:
+            return empty_departure_frame(), None
+        parsed = self.parser.parse(task)
+        return self.commit_parsed(station, payloadHash, parsed), parsed
+
+    async def parse_station(self, station: str, content: bytes) -> pd.DataFrame:
+        """parse the raw response of a single station on the parse executor,
+           archive it and reschedule the station"""
+        recorded_at = inbuild_time.time()
+        globalId = self.stationID[station]
+        if self.archive is not None:
+            self.archive.record(station, globalId, content, recorded_at)
+        payloadHash, task = self.payload_task(station,
+                                              globalId,
+                                              content,
+                                              recorded_at)
+        depDf = empty_departure_frame()
+        if task is not None:
+            parsed = await self.parse_executor.parse(task)
+            depDf = self.commit_parsed(station, payloadHash, parsed)
+            self.nextDepartures[station] = parsed.next_departure
+        self.station_schedule.update(station, self.nextDepartures.get(station))
+        return depDf
 
-            except AssertionError:
-                self.logger.error("AssertionError")
-                self.update_db_table()
-                self.cumDf = self.cumDf[0:0]
-                inbuild_time.sleep(120)
-                continue
-            except aiohttp.ClientConnectionError:
-                self.logger.error("InternetConnectionError")
-                self.update_db_table()
-                self.cumDf = self.cumDf[0:0]
-                inbuild_time.sleep(120)
-                continue
+    async def poll_stations(self, stations: list[str] = None):
+        """stream the given stations through the fetch, parse and write
+           stages, defaults to all stations"""
+        if stations is None:
+            stations = list(self.stationID)
+        stats = await self.pipeline.run(
+            {station: self.stationID[station] for station in stations})
+        for failure in stats.failures:
+            self.logger.warning(
+                f"failed to fetch {failure.station} after " +
+                f"{failure.attempts} attempts: {failure.reason}")
+            self.station_schedule.update(failure.station, None, fetched=False)
+        for station, error in stats.parse_errors.items():
+            self.logger.error(
+                f"could not parse response of {station}: {error!r}")
+            self.station_schedule.update(station, None, fetched=False)
+        self.logger.debug(
+            f"pipeline {stats}, {self.change_detector}, {self.buffer}")
+        return stats
+
+    async def poll(self) -> float:
+        """run one polling cycle over all due stations
+           :returns: float - delay in seconds until the next cycle"""
+        try:
+            dueStations = self.station_schedule.due()
+            if dueStations:
+                stats = await self.poll_stations(dueStations)
+                self.logger.debug(
+                    f"polled {len(dueStations)} of {len(self.stationID)} " +
+                    f"stations, {self.station_schedule.active_count} active")
+                if len(stats.failures) == len(dueStations):
+                    self.logger.error("InternetConnectionError")
+                    await self.flush()
+                    return 120
+
+            toNextPoll = self.station_schedule.time_to_next_poll()
+            if toNextPoll > timedelta(minutes=5):
+                self.logger.info(
+                    f"sleepmode, waiting for {toNextPoll}")
+            return max(toNextPoll.total_seconds(), 1)
+
+        except AssertionError:
+            self.logger.error("AssertionError")
+            await self.flush()
+            return 120
+
+        except IndexError:
+            self.logger.error("PayloadError")
+            return 30
+
+    async def start(self, config):
+        """open the http session and set up the polling pipeline"""
+        self.loop = asyncio.get_running_loop()
+        self.fetcher = DepartureFetcher.from_config(
+            config.get("fetchParams", {}))
+        await self.fetcher.open()
+        self.parse_executor.start()
+        # by default one parser task per worker keeps all of them busy
+        pipelineParams = dict(config.get("pipelineParams", {}))
+        pipelineParams.setdefault("parserWorkers", self.parse_executor.workers)
+        self.pipeline = Pipeline.from_config(self.fetcher,
+                                             self.parse_station,
+                                             self.buffer.add,
+                                             pipelineParams)
+        if self.archive is not None:
+            self.archive.start()
 
-            except asyncio.TimeoutError:
-                self.logger.error("TimeOutError")
-                self.update_db_table()
-                self.cumDf = self.cumDf[0:0]
-                inbuild_time.sleep(360)
-                continue
+    async def main(self, config):
+        if config is None:
+            raise ValueError("No Config given")
 
-            except IndexError:
-                self.logger.error("PayloadError")
-                inbuild_time.sleep(30)
-                continue
+        await self.start(config)
+        await self.poll_stations()
+
+        self.scheduler = Scheduler()
+        self.scheduler.add_periodic("poll", self.poll, self.refreshInterval)
+        self.scheduler.add_periodic("flush", self.flush_task, self.flushCheckInterval)
+        self.scheduler.add_periodic("db_health",
+                                    self.db_health_task,
+                                    self.dbHealthInterval)
+        self.scheduler.add_daily("backup", self.backup_task, self.backUpTime)
+        self.scheduler.add_daily("partitions",
+                                 self.partition_task,
+                                 self.partitionTime)
+        self.register_signal_handlers()
+        try:
+            await self.scheduler.run()
+        finally:
+            await self.clean_up_proc()
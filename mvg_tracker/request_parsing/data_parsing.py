@@ -18,6 +18,25 @@ class DataWrapper(ABC):
         the full path can only the constructed if the base path is propagated down from it's parent nodes """
 
     META_PARAMS = ["base_path", "log_level"]
+    _NESTED_FIELDS: list[tuple[str, type, type]] = []
+
+    def __init_subclass__(cls, **kwargs):
+        """collect the fields holding nested DataWrappers once per class,
+           instead of walking all annotations for every instance"""
+        super().__init_subclass__(**kwargs)
+        cls.init_class_logger()
+        cls._NESTED_FIELDS = []
+        for attr, attr_type in getattr(cls, "__annotations__", {}).items():
+            sub_attr_type = type(None)
+            if hasattr(attr_type, "__origin__"):
+                sub_attr_type = attr_type.__args__[0]
+                attr_type = getattr(attr_type, "__origin__")
+            if not (isinstance(attr_type, type) and isinstance(sub_attr_type, type)):
+                continue
+            if not (issubclass(attr_type, DataWrapper) or
+                    (issubclass(attr_type, list) and issubclass(sub_attr_type, DataWrapper))):
+                continue
+            cls._NESTED_FIELDS.append((attr, attr_type, sub_attr_type))
 
     def _propagate_to_subclass(self,
                                attr,
@@ -63,16 +82,7 @@ class DataWrapper(ABC):
         # set the META_PARAMS module-wide if they are set in the class i.E.
         # the top Level Classes
 
-        for attr, attr_type in self.__annotations__.items():
-            sub_attr_type = type(None)
-            if hasattr(attr_type, "__origin__"):
-                sub_attr_type = attr_type.__args__[0]
-                attr_type = getattr(attr_type, "__origin__")
-
-            if not (issubclass(attr_type, DataWrapper) or
-                    (issubclass(attr_type, list) and issubclass(sub_attr_type, DataWrapper))):
-                continue
-
+        for attr, attr_type, sub_attr_type in self._NESTED_FIELDS:
             if not hasattr(self, attr):
                 continue
             kwargs = getattr(self, attr)
@@ -123,14 +133,19 @@ class DataWrapper(ABC):
 
         self.init_logger()
 
+    @classmethod
+    def init_class_logger(cls):
+        """initialize the logger with the name of the class once, all
+           instances share it"""
+        cls.logger = logging.getLogger(cls.__name__)
+        cls.logger.setLevel(logging.DEBUG)
+        cls.logger = init_console_logger(cls.logger)
+
     def init_logger(self):
-        """initialize the class logger with the name of the class,
-           if a base_path is given, the logs will be written there as well"""
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
-        self.logger = init_console_logger(self.logger)
+        """if a base_path is given, the logs of the class logger will be
+           written there as well"""
         if hasattr(self, "base_path") and self.base_path is not None:
-            self.logger = init_file_logger(self.logger, self.base_path)
+            init_file_logger(self.logger, self.base_path)
 
     def check_passed_args(self, kwargs: dict):
         """check the arguments upon instantiation of a child class,
@@ -161,7 +176,7 @@ class DataWrapper(ABC):
             elif issubclass(type(value), DataWrapper):
                 append_dict = {f"{value.__class__.__name__}_{k}": v
                                for k, v in value.__dict__.items()}
-                append_dict.pop(f"{value.__class__.__name__}_logger")
+                append_dict.pop(f"{value.__class__.__name__}_logger", None)
                 output_dict.update(append_dict)
             elif isinstance(value, logging.Logger):
                 pass
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from datetime import datetime
+from mvg_tracker.request_parsing.enum_classes import Product
+
+
+# layout of the 63 bit key, from the most significant bits on:
+# station id | planned minute since KEY_EPOCH | line id | product code
+STATION_BITS = 30
+MINUTE_BITS = 24
+LINE_BITS = 6
+PRODUCT_BITS = 3
+
+PRODUCT_SHIFT = 0
+LINE_SHIFT = PRODUCT_BITS
+MINUTE_SHIFT = LINE_SHIFT + LINE_BITS
+STATION_SHIFT = MINUTE_SHIFT + MINUTE_BITS
+
+# 2020-01-01T00:00:00Z, 24 bits of minutes reach into 2051
+KEY_EPOCH = 1577836800
+
+# codes are persisted in the keys, never renumber them
+PRODUCT_CODES: dict[Product, int] = {
+    Product.SBahn: 1,
+    Product.UBahn: 2,
+    Product.RegionalBus: 3,
+    Product.RufTaxi: 4,
+    Product.Bus: 5,
+    Product.Tram: 6,
+}
+PRODUCTS_BY_CODE: dict[int, Product] = {
+    code: product for product, code in PRODUCT_CODES.items()}
+
+
+@dataclass(frozen=True)
+class DepartureKey:
+    station_id: int
+    planned: datetime
+    line_id: int
+    product: Product
+
+
+def _check_range(name: str, value: int, bits: int) -> None:
+    if not 0 <= value < 1 << bits:
+        raise ValueError(f"{name} {value} doesn't fit into {bits} bits")
+
+
+def pack_departure_key(station_id: int,
+                       planned: datetime | float,
+                       line_id: int,
+                       product: Product) -> int:
+    """pack the parts identifying a departure into one positive int64
+       :param planned: datetime or epoch seconds of the planned departure,
+        naive datetimes are local time
+       :raises ValueError: if a part exceeds its bits"""
+    epoch = planned.timestamp() if isinstance(planned, datetime) else planned
+    minute = (int(epoch) - KEY_EPOCH) // 60
+    product_code = PRODUCT_CODES.get(product, 0)
+    _check_range("station id", station_id, STATION_BITS)
+    _check_range("planned minute", minute, MINUTE_BITS)
+    _check_range("line id", line_id, LINE_BITS)
+    return (station_id << STATION_SHIFT
+            | minute << MINUTE_SHIFT
+            | line_id << LINE_SHIFT
+            | product_code << PRODUCT_SHIFT)
+
+
+def unpack_departure_key(key: int) -> DepartureKey:
+    """decode a key of pack_departure_key, planned is local time"""
+    def part(shift: int, bits: int) -> int:
+        return (key >> shift) & ((1 << bits) - 1)
+
+    minute = part(MINUTE_SHIFT, MINUTE_BITS)
+    return DepartureKey(
+        station_id=part(STATION_SHIFT, STATION_BITS),
+        planned=datetime.fromtimestamp(KEY_EPOCH + minute * 60),
+        line_id=part(LINE_SHIFT, LINE_BITS),
+        product=PRODUCTS_BY_CODE.get(part(PRODUCT_SHIFT, PRODUCT_BITS)))
+
+
+def _check_range_sql(name: str, value: str, bits: int) -> str:
+    """SQL counterpart of _check_range, an out of range value fails the
+       statement with the message of the ValueError as invalid bigint"""
+    return (f"(case when {value} between 0 and {(1 << bits) - 1} " +
+            f"then {value} else ('{name} ' || {value} || " +
+            f"' doesn''t fit into {bits} bits')::bigint end)")
+
+
+def departure_key_sql(id_column: str) -> str:
+    """SQL expression packing a former text departure id of the form
+       '<station_id>_<epoch>_<label>_<product>' like pack_departure_key,
+       including its range checks"""
+    station = f"split_part({id_column}, '_', 1)::bigint"
+    # floor like the integer division of pack_departure_key, bigint division
+    # truncates epochs before KEY_EPOCH towards zero
+    minute = (f"floor((split_part({id_column}, '_', 2)::bigint - {KEY_EPOCH})" +
+              " / 60.0)::bigint")
+    line = (f"coalesce(nullif(regexp_replace(split_part({id_column}, '_', 3), " +
+            "'\\D', '', 'g'), '')::bigint, 0)")
+    product = f"regexp_replace({id_column}, '^([^_]*_){{3}}', '')"
+    product_code = "case " + " ".join(
+        f"when {product} = '{product_enum.value}' then {code}"
+        for product_enum, code in PRODUCT_CODES.items()) + " else 0 end"
+    station = _check_range_sql("station id", station, STATION_BITS)
+    minute = _check_range_sql("planned minute", minute, MINUTE_BITS)
+    line = _check_range_sql("line id", line, LINE_BITS)
+    return (f"(({station} << {STATION_SHIFT}) | ({minute} << {MINUTE_SHIFT}) " +
+            f"| ({line} << {LINE_SHIFT}) | ({product_code} << {PRODUCT_SHIFT}))")
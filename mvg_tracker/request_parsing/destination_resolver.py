@@ -0,0 +1,113 @@
+import logging
+import threading
+from collections.abc import Sequence
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("DestinationResolver")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+NO_MATCH = 0
+
+
+class DestinationResolver:
+    """resolves the destination of a departure to the id of the first station
+       in the station table whose name is contained in it, e.g. 'München Ost'
+       resolves to the station named 'Ost' if no station before it matches.
+       The names are compiled once into an Aho-Corasick automaton, so a
+       lookup is linear in the length of the destination instead of the
+       number of stations. Exact names and seen destinations are answered
+       from dicts
+       :param names: Sequence - station names in table order, the lowest
+        position wins if several names are contained in a destination
+       :param ids: Sequence - station ids in the same order
+       :param memo_size: int - destinations remembered before the memo is
+        cleared, the memo is locked so parser threads can share a resolver"""
+
+    def __init__(self,
+                 names: Sequence[str],
+                 ids: Sequence[int],
+                 memo_size: int = 10000) -> None:
+        if len(names) != len(ids):
+            raise ValueError(
+                f"got {len(names)} station names but {len(ids)} ids")
+        self.ids = [int(station_id) for station_id in ids]
+        self.memo_size = memo_size
+        self.misses = 0
+        self._build(names)
+        self.exact = {name: self._station_id(self._search(name))
+                      for name in names}
+        self._memo: dict[str, int] = {}
+        self._memo_lock = threading.Lock()
+
+    def _build(self, names: Sequence[str]) -> None:
+        no_match = len(names)
+        self._goto: list[dict[str, int]] = [{}]
+        # lowest position of all names ending in a node, directly or as a
+        # suffix reached over the failure links
+        self._best: list[int] = [no_match]
+        for position, name in enumerate(names):
+            node = 0
+            for char in name:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._best.append(no_match)
+                node = next_node
+            self._best[node] = min(self._best[node], position)
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._best[node] = min(self._best[node], self._best[0])
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._best[child] = min(self._best[child],
+                                        self._best[self._fail[child]])
+                queue.append(child)
+
+    def _search(self, destination: str) -> int:
+        goto, fail, best = self._goto, self._fail, self._best
+        node = 0
+        found = best[0]
+        for char in destination:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] < found:
+                found = best[node]
+        return found
+
+    def _station_id(self, position: int) -> int:
+        return self.ids[position] if position < len(self.ids) else NO_MATCH
+
+    def resolve(self, destination: str) -> int:
+        """:returns: int - station id, NO_MATCH if no name is contained"""
+        station_id = self.exact.get(destination)
+        if station_id is not None:
+            return station_id
+        station_id = self._memo.get(destination)
+        if station_id is not None:
+            return station_id
+        station_id = self._station_id(self._search(destination))
+        with self._memo_lock:
+            if station_id == NO_MATCH and destination not in self._memo:
+                self.misses += 1
+                logger.warning(
+                    f"Encountered non matching destination {destination}")
+            if len(self._memo) >= self.memo_size:
+                self._memo.clear()
+            self._memo[destination] = station_id
+        return station_id
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}({len(self.ids)} stations, " +
+                f"{len(self._goto)} states, {len(self._memo)} memoized, " +
+                f"{self.misses} misses)")
@@ -1,40 +1,158 @@
-import json
-import logging
+import random
 import aiohttp
 import asyncio
 import sys
-from mvg_tracker.logging_util.init_loggers import init_console_logger
+from dataclasses import dataclass
 
 
-logger = logging.getLogger("RequestHandeler")
-logger = init_console_logger(logger)
-logger.setLevel(logging.DEBUG)
+DEPARTURE_URL = "https://www.mvg.de/api/fib/v2/departure?globalId={station}"
+# status codes that are worth another attempt, everything else non 200 is
+# reported as failure right away
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
 
-async def get_json(client, url):
-    async with client.get(url) as response:
-        if response.status != 200:
-            logger.debug(f"got bad response from server {response.status} at url {url}")
-            return
-        return await response.read()
+class RetryableError(Exception):
+    def __init__(self, message: str = None) -> None:
+        super().__init__(message)
 
 
-async def get_dep(station, client):
-    content = await get_json(
-        client,
-        f"https://www.mvg.de/api/fib/v2/departure?globalId={station}")
-    # content=requests.get(URL)
-    if content is None:
-        return
-    querey = json.loads(content.decode())
-    return querey
+class FetchError(Exception):
+    def __init__(self, message: str = None, attempts: int = 1) -> None:
+        super().__init__(message)
+        self.attempts = attempts
 
 
-async def cache_dep(stationID, client):
-    pending_tasks = [asyncio.ensure_future(
-        get_dep(i, client)) for i in list(stationID.values())]
-    cachedDep = await asyncio.gather(*pending_tasks)
-    return cachedDep
+@dataclass
+class FetchFailure:
+    station: str
+    reason: str
+    attempts: int
+
+
+class DepartureFetcher:
+    """fetches the departures of many stations concurrently over one
+       ClientSession, each station gets its own timeout and retries with
+       jittered exponential backoff, so a slow or failing station neither
+       stalls nor aborts the others
+       :param max_concurrency: int - maximum number of requests in flight
+       :param timeout: float - total timeout in seconds per request
+       :param retries: int - additional attempts per station after a failure
+       :param backoff_base: float - base delay in seconds of the backoff
+       :param backoff_max: float - upper bound of a single backoff delay
+       :param keepalive_timeout: float - seconds an idle connection is kept
+       :param dns_cache_ttl: int - seconds a resolved host is cached
+       :param base_url: str - url template with a {station} placeholder"""
+
+    def __init__(self,
+                 max_concurrency: int = 10,
+                 timeout: float = 10,
+                 retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8,
+                 keepalive_timeout: float = 60,
+                 dns_cache_ttl: int = 300,
+                 base_url: str = DEPARTURE_URL) -> None:
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.base_url = base_url
+        self.client: aiohttp.ClientSession = None
+        self._semaphore: asyncio.Semaphore = None
+
+    @classmethod
+    def from_config(cls, fetchParams: dict) -> "DepartureFetcher":
+        return cls(
+            max_concurrency=fetchParams.get("maxConcurrency", 10),
+            timeout=fetchParams.get("timeout", 10),
+            retries=fetchParams.get("retries", 3),
+            backoff_base=fetchParams.get("backoffBase", 0.5),
+            backoff_max=fetchParams.get("backoffMax", 8),
+            keepalive_timeout=fetchParams.get("keepaliveTimeout", 60),
+            dns_cache_ttl=fetchParams.get("dnsCacheTtl", 300),
+            base_url=fetchParams.get("baseUrl", DEPARTURE_URL))
+
+    async def open(self) -> None:
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True)
+        self.client = aiohttp.ClientSession(connector=connector,
+                                            timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def __aenter__(self) -> "DepartureFetcher":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def get_backoff(self, attempt: int) -> float:
+        """full jitter: random delay between zero and the exponential bound"""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _request(self, station: str) -> bytes:
+        url = self.base_url.format(station=station)
+        async with self._semaphore:
+            async with self.client.get(url) as response:
+                if response.status in RETRY_STATUS:
+                    raise RetryableError(f"status {response.status}")
+                if response.status != 200:
+                    raise ValueError(f"status {response.status}")
+                return await response.read()
+
+    async def fetch(self, station: str) -> bytes:
+        """fetch the raw departures of a single station
+           :raises FetchError with the reason of the last attempt if the
+            request can't be retried or every attempt failed"""
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._request(station)
+            except ValueError as e:
+                raise FetchError(str(e), attempt + 1)
+            except aiohttp.TooManyRedirects:
+                raise FetchError("too many redirects", attempt + 1)
+            except (RetryableError,
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError) as e:
+                reason = f"{type(e).__name__} {e}".strip()
+                if attempt == self.retries:
+                    raise FetchError(reason, attempt + 1)
+                await asyncio.sleep(self.get_backoff(attempt))
+
+    async def _fetch_reported(self,
+                              station: str,
+                              globalId: str) -> tuple[str, bytes | FetchFailure]:
+        try:
+            return station, await self.fetch(globalId)
+        except FetchError as e:
+            return station, FetchFailure(station, str(e), e.attempts)
+
+    async def stream(self, stationID: dict[str, str]):
+        """fetch all given stations concurrently and yield them in the order
+           they finish
+           :param stationID: dict - mapping of station name to global id
+           :yields: tuple of station name and either the raw response
+            or a FetchFailure"""
+        pending = [asyncio.ensure_future(self._fetch_reported(station, globalId))
+                   for station, globalId in stationID.items()]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                yield await next_done
+        finally:
+            for task in pending:
+                task.cancel()
 
 
 def show_psycopg2_exception(err):
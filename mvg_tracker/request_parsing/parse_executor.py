@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from collections.abc import Sequence
+import numpy as np
+import pandas as pd
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.batching import DepartureBatch, empty_departure_frame
+from mvg_tracker.request_parsing.change_detection import diff_departures
+from mvg_tracker.request_parsing.data_classes import Departure
+from mvg_tracker.request_parsing.destination_resolver import DestinationResolver
+from mvg_tracker.request_parsing.enum_classes import Product
+from mvg_tracker.request_parsing.prefilter import loads, prefilter_departures
+
+
+logger = logging.getLogger("ParseExecutor")
+logger = init_console_logger(logger)
+logger.setLevel(logging.INFO)
+
+EXECUTOR_KINDS = ("process", "thread", "inline")
+
+
+@dataclass
+class ParseTask:
+    """everything needed to parse one station response, sent to the workers
+       :param content: bytes - raw response as received, it is only decoded
+        by the worker
+       :param previous: dict - fingerprints of the last committed response of
+        the station"""
+    globalId: str
+    content: bytes
+    recorded_at: float
+    previous: dict[tuple, tuple]
+
+
+@dataclass
+class ParsedPayload:
+    """result of parsing a station response, the departures are kept as typed
+       columns, which are cheap to send back from a worker process
+       :param columns: dict - one array per column of DEP_COLUMNS
+       :param next_departure: datetime - earliest upcoming S-Bahn departure
+       :param next_entry: float - epoch at which the next departure enters the
+        horizon
+       :param fingerprints: dict - fingerprints of all departures to commit
+       :param seen: int - departures kept by the prefilter
+       :param changed: int - departures that changed and were validated
+       :param rejected: int - changed departures that failed the validation
+        or have no line id"""
+    columns: dict[str, np.ndarray]
+    next_departure: datetime | None
+    next_entry: float | None
+    fingerprints: dict[tuple, tuple]
+    seen: int
+    changed: int
+    rejected: int = 0
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def to_df(self) -> pd.DataFrame:
+        if not len(self):
+            return empty_departure_frame()
+        return pd.DataFrame(self.columns)
+
+
+class DepartureParser:
+    """turns raw station responses into the columns of the departures table,
+       it holds no state that changes between responses, so it can be used
+       from several threads or be rebuilt in a worker process
+       :param station_names: Sequence - station names in table order
+       :param station_ids: Sequence - station ids in the same order
+       :param horizon: timedelta - maximum time until a kept departure"""
+
+    def __init__(self,
+                 station_names: Sequence[str],
+                 station_ids: Sequence[int],
+                 horizon: timedelta) -> None:
+        self.station_names = [str(name) for name in station_names]
+        self.station_ids = [int(station_id) for station_id in station_ids]
+        self.horizon = horizon
+        self.resolver = DestinationResolver(self.station_names,
+                                            self.station_ids)
+
+    def __reduce__(self):
+        # the resolver is rebuilt instead of pickled with its lock
+        return (self.__class__,
+                (self.station_names, self.station_ids, self.horizon))
+
+    def parse_departures(self,
+                         departures: list[dict],
+                         globalId: str,
+                         now: datetime,
+                         batch: DepartureBatch) -> int:
+        """validate raw departures of one station and append the S-Bahn
+           departures within the horizon that have a delay to batch
+           :returns: int - number of rejected departures"""
+        rejected = 0
+        for raw in departures:
+            # validate one departure at a time and only keep the columns of
+            # the accepted ones, a broken departure must not cost the rest
+            # of the response
+            try:
+                dep = Departure(**raw)
+                if dep.transportType != Product.SBahn\
+                        or dep.get_time_to_dep(now) > self.horizon\
+                        or dep.delay is None:
+                    continue
+                if dep.invaild:
+                    raise ValueError(f"no line id in label {dep.label!r}")
+                dep.time_of_record = now
+                dep.set_station_id(globalId)
+                dep.set_departure_id()
+                dep.set_destinationId_by_name(self.resolver)
+                batch.append(dep)
+            except Exception as e:
+                rejected += 1
+                logger.debug(f"rejected departure of {globalId}: {e!r}")
+        return rejected
+
+    def parse(self, task: ParseTask) -> ParsedPayload:
+        """decode, prefilter, diff and validate a raw station response"""
+        prefiltered = prefilter_departures(loads(task.content),
+                                           self.horizon,
+                                           task.recorded_at)
+        changed, fingerprints = diff_departures(task.previous,
+                                                prefiltered.kept)
+        batch = DepartureBatch()
+        rejected = self.parse_departures(
+            changed,
+            task.globalId,
+            datetime.fromtimestamp(task.recorded_at),
+            batch)
+        return ParsedPayload(batch.to_columns(),
+                             prefiltered.next_departure,
+                             prefiltered.next_entry,
+                             fingerprints,
+                             len(prefiltered.kept),
+                             len(changed),
+                             rejected)
+
+
+# parser of a worker process, set up once by its initializer
+_worker_parser: DepartureParser = None
+
+
+def _init_worker(parser: DepartureParser) -> None:
+    global _worker_parser
+    _worker_parser = parser
+
+
+def _parse_in_worker(task: ParseTask) -> ParsedPayload:
+    return _worker_parser.parse(task)
+
+
+class ParseExecutor:
+    """runs the parsing of station responses off the event loop. A process
+       pool parses in parallel on all cores, every worker rebuilds the parser
+       once. A thread pool shares the parser of the calling process and is the
+       fallback if no process pool can be started, inline parses on the
+       calling thread
+       :param parser: DepartureParser - parser of the calling process
+       :param kind: str - one of EXECUTOR_KINDS
+       :param workers: int - number of workers, defaults to the core count
+       :param start_method: str - multiprocessing start method of the process
+        pool, spawn doesn't copy the threads and sockets of the collector"""
+
+    def __init__(self,
+                 parser: DepartureParser,
+                 kind: str = "process",
+                 workers: int = None,
+                 start_method: str = "spawn") -> None:
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(
+                f"unknown executor kind {kind}, expected one of {EXECUTOR_KINDS}")
+        self.parser = parser
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.start_method = start_method
+        self.executor: Executor = None
+
+    @classmethod
+    def from_config(cls,
+                    parser: DepartureParser,
+                    parseParams: dict) -> "ParseExecutor":
+        return cls(parser,
+                   kind=parseParams.get("executor", "process"),
+                   workers=parseParams.get("workers"),
+                   start_method=parseParams.get("startMethod", "spawn"))
+
+    def start(self) -> None:
+        if self.executor is not None or self.kind == "inline":
+            return
+        if self.kind == "process":
+            try:
+                self.executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.parser,))
+                return
+            except (OSError, ValueError, NotImplementedError) as e:
+                logger.warning(
+                    f"could not start a process pool, parsing in threads: {e!r}")
+                self.kind = "thread"
+        self.executor = ThreadPoolExecutor(self.workers,
+                                           thread_name_prefix="parser")
+
+    async def parse(self, task: ParseTask) -> ParsedPayload:
+        """parse a station response on a worker without blocking the loop"""
+        if self.kind == "inline":
+            return self.parser.parse(task)
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            return await loop.run_in_executor(self.executor,
+                                              self.parser.parse,
+                                              task)
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor,
+                                              _parse_in_worker,
+                                              task)
+        except BrokenProcessPool as e:
+            # e.g. a worker got killed, keep collecting in threads
+            self._replace_broken_pool(executor, e)
+            return await self.parse(task)
+
+    def _replace_broken_pool(self,
+                             broken: Executor,
+                             error: BrokenProcessPool) -> None:
+        """switch to a thread pool once, every task that was running on the
+           broken pool ends up here, later ones keep the new pool"""
+        if self.executor is not broken:
+            return
+        logger.error(
+            f"process pool broke, parsing in threads from now on: {error!r}")
+        self.kind = "thread"
+        self.executor = None
+        # its workers are gone already, don't wait for them on the loop
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def close(self) -> None:
+        """shut the workers down, blocks until running parses are done"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def aclose(self) -> None:
+        """close without blocking the event loop"""
+        await asyncio.to_thread(self.close)
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}({self.kind}, " +
+                f"{self.workers} workers)")
@@ -0,0 +1,180 @@
+import asyncio
+import time
+import pandas as pd
+from dataclasses import dataclass, field
+from collections.abc import Awaitable, Callable
+from mvg_tracker.request_parsing.networking import DepartureFetcher, FetchFailure
+
+
+_DONE = None
+
+
+@dataclass
+class PipelineStats:
+    """statistics of one pipeline run, the busy times are the summed time each
+       stage spent working, so a cycle latency close to the largest of them
+       means the stages overlapped. fetch_blocked is the time the fetcher
+       waited for room in the fetch queue, it isn't part of fetch_busy"""
+    fetched: int = 0
+    parsed_rows: int = 0
+    written_rows: int = 0
+    write_batches: int = 0
+    failures: list[FetchFailure] = field(default_factory=list)
+    parse_errors: dict[str, Exception] = field(default_factory=dict)
+    fetch_busy: float = 0.0
+    fetch_blocked: float = 0.0
+    parse_busy: float = 0.0
+    write_busy: float = 0.0
+    max_fetch_queue: int = 0
+    max_write_queue: int = 0
+    latency: float = 0.0
+
+    def __repr__(self) -> str:
+        return (f"fetched={self.fetched} failed={len(self.failures)} " +
+                f"parse_errors={len(self.parse_errors)} " +
+                f"rows={self.written_rows} batches={self.write_batches} " +
+                f"latency={self.latency:.2f}s fetch={self.fetch_busy:.2f}s " +
+                f"blocked={self.fetch_blocked:.2f}s " +
+                f"parse={self.parse_busy:.2f}s write={self.write_busy:.2f}s " +
+                f"queues={self.max_fetch_queue}/{self.max_write_queue}")
+
+
+class Pipeline:
+    """streams station responses through three stages connected by bounded
+       queues: the fetcher puts raw payloads onto the fetch queue, parser
+       workers turn them into departure frames and the writer collects them
+       into batches of at least batch_rows rows. A full queue blocks the
+       stage in front of it, so a slow stage throttles the others
+       :param fetcher: DepartureFetcher - opened fetcher to get the payloads
+       :param parse_func: coroutine function getting the station name and the
+        raw payload and returning a DataFrame of departures, the parsing
+        itself should run off the event loop
+       :param write_func: coroutine function getting a batch DataFrame
+       :param parser_workers: int - number of concurrent parser workers
+       :param queue_size: int - capacity of each queue
+       :param batch_rows: int - rows collected before a batch is written"""
+
+    def __init__(self,
+                 fetcher: DepartureFetcher,
+                 parse_func: Callable[[str, bytes], Awaitable[pd.DataFrame]],
+                 write_func: Callable[[pd.DataFrame], Awaitable[None]],
+                 parser_workers: int = 2,
+                 queue_size: int = 32,
+                 batch_rows: int = 500) -> None:
+        self.fetcher = fetcher
+        self.parse_func = parse_func
+        self.write_func = write_func
+        self.parser_workers = parser_workers
+        self.queue_size = queue_size
+        self.batch_rows = batch_rows
+
+    @classmethod
+    def from_config(cls,
+                    fetcher: DepartureFetcher,
+                    parse_func: Callable[[str, bytes], Awaitable[pd.DataFrame]],
+                    write_func: Callable[[pd.DataFrame], Awaitable[None]],
+                    pipelineParams: dict) -> "Pipeline":
+        return cls(fetcher,
+                   parse_func,
+                   write_func,
+                   parser_workers=pipelineParams.get("parserWorkers", 2),
+                   queue_size=pipelineParams.get("queueSize", 32),
+                   batch_rows=pipelineParams.get("writeBatchRows", 500))
+
+    async def _fetch_stage(self,
+                           stationID: dict[str, str],
+                           fetch_queue: asyncio.Queue,
+                           stats: PipelineStats) -> None:
+        start = time.perf_counter()
+        async for station, result in self.fetcher.stream(stationID):
+            if isinstance(result, FetchFailure):
+                stats.failures.append(result)
+                continue
+            stats.fetched += 1
+            blocked = time.perf_counter()
+            await fetch_queue.put((station, result))
+            stats.fetch_blocked += time.perf_counter() - blocked
+            stats.max_fetch_queue = max(stats.max_fetch_queue,
+                                        fetch_queue.qsize())
+        stats.fetch_busy = time.perf_counter() - start - stats.fetch_blocked
+        for _ in range(self.parser_workers):
+            await fetch_queue.put(_DONE)
+
+    async def _parse_stage(self,
+                           fetch_queue: asyncio.Queue,
+                           write_queue: asyncio.Queue,
+                           stats: PipelineStats) -> None:
+        while (item := await fetch_queue.get()) is not _DONE:
+            station, content = item
+            start = time.perf_counter()
+            try:
+                depDf = await self.parse_func(station, content)
+            except Exception as e:
+                # a broken payload must not stop the other stations
+                stats.parse_errors[station] = e
+                continue
+            finally:
+                stats.parse_busy += time.perf_counter() - start
+            stats.parsed_rows += len(depDf)
+            if len(depDf):
+                await write_queue.put(depDf)
+                stats.max_write_queue = max(stats.max_write_queue,
+                                            write_queue.qsize())
+            # give the fetcher and the writer a chance to run between two
+            # payloads
+            await asyncio.sleep(0)
+        await write_queue.put(_DONE)
+
+    async def _write_stage(self,
+                           write_queue: asyncio.Queue,
+                           stats: PipelineStats) -> None:
+        pending: list[pd.DataFrame] = []
+        pending_rows = 0
+        running_parsers = self.parser_workers
+        while running_parsers:
+            depDf = await write_queue.get()
+            if depDf is _DONE:
+                running_parsers -= 1
+                continue
+            pending.append(depDf)
+            pending_rows += len(depDf)
+            if pending_rows >= self.batch_rows:
+                await self._write(pending, stats)
+                pending, pending_rows = [], 0
+        if pending:
+            await self._write(pending, stats)
+
+    async def _write(self,
+                     pending: list[pd.DataFrame],
+                     stats: PipelineStats) -> None:
+        start = time.perf_counter()
+        batch = pd.concat(pending, ignore_index=True)
+        await self.write_func(batch)
+        stats.write_busy += time.perf_counter() - start
+        stats.written_rows += len(batch)
+        stats.write_batches += 1
+
+    async def run(self, stationID: dict[str, str]) -> PipelineStats:
+        """stream the given stations through all stages, if a stage fails
+           the others are cancelled and the error is raised
+           :param stationID: dict - mapping of station name to global id"""
+        stats = PipelineStats()
+        start = time.perf_counter()
+        fetch_queue = asyncio.Queue(self.queue_size)
+        write_queue = asyncio.Queue(self.queue_size)
+        tasks = [
+            asyncio.ensure_future(
+                self._fetch_stage(stationID, fetch_queue, stats)),
+            *[asyncio.ensure_future(
+                self._parse_stage(fetch_queue, write_queue, stats))
+              for _ in range(self.parser_workers)],
+            asyncio.ensure_future(self._write_stage(write_queue, stats))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # a failed stage leaves the others waiting on its queue forever
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        stats.latency = time.perf_counter() - start
+        return stats
@@ -0,0 +1,84 @@
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from math import log2
+from mvg_tracker.request_parsing.enum_classes import Product
+
+try:
+    # optional, decodes straight from the response bytes and is several
+    # times faster than the standard library
+    import orjson
+
+    def loads(content: bytes):
+        return orjson.loads(content)
+
+except ImportError:
+    def loads(content: bytes):
+        return json.loads(content)
+
+
+SBAHN = Product.SBahn.value
+
+
+def _to_epoch_seconds(value: int) -> float:
+    """the api returns epochs in milliseconds, mirrors the casting of
+       _cast_to_datetime_from_int"""
+    if value > 0 and log2(value) > 34:
+        return value // 1000
+    return value
+
+
+@dataclass
+class PrefilterResult:
+    """outcome of prefilter_departures
+       :param kept: list - raw departures that have to be validated
+       :param next_departure: datetime - earliest upcoming S-Bahn departure
+        of the station, regardless of its delay
+       :param next_entry: float - epoch at which the next departure that was
+        dropped for leaving too late enters the horizon"""
+    kept: list[dict]
+    next_departure: datetime | None
+    next_entry: float | None
+
+
+def prefilter_departures(departures: list[dict],
+                         horizon: timedelta,
+                         now: float = None) -> PrefilterResult:
+    """drop every raw departure that DepartureParser would throw away, before
+       the expensive Departure validation is run on it: everything that is not
+       an S-Bahn, leaves later than horizon or has no delay
+       :param departures: list - raw departure dicts of one station response
+       :param horizon: timedelta - maximum time until the departure
+       :param now: float - reference epoch in seconds, defaults to now"""
+    now = time.time() if now is None else now
+    horizon_seconds = horizon.total_seconds()
+    latest = now + horizon_seconds
+    kept = []
+    next_departure = None
+    next_entry = None
+    for dep in departures:
+        if dep.get("transportType") != SBAHN:
+            continue
+        planned = dep.get("plannedDepartureTime")
+        if not isinstance(planned, int):
+            # leave anything unexpected to the validation
+            kept.append(dep)
+            continue
+        planned = _to_epoch_seconds(planned)
+        realtime = dep.get("realtimeDepartureTime")
+        departs = _to_epoch_seconds(realtime) \
+            if isinstance(realtime, int) else planned
+        if departs >= now and (next_departure is None or departs < next_departure):
+            next_departure = departs
+        if dep.get("delayInMinutes") is None:
+            continue
+        if planned > latest:
+            entry = planned - horizon_seconds
+            if next_entry is None or entry < next_entry:
+                next_entry = entry
+            continue
+        kept.append(dep)
+    if next_departure is not None:
+        next_departure = datetime.fromtimestamp(next_departure)
+    return PrefilterResult(kept, next_departure, next_entry)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import math
+from datetime import datetime, time, timedelta
+from collections.abc import Awaitable, Callable
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+logger = logging.getLogger("Scheduler")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+
+class TaskStats:
+    """running statistics of a scheduled task, drift is the difference between
+       the planned and the actual start of a run in seconds, jitter is the
+       standard deviation of the drift"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.runs = 0
+        self.failures = 0
+        self.max_drift = 0.0
+        self.last_duration = 0.0
+        self._mean_drift = 0.0
+        self._m2_drift = 0.0
+
+    def add_run(self, drift: float, duration: float) -> None:
+        # Welford's online algorithm, so no samples have to be kept
+        self.runs += 1
+        delta = drift - self._mean_drift
+        self._mean_drift += delta / self.runs
+        self._m2_drift += delta * (drift - self._mean_drift)
+        self.max_drift = max(self.max_drift, drift)
+        self.last_duration = duration
+
+    @property
+    def mean_drift(self) -> float:
+        return self._mean_drift
+
+    @property
+    def jitter(self) -> float:
+        if self.runs < 2:
+            return 0.0
+        return math.sqrt(self._m2_drift / (self.runs - 1))
+
+    def __repr__(self) -> str:
+        return (f"{self.name}: runs={self.runs} failures={self.failures} " +
+                f"drift={self.mean_drift * 1000:.1f}ms " +
+                f"jitter={self.jitter * 1000:.1f}ms " +
+                f"max_drift={self.max_drift * 1000:.1f}ms " +
+                f"last_duration={self.last_duration:.2f}s")
+
+
+class ScheduledTask:
+    """task that is run repeatedly on the event loop
+       :param name: str - name used for logging and the statistics
+       :param func: coroutine function that is awaited on every run, if it
+        returns a number it is used as delay in seconds until the next run
+        instead of the one given by get_delay
+       :param get_delay: callable returning the default delay in seconds until
+        the next run
+       :param fixed_rate: bool - whether the delay is counted from the planned
+        start of the last run instead of its end"""
+
+    def __init__(self,
+                 name: str,
+                 func: Callable[[], Awaitable[float | None]],
+                 get_delay: Callable[[], float],
+                 initial_delay: float = 0,
+                 fixed_rate: bool = False) -> None:
+        self.name = name
+        self.func = func
+        self.get_delay = get_delay
+        self.initial_delay = initial_delay
+        self.fixed_rate = fixed_rate
+        self.stats = TaskStats(name)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        scheduled = loop.time() + self.initial_delay
+        while not stop_event.is_set():
+            if await _wait_until(scheduled, stop_event):
+                return
+            start = loop.time()
+            delay = None
+            try:
+                delay = await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats.failures += 1
+                logger.exception(f"task {self.name} failed")
+            end = loop.time()
+            self.stats.add_run(start - scheduled, end - start)
+            if delay is not None:
+                scheduled = end + delay
+            elif self.fixed_rate:
+                # keep a fixed rate, but don't try to catch up on missed runs
+                scheduled = max(scheduled + self.get_delay(), end)
+            else:
+                scheduled = end + self.get_delay()
+
+
+async def _wait_until(deadline: float, stop_event: asyncio.Event) -> bool:
+    """sleep until the loop time reaches deadline or stop_event is set,
+       returns whether the wait was interrupted by stop_event"""
+    timeout = deadline - asyncio.get_running_loop().time()
+    if timeout <= 0:
+        return stop_event.is_set()
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+def seconds_until(at: time, now: datetime = None) -> float:
+    """seconds until the next occurrence of the given time of day"""
+    now = now or datetime.now()
+    target = datetime.combine(now.date(), at)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class Scheduler:
+    """runs a set of scheduled tasks concurrently on one event loop until
+       stop is called"""
+
+    def __init__(self) -> None:
+        self.tasks: list[ScheduledTask] = []
+        self._stop_event: asyncio.Event = None
+
+    def add_periodic(self,
+                     name: str,
+                     func: Callable[[], Awaitable[float | None]],
+                     interval: float,
+                     initial_delay: float = None) -> ScheduledTask:
+        """add a task that is run every interval seconds"""
+        task = ScheduledTask(name,
+                             func,
+                             lambda: interval,
+                             interval if initial_delay is None else initial_delay,
+                             fixed_rate=True)
+        self.tasks.append(task)
+        return task
+
+    def add_daily(self,
+                  name: str,
+                  func: Callable[[], Awaitable[float | None]],
+                  at: time) -> ScheduledTask:
+        """add a task that is run every day at the given time"""
+        task = ScheduledTask(name,
+                             func,
+                             lambda: seconds_until(at),
+                             seconds_until(at))
+        self.tasks.append(task)
+        return task
+
+    @property
+    def stats(self) -> list[TaskStats]:
+        return [task.stats for task in self.tasks]
+
+    def log_stats(self, log: logging.Logger = logger) -> None:
+        for stats in self.stats:
+            log.info(f"scheduler stats {stats}")
+
+    def stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def run(self) -> None:
+        self._stop_event = asyncio.Event()
+        await asyncio.gather(
+            *[task.run(self._stop_event) for task in self.tasks])
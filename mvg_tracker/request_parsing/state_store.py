@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from mvg_tracker.request_parsing.batching import DEP_COLUMNS, HISTORY_COLUMNS, empty_departure_frame
+
+
+# columns that don't make a departure differ from its stored state
+VOLATILE_COLUMNS = ("time_of_record",)
+
+
+class DepartureStateStore:
+    """latest state of every live departure, indexed by departure_id.
+       Upserts cost O(rows upserted), rows whose state changed are marked
+       dirty until they are taken for writing. Departures are evicted once
+       they left longer than evict_after ago. Every new delay of a departure
+       is additionally recorded as history entry
+       :param columns: dict - mapping of column name to the target dtype
+       :param key: str - column identifying a departure
+       :param evict_after: timedelta - time after the departure after which a
+        written departure is dropped"""
+
+    def __init__(self,
+                 columns: dict[str, str] = DEP_COLUMNS,
+                 key: str = "departure_id",
+                 evict_after: timedelta = timedelta(hours=1)) -> None:
+        self.columns = columns
+        self.key = key
+        self.evict_after = evict_after
+        self._names = list(columns)
+        self._key_pos = self._names.index(key)
+        self._dep_pos = self._names.index("time_of_dep")
+        self._delay_pos = self._names.index("delay")
+        self._record_pos = self._names.index("time_of_record")
+        # positions compared to decide whether a departure changed
+        self._compared = [pos for pos, name in enumerate(self._names)
+                          if name not in VOLATILE_COLUMNS]
+        self._rows: dict[str, tuple] = {}
+        self._dirty: set[str] = set()
+        self._history: list[tuple[str, int, int]] = []
+        self.upserted = 0
+        self.unchanged = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def _differs(self, old: tuple, new: tuple) -> bool:
+        return any(old[pos] != new[pos] for pos in self._compared)
+
+    def upsert(self, depDf: pd.DataFrame) -> int:
+        """apply the rows of a frame, later rows of a departure win
+           :returns: int - number of departures that are new or changed"""
+        rows = self._rows
+        dirty = self._dirty
+        key_pos = self._key_pos
+        delay_pos = self._delay_pos
+        changed = 0
+        for row in zip(*(depDf[name].tolist() for name in self._names)):
+            key = row[key_pos]
+            old = rows.get(key)
+            if old is not None and not self._differs(old, row):
+                self.unchanged += 1
+                continue
+            if old is None or old[delay_pos] != row[delay_pos]:
+                # observed in local time like the rest of the collector
+                observed_at = pd.Timestamp(row[self._record_pos])\
+                    .to_pydatetime().timestamp()
+                self._history.append((key, int(observed_at), row[delay_pos]))
+            rows[key] = row
+            if key not in dirty:
+                dirty.add(key)
+                changed += 1
+        self.upserted += changed
+        return changed
+
+    def take_dirty(self) -> tuple[pd.DataFrame, list[str]]:
+        """get the dirty departures and mark them clean
+           :returns: tuple of the frame of dirty rows and their keys, which
+            have to be passed to mark_dirty if writing them fails"""
+        keys = list(self._dirty)
+        self._dirty = set()
+        if not keys:
+            return empty_departure_frame(), keys
+        records = [self._rows[key] for key in keys]
+        data = {name: np.asarray([record[pos] for record in records],
+                                 dtype=self.columns[name])
+                for pos, name in enumerate(self._names)}
+        return pd.DataFrame(data), keys
+
+    def mark_dirty(self, keys: list[str]) -> None:
+        self._dirty.update(key for key in keys if key in self._rows)
+
+    def take_history(self) -> pd.DataFrame:
+        """get the delay changes recorded since the last call"""
+        history, self._history = self._history, []
+        columns = list(zip(*history)) or [()] * len(HISTORY_COLUMNS)
+        return pd.DataFrame({name: np.asarray(values, dtype=dtype)
+                             for (name, dtype), values
+                             in zip(HISTORY_COLUMNS.items(), columns)})
+
+    def requeue_history(self, historyDf: pd.DataFrame) -> None:
+        """put back history entries whose writing failed"""
+        self._history[:0] = zip(*(historyDf[name].tolist()
+                                  for name in HISTORY_COLUMNS))
+
+    def evict(self, now: datetime = None) -> int:
+        """drop the clean departures that left longer than evict_after ago
+           :returns: int - number of evicted departures"""
+        now = datetime.now() if now is None else now
+        threshold = now - self.evict_after
+        dep_pos = self._dep_pos
+        expired = [key for key, row in self._rows.items()
+                   if row[dep_pos] < threshold and key not in self._dirty]
+        for key in expired:
+            del self._rows[key]
+        self.evicted += len(expired)
+        return len(expired)
+
+    def __repr__(self) -> str:
+        return (f"{len(self._rows)} live departures, {len(self._dirty)} " +
+                f"dirty, {self.unchanged} unchanged upserts, " +
+                f"{self.evicted} evicted, {len(self._history)} pending " +
+                "delay changes")
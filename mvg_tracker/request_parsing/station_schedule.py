@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+
+class StationSchedule:
+    """keeps track of when each station has to be polled next. A station is
+       polled every active_interval while it has a departure inside horizon,
+       otherwise it is polled again once its next departure enters the
+       horizon, but at least every max_idle_interval
+       :param stations: list - names of all stations to schedule
+       :param active_interval: timedelta - polling interval while a departure
+        is inside the horizon
+       :param max_idle_interval: timedelta - longest time a station is not
+        polled, also used when a station returned no departures at all
+       :param horizon: timedelta - time before a departure from which on the
+        station is polled with the active interval"""
+
+    def __init__(self,
+                 stations: list[str],
+                 active_interval: timedelta,
+                 max_idle_interval: timedelta,
+                 horizon: timedelta) -> None:
+        self.active_interval = active_interval
+        self.max_idle_interval = max_idle_interval
+        self.horizon = horizon
+        self.next_poll: dict[str, datetime] = {
+            station: datetime.min for station in stations}
+
+    def due(self, now: datetime = None) -> list[str]:
+        """get all stations whose next poll is due"""
+        now = now or datetime.now()
+        return [station for station, next_poll in self.next_poll.items()
+                if next_poll <= now]
+
+    def time_to_next_poll(self, now: datetime = None) -> timedelta:
+        now = now or datetime.now()
+        return max(min(self.next_poll.values()) - now, timedelta(0))
+
+    def update(self,
+               station: str,
+               next_departure: datetime | None,
+               fetched: bool = True,
+               now: datetime = None) -> None:
+        """reschedule a station after it was polled
+           :param next_departure: datetime - earliest upcoming departure of
+            the station or None if it has none
+           :param fetched: bool - whether the request was successful, failed
+            stations are retried with the active interval"""
+        now = now or datetime.now()
+        if not fetched:
+            delay = self.active_interval
+        elif next_departure is None:
+            delay = self.max_idle_interval
+        else:
+            delay = min(max(next_departure - self.horizon - now,
+                            self.active_interval),
+                        self.max_idle_interval)
+        self.next_poll[station] = now + delay
+
+    @property
+    def active_count(self) -> int:
+        """number of stations currently polled with the active interval"""
+        now = datetime.now()
+        return sum(next_poll - now <= self.active_interval
+                   for next_poll in self.next_poll.values())
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+import pandas as pd
+from datetime import timedelta
+from collections.abc import Awaitable, Callable
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+from mvg_tracker.request_parsing.state_store import DepartureStateStore
+
+
+logger = logging.getLogger("WriteBuffer")
+logger = init_console_logger(logger)
+logger.setLevel(logging.DEBUG)
+
+
+class WriteBehindBuffer:
+    """collects departures in a DepartureStateStore and hands the dirty ones
+       to flush_func once their count, their estimated memory or the age of
+       the oldest one exceeds its limit. Flushes run in the background, adding
+       only waits for a running flush if the buffer already holds twice its
+       limits. A failed flush is retried after a delay that doubles with every
+       further failure, while it can't make room new departures are shed
+       instead of growing the buffer without bound
+       :param flush_func: coroutine function getting the frame of changed
+        departures and the frame of their delay changes
+       :param max_rows: int - dirty departures that trigger a flush
+       :param max_bytes: int - memory of the dirty departures in bytes that
+        triggers a flush
+       :param max_age: float - seconds after which the oldest dirty departure
+        is flushed at the latest
+       :param retry_delay: float - seconds to wait after a failed flush
+       :param max_retry_delay: float - upper bound of the retry delay
+       :param store: DepartureStateStore - defaults to a new store"""
+
+    def __init__(self,
+                 flush_func: Callable[[pd.DataFrame, pd.DataFrame],
+                                     Awaitable[None]],
+                 max_rows: int = 20000,
+                 max_bytes: int = 16 * 2 ** 20,
+                 max_age: float = 900,
+                 retry_delay: float = 5,
+                 max_retry_delay: float = 300,
+                 store: DepartureStateStore = None) -> None:
+        self.flush_func = flush_func
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.store = DepartureStateStore() if store is None else store
+        # running estimate of the memory of one row, the store keeps tuples
+        self._row_bytes = 0.0
+        self._oldest: float = None
+        self._flush_task: asyncio.Task = None
+        # monotonic time before which no flush is retried
+        self._retry_at = 0.0
+        self.failed_flushes = 0
+        self.shed_rows = 0
+        self._shedding = False
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    @classmethod
+    def from_config(cls,
+                    flush_func: Callable[[pd.DataFrame, pd.DataFrame],
+                                     Awaitable[None]],
+                    bufferParams: dict) -> "WriteBehindBuffer":
+        return cls(flush_func,
+                   max_rows=bufferParams.get("maxRows", 20000),
+                   max_bytes=bufferParams.get("maxBytes", 16 * 2 ** 20),
+                   max_age=bufferParams.get("maxAge", 900),
+                   retry_delay=bufferParams.get("retryDelay", 5),
+                   max_retry_delay=bufferParams.get("maxRetryDelay", 300),
+                   store=DepartureStateStore(evict_after=timedelta(
+                       minutes=bufferParams.get("evictAfterMinutes", 60))))
+
+    @property
+    def rows(self) -> int:
+        return self.store.dirty_count
+
+    @property
+    def bytes(self) -> int:
+        return int(self.rows * self._row_bytes)
+
+    @property
+    def age(self) -> float:
+        if self._oldest is None:
+            return 0.0
+        return time.monotonic() - self._oldest
+
+    @property
+    def is_full(self) -> bool:
+        return self.rows >= self.max_rows or self.bytes >= self.max_bytes
+
+    @property
+    def is_over_capacity(self) -> bool:
+        return self.rows >= 2 * self.max_rows or self.bytes >= 2 * self.max_bytes
+
+    @property
+    def is_due(self) -> bool:
+        return self.is_full or (self.rows > 0 and self.age >= self.max_age)
+
+    @property
+    def is_flushing(self) -> bool:
+        return self._flush_task is not None and not self._flush_task.done()
+
+    async def add(self, depDf: pd.DataFrame) -> None:
+        if depDf.empty:
+            return
+        if self.is_over_capacity:
+            # backpressure, the flushes don't keep up
+            self.start_flush()
+            await self.wait_for_flush()
+            if self.is_over_capacity:
+                # the flushes fail, drop the departures until one succeeds
+                self._shed(len(depDf))
+                return
+        if self._shedding:
+            logger.warning(f"buffer has room again after shedding " +
+                           f"{self.shed_rows} departures")
+            self._shedding = False
+        # follow the row size, the share of long strings changes over the day
+        row_bytes = depDf.memory_usage(deep=True).sum() / len(depDf)
+        self._row_bytes = row_bytes if not self._row_bytes \
+            else 0.9 * self._row_bytes + 0.1 * row_bytes
+        if not self.store.upsert(depDf):
+            return
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self.is_full:
+            self.start_flush()
+
+    def _shed(self, rows: int) -> None:
+        if not self._shedding:
+            logger.error(f"buffer is full and flushes fail, shedding new " +
+                         f"departures until a flush succeeds, {self}")
+            self._shedding = True
+        self.shed_rows += rows
+
+    def start_flush(self, force: bool = False) -> None:
+        """start a flush in the background unless one is running
+           :param force: bool - don't wait for the retry delay of a failed
+            flush"""
+        if not force and time.monotonic() < self._retry_at:
+            return
+        if not self.is_flushing and self.rows:
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def wait_for_flush(self) -> None:
+        if self.is_flushing:
+            await asyncio.shield(self._flush_task)
+
+    async def flush_if_due(self) -> None:
+        if self.is_due:
+            self.start_flush()
+
+    async def flush(self) -> None:
+        """flush everything buffered and wait until it is written"""
+        await self.wait_for_flush()
+        self.start_flush(force=True)
+        await self.wait_for_flush()
+
+    async def _flush(self) -> None:
+        depDf, keys = self.store.take_dirty()
+        historyDf = self.store.take_history()
+        self._oldest = None
+        start = time.perf_counter()
+        try:
+            await self.flush_func(depDf, historyDf)
+        except Exception:
+            self.failed_flushes += 1
+            delay = min(self.retry_delay * 2 ** (self.failed_flushes - 1),
+                        self.max_retry_delay)
+            self._retry_at = time.monotonic() + delay
+            logger.exception(f"flush of {len(depDf)} rows failed, keeping " +
+                             f"them buffered, retrying in {delay:.0f}s")
+            self.store.mark_dirty(keys)
+            self.store.requeue_history(historyDf)
+            self._oldest = time.monotonic()
+            return
+        self.failed_flushes = 0
+        self._retry_at = 0.0
+        self.store.evict()
+        self.last_flush_latency = time.perf_counter() - start
+        self.max_flush_latency = max(self.max_flush_latency,
+                                     self.last_flush_latency)
+        self.flushes += 1
+        self.flushed_rows += len(depDf)
+
+    def __repr__(self) -> str:
+        return (f"buffer {self.rows}/{self.max_rows} rows " +
+                f"{self.bytes / 2 ** 20:.1f}/{self.max_bytes / 2 ** 20:.1f}MiB " +
+                f"age={self.age:.0f}s live={len(self.store)} " +
+                f"flushes={self.flushes} failed={self.failed_flushes} " +
+                f"shed={self.shed_rows} " +
+                f"last_flush={self.last_flush_latency:.2f}s " +
+                f"max_flush={self.max_flush_latency:.2f}s")
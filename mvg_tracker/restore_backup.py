@@ -0,0 +1,81 @@
+import argparse
+import logging
+import pathlib as pl
+from datetime import date
+from mvg_tracker.data_validation.utils import get_connector, get_json_from_path
+from mvg_tracker.db_util.backup import restore_backup
+from mvg_tracker.db_util.key_migration import migrate_departure_keys
+from mvg_tracker.db_util.partitions import PartitionManager
+from mvg_tracker.db_util.rollup import HourlyRollup
+from mvg_tracker.db_util.writer import CopyUpsertWriter
+from mvg_tracker.logging_util.init_loggers import init_console_logger
+
+
+DEFAULT_CONFIG = pl.Path(__file__).parent.joinpath("config/default_config.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="restore the departures table from the incremental " +
+                    "backups written by the tracker")
+    parser.add_argument(
+        "--back_up",
+        "-b",
+        type=str,
+        dest="backUpPath",
+        help="enter Dir of the backed up files",
+        required=True
+    )
+    parser.add_argument(
+        "--config_path",
+        "-c",
+        type=str,
+        dest="configPath",
+        help="enter filePath for the config file to use",
+        default=str(DEFAULT_CONFIG)
+    )
+    parser.add_argument(
+        "--from",
+        type=date.fromisoformat,
+        dest="restoreFrom",
+        help="only restore days from this ISO date on",
+        default=None
+    )
+    parser.add_argument(
+        "--to",
+        type=date.fromisoformat,
+        dest="restoreTo",
+        help="only restore days before this ISO date",
+        default=None
+    )
+    args = parser.parse_args()
+    logger = logging.getLogger("RestoreBackup")
+    logger = init_console_logger(logger)
+    logger.setLevel(logging.INFO)
+
+    config = get_json_from_path(pl.Path(args.configPath))
+    connection = get_connector(**config["dbParams"])
+    table = config["dbTables"]["departures"]
+    partitions = PartitionManager.from_config(
+        connection, table, config.get("partitionParams", {}))
+    partitions.ensure_schema()
+    migrate_departure_keys(connection,
+                           [table, config["dbTables"]["delay_history"]])
+    writer = CopyUpsertWriter(connection,
+                              table,
+                              config["dbTables"]["temp_departure"],
+                              conflict_columns=("departure_id", "time_of_dep"))
+    rows = restore_backup(writer,
+                          pl.Path(args.backUpPath),
+                          args.restoreFrom,
+                          args.restoreTo,
+                          partitions)
+    logger.info(f"restored {rows} rows into {table}")
+    if rows:
+        HourlyRollup(connection,
+                     config["dbTables"]["delay_rollup"],
+                     table).rebuild()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import os
+import pytest
+import sqlalchemy as sa
+
+
+@pytest.fixture
+def pg_connection():
+    """connection to the postgres database in MVG_TRACKER_TEST_DB, e.g.
+       postgresql+psycopg2://postgres@localhost/postgres, tests using it are
+       skipped if it isn't set or can't be reached"""
+    uri = os.environ.get("MVG_TRACKER_TEST_DB")
+    if not uri:
+        pytest.skip("MVG_TRACKER_TEST_DB is not set")
+    engine = sa.create_engine(uri)
+    try:
+        connection = engine.connect()
+    except sa.exc.OperationalError as e:
+        pytest.skip(f"can't connect to the test database: {e}")
+    yield connection
+    connection.rollback()
+    connection.close()
+    engine.dispose()
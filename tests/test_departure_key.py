@@ -0,0 +1,98 @@
+from datetime import datetime
+import pytest
+import sqlalchemy as sa
+from mvg_tracker.request_parsing.departure_key import (
+    KEY_EPOCH, LINE_BITS, MINUTE_BITS, PRODUCT_CODES, STATION_BITS,
+    DepartureKey, departure_key_sql, pack_departure_key, unpack_departure_key)
+from mvg_tracker.request_parsing.enum_classes import Product
+
+
+PLANNED = datetime(2022, 5, 27, 8, 42)
+LAST_MINUTE = KEY_EPOCH + ((1 << MINUTE_BITS) - 1) * 60
+
+# text ids of the former layout and the parts pack_departure_key gets
+TEXT_IDS = [
+    ("91620003_1653633720_S3_SBAHN", (91620003, 1653633720, 3, Product.SBahn)),
+    ("91620003_1653633759_S3_SBAHN", (91620003, 1653633759, 3, Product.SBahn)),
+    ("1_1577836800_U6_UBAHN", (1, 1577836800, 6, Product.UBahn)),
+    ("917906170_1700000000_X6_REGIONAL_BUS",
+     (917906170, 1700000000, 6, Product.RegionalBus)),
+    ("91625_1700000040_N_BUS", (91625, 1700000040, 0, Product.Bus)),
+    ("91625_1700000040_19_TRAM", (91625, 1700000040, 19, Product.Tram)),
+    ("91625_1700000040_7_UNKNOWN", (91625, 1700000040, 7, None)),
+    (f"{(1 << STATION_BITS) - 1}_{LAST_MINUTE}_S63_RUFTAXI",
+     ((1 << STATION_BITS) - 1, LAST_MINUTE, 63, Product.RufTaxi)),
+]
+
+# ids with one part that doesn't fit into its bits, and the part
+OUT_OF_RANGE = [
+    (f"{1 << STATION_BITS}_1700000000_S3_SBAHN",
+     (1 << STATION_BITS, 1700000000, 3), "station id"),
+    (f"1_{KEY_EPOCH - 30}_S3_SBAHN", (1, KEY_EPOCH - 30, 3), "planned minute"),
+    (f"1_{LAST_MINUTE + 60}_S3_SBAHN",
+     (1, LAST_MINUTE + 60, 3), "planned minute"),
+    (f"1_1700000000_S{1 << LINE_BITS}_SBAHN",
+     (1, 1700000000, 1 << LINE_BITS), "line id"),
+]
+
+
+@pytest.mark.parametrize("product", list(PRODUCT_CODES))
+def test_round_trip(product):
+    key = pack_departure_key(91620003, PLANNED, 20, product)
+    assert unpack_departure_key(key) == DepartureKey(91620003, PLANNED, 20,
+                                                     product)
+
+
+def test_round_trip_at_the_upper_bounds():
+    planned = datetime.fromtimestamp(LAST_MINUTE)
+    key = pack_departure_key((1 << STATION_BITS) - 1,
+                             planned,
+                             (1 << LINE_BITS) - 1,
+                             Product.Tram)
+    assert 0 < key < 1 << 63
+    assert unpack_departure_key(key) == DepartureKey(
+        (1 << STATION_BITS) - 1, planned, (1 << LINE_BITS) - 1, Product.Tram)
+
+
+def test_planned_is_packed_to_the_minute():
+    key = pack_departure_key(1, PLANNED.replace(second=59), 1, Product.SBahn)
+    assert key == pack_departure_key(1, PLANNED, 1, Product.SBahn)
+    assert pack_departure_key(1, PLANNED.timestamp(), 1, Product.SBahn) == key
+
+
+def test_keys_differ_per_part():
+    keys = {pack_departure_key(1, PLANNED, 1, Product.SBahn),
+            pack_departure_key(2, PLANNED, 1, Product.SBahn),
+            pack_departure_key(1, PLANNED.replace(minute=43), 1, Product.SBahn),
+            pack_departure_key(1, PLANNED, 2, Product.SBahn),
+            pack_departure_key(1, PLANNED, 1, Product.Bus)}
+    assert len(keys) == 5
+
+
+@pytest.mark.parametrize("text_id, parts, part", OUT_OF_RANGE)
+def test_out_of_range_parts_raise(text_id, parts, part):
+    with pytest.raises(ValueError, match=f"{part} .* doesn't fit"):
+        pack_departure_key(*parts, Product.SBahn)
+
+
+def test_negative_station_id_raises():
+    with pytest.raises(ValueError, match="station id"):
+        pack_departure_key(-1, PLANNED, 1, Product.SBahn)
+
+
+def sql_key(connection: sa.engine.Connection, text_id: str) -> int:
+    return connection.exec_driver_sql(
+        f"select {departure_key_sql('departure_id')} " +
+        "from (select %(text_id)s::text as departure_id) ids",
+        {"text_id": text_id}).scalar()
+
+
+@pytest.mark.parametrize("text_id, parts", TEXT_IDS)
+def test_sql_matches_python(pg_connection, text_id, parts):
+    assert sql_key(pg_connection, text_id) == pack_departure_key(*parts)
+
+
+@pytest.mark.parametrize("text_id, parts, part", OUT_OF_RANGE)
+def test_sql_rejects_out_of_range_parts(pg_connection, text_id, parts, part):
+    with pytest.raises(sa.exc.DataError, match=f"{part} .* doesn't fit"):
+        sql_key(pg_connection, text_id)
@@ -0,0 +1,60 @@
+import random
+import pytest
+from mvg_tracker.request_parsing.destination_resolver import NO_MATCH, DestinationResolver
+
+
+NAMES = ["Pasing", "Ost", "München", "Erding", "Ding", "Laim"]
+IDS = [916210, 91625, 9162000, 91771234, 91000001, 91620020]
+
+
+@pytest.fixture
+def resolver():
+    return DestinationResolver(NAMES, IDS)
+
+
+@pytest.mark.parametrize("name, station_id", list(zip(NAMES, IDS)))
+def test_exact_names(resolver, name, station_id):
+    assert resolver.resolve(name) == station_id
+
+
+@pytest.mark.parametrize("destination, station_id", [
+    ("München Ost", 91625),
+    ("München Hbf", 9162000),
+    ("Flughafen München", 9162000),
+    ("Erding Bf", 91771234),
+    ("Dingolfing", 91000001),
+    ("München-Laim", 9162000),
+])
+def test_lowest_contained_name_wins(resolver, destination, station_id):
+    assert resolver.resolve(destination) == station_id
+
+
+def test_no_match_is_counted_once(resolver):
+    assert resolver.resolve("Holzkirchen") == NO_MATCH
+    assert resolver.resolve("Holzkirchen") == NO_MATCH
+    assert resolver.misses == 1
+
+
+def test_matches_a_linear_search():
+    rng = random.Random(0)
+    names = ["".join(rng.choices("abc", k=rng.randint(1, 4)))
+             for _ in range(30)]
+    ids = list(range(1, len(names) + 1))
+    resolver = DestinationResolver(names, ids)
+    for _ in range(500):
+        destination = "".join(rng.choices("abcd", k=rng.randint(0, 12)))
+        expected = next((station_id for name, station_id in zip(names, ids)
+                         if name in destination), NO_MATCH)
+        assert resolver.resolve(destination) == expected, destination
+
+
+def test_memo_is_bounded():
+    resolver = DestinationResolver(NAMES, IDS, memo_size=2)
+    for destination in ["a Ost", "b Ost", "c Ost"]:
+        assert resolver.resolve(destination) == 91625
+    assert len(resolver._memo) <= 2
+
+
+def test_names_and_ids_have_to_match():
+    with pytest.raises(ValueError):
+        DestinationResolver(NAMES, IDS[:-1])
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from mvg_tracker.request_parsing.batching import DEP_COLUMNS, HISTORY_COLUMNS
+from mvg_tracker.request_parsing.state_store import DepartureStateStore
+
+
+RECORDED = datetime(2022, 5, 27, 8, 0)
+
+
+def departures(delays: list[int],
+               recorded: datetime = RECORDED,
+               first_id: int = 1) -> pd.DataFrame:
+    ids = range(first_id, first_id + len(delays))
+    return pd.DataFrame({
+        "time_of_dep": [RECORDED + timedelta(minutes=10 * i) for i in ids],
+        "line_id": 3,
+        "delay": delays,
+        "time_of_record": recorded,
+        "station_id": 91620003,
+        "destination_id": 91625,
+        "departure_id": list(ids),
+    }).astype(DEP_COLUMNS)
+
+
+@pytest.fixture
+def store():
+    store = DepartureStateStore(evict_after=timedelta(hours=1))
+    store.upsert(departures([0, 2, 5]))
+    return store
+
+
+def test_new_departures_are_dirty(store):
+    assert len(store) == 3
+    assert store.dirty_count == 3
+    depDf, keys = store.take_dirty()
+    assert sorted(keys) == [1, 2, 3]
+    assert depDf.dtypes.to_dict() == {
+        name: pd.Series(dtype=dtype).dtype
+        for name, dtype in DEP_COLUMNS.items()}
+    assert depDf.sort_values("departure_id").delay.tolist() == [0, 2, 5]
+    assert store.dirty_count == 0
+
+
+def test_only_a_new_record_time_is_unchanged(store):
+    store.take_dirty()
+    store.take_history()
+    later = RECORDED + timedelta(seconds=30)
+    assert store.upsert(departures([0, 2, 5], recorded=later)) == 0
+    assert store.unchanged == 3
+    assert store.dirty_count == 0
+    assert store.take_history().empty
+
+
+def test_changed_delay_is_dirty_and_recorded(store):
+    store.take_dirty()
+    store.take_history()
+    later = RECORDED + timedelta(seconds=30)
+    assert store.upsert(departures([0, 3, 5], recorded=later)) == 1
+    depDf, keys = store.take_dirty()
+    assert keys == [2]
+    assert depDf.time_of_record.tolist() == [later]
+    historyDf = store.take_history()
+    assert historyDf.values.tolist() == [[2, int(later.timestamp()), 3]]
+
+
+def test_history_of_new_departures(store):
+    historyDf = store.take_history()
+    assert historyDf.dtypes.to_dict() == {
+        name: pd.Series(dtype=dtype).dtype
+        for name, dtype in HISTORY_COLUMNS.items()}
+    assert historyDf.values.tolist() == [
+        [key, int(RECORDED.timestamp()), delay]
+        for key, delay in [(1, 0), (2, 2), (3, 5)]]
+    assert store.take_history().empty
+
+
+def test_later_rows_of_a_departure_win():
+    store = DepartureStateStore()
+    frame = pd.concat([departures([1]), departures([4])], ignore_index=True)
+    assert store.upsert(frame) == 1
+    depDf, _ = store.take_dirty()
+    assert depDf.delay.tolist() == [4]
+    assert store.take_history().delay.tolist() == [1, 4]
+
+
+def test_failed_writes_are_put_back(store):
+    _, keys = store.take_dirty()
+    historyDf = store.take_history()
+    store.mark_dirty(keys)
+    store.requeue_history(historyDf)
+    assert store.dirty_count == 3
+    assert store.take_history().equals(historyDf)
+
+
+def test_evict_drops_clean_departures_that_left(store):
+    store.take_dirty()
+    store.upsert(departures([7], first_id=1))
+    # departures 1, 2 and 3 leave at 8:10, 8:20 and 8:30
+    assert store.evict(RECORDED + timedelta(hours=1, minutes=25)) == 1
+    assert len(store) == 2
+    assert store.dirty_count == 1
+    assert store.evict(RECORDED + timedelta(hours=2)) == 1
+    assert store.take_dirty()[1] == [1]
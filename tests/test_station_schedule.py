@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import pytest
+from mvg_tracker.request_parsing.station_schedule import StationSchedule
+
+
+NOW = datetime(2022, 5, 27, 8, 0)
+
+
+@pytest.fixture
+def schedule():
+    return StationSchedule(["Pasing", "Ost"],
+                           active_interval=timedelta(seconds=30),
+                           max_idle_interval=timedelta(minutes=15),
+                           horizon=timedelta(hours=1))
+
+
+def test_new_stations_are_due(schedule):
+    assert schedule.due(NOW) == ["Pasing", "Ost"]
+    assert schedule.time_to_next_poll(NOW) == timedelta(0)
+
+
+def test_departure_inside_horizon_polls_actively(schedule):
+    schedule.update("Pasing", NOW + timedelta(minutes=20), now=NOW)
+    assert schedule.next_poll["Pasing"] == NOW + timedelta(seconds=30)
+
+
+def test_departure_entering_horizon_soon(schedule):
+    schedule.update("Pasing", NOW + timedelta(minutes=65), now=NOW)
+    assert schedule.next_poll["Pasing"] == NOW + timedelta(minutes=5)
+
+
+def test_idle_interval_bounds_the_wait(schedule):
+    schedule.update("Pasing", NOW + timedelta(hours=5), now=NOW)
+    assert schedule.next_poll["Pasing"] == NOW + timedelta(minutes=15)
+
+
+def test_station_without_departures_waits_idle_interval(schedule):
+    schedule.update("Pasing", None, now=NOW)
+    assert schedule.next_poll["Pasing"] == NOW + timedelta(minutes=15)
+
+
+def test_failed_station_is_retried_actively(schedule):
+    schedule.update("Pasing", NOW + timedelta(hours=5), fetched=False, now=NOW)
+    assert schedule.next_poll["Pasing"] == NOW + timedelta(seconds=30)
+
+
+def test_due_and_time_to_next_poll(schedule):
+    schedule.update("Pasing", None, now=NOW)
+    schedule.update("Ost", NOW + timedelta(minutes=10), now=NOW)
+    assert schedule.due(NOW) == []
+    assert schedule.time_to_next_poll(NOW) == timedelta(seconds=30)
+    assert schedule.due(NOW + timedelta(seconds=30)) == ["Ost"]
+    assert schedule.due(NOW + timedelta(minutes=15)) == ["Pasing", "Ost"]
+    assert schedule.time_to_next_poll(NOW + timedelta(hours=1)) == timedelta(0)